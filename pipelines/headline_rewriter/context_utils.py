@@ -0,0 +1,175 @@
+"""Article context preparation for headline rewriting prompts."""
+
+import hashlib
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, List, Optional, Sequence
+from bs4 import BeautifulSoup
+from transformers import AutoTokenizer
+
+# Upper bound on characters per token used to pre-cut huge articles before
+# tokenizing them; only text far past the token budget is dropped.
+_MAX_CHARS_PER_TOKEN = 32
+
+# Per-process state for pool workers, set by _init_worker
+_worker_tokenizer: Optional[AutoTokenizer] = None
+_worker_max_tokens: Optional[int] = None
+
+
+def content_hash(content: Any) -> str:
+    """Hash raw article content for use as a cache key.
+
+    Args:
+        content: Raw HTML content, possibly missing (NaN/None)
+
+    Returns:
+        Hex SHA-256 digest; missing content hashes like an empty string
+    """
+    text = content if isinstance(content, str) else ''
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def clean_html(content: Any) -> str:
+    """Strip HTML markup from article content.
+
+    Args:
+        content: Raw HTML content, possibly missing (NaN/None)
+
+    Returns:
+        Plain text, or an empty string for missing content
+    """
+    if not isinstance(content, str):
+        return ''
+    return BeautifulSoup(content, "html.parser").get_text()
+
+
+def prepare_context(
+    content: Any,
+    tokenizer: Optional[AutoTokenizer] = None,
+    max_tokens: Optional[int] = None
+) -> str:
+    """Clean article content and truncate it to a token budget.
+
+    Args:
+        content: Raw HTML content, possibly missing (NaN/None)
+        tokenizer: Tokenizer used to measure the budget; required if
+            ``max_tokens`` is set
+        max_tokens: Maximum context length in tokens, or None for no limit
+
+    Returns:
+        Plain-text context that fits in ``max_tokens`` tokens
+    """
+    text = clean_html(content)
+    if max_tokens is None:
+        return text
+
+    text = text[:max_tokens * _MAX_CHARS_PER_TOKEN]
+    ids = tokenizer.encode(text, add_special_tokens=False)
+    if len(ids) <= max_tokens:
+        return text
+    return tokenizer.decode(ids[:max_tokens], skip_special_tokens=True)
+
+
+def _init_worker(tokenizer: Optional[AutoTokenizer], max_tokens: Optional[int]) -> None:
+    global _worker_tokenizer, _worker_max_tokens
+    _worker_tokenizer = tokenizer
+    _worker_max_tokens = max_tokens
+
+
+def _prepare_in_worker(content: Any) -> str:
+    return prepare_context(content, _worker_tokenizer, _worker_max_tokens)
+
+
+class ContextPreprocessor:
+    """Clean and truncate article contexts off the GPU worker thread.
+
+    HTML cleaning and tokenizer-based truncation run in a process pool.
+    Results are cached by content hash, so the same article fanned out
+    to several symbols is only prepared once.
+
+    Attributes:
+        max_tokens: Context token budget, or None for no limit
+        num_workers: Number of pool processes (0 when running inline)
+
+    Example:
+        >>> with ContextPreprocessor(tokenizer, max_tokens=512) as prep:
+        ...     contexts = prep.prepare(df["content"].tolist())
+    """
+
+    def __init__(
+        self,
+        tokenizer: AutoTokenizer,
+        max_tokens: Optional[int] = 512,
+        num_workers: Optional[int] = None,
+        cache_size: int = 100_000
+    ):
+        """Initialize the preprocessor.
+
+        Args:
+            tokenizer: Tokenizer used to measure the context budget
+            max_tokens: Context token budget, or None for no limit
+            num_workers: Pool size; None uses all CPUs, 0 runs inline
+            cache_size: Maximum number of cleaned contexts kept in memory
+        """
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self.num_workers = os.cpu_count() if num_workers is None else num_workers
+        self._pool = None
+        if self.num_workers > 0:
+            # Not fork: the pool starts from the pipeline's prepare thread, after CUDA
+            # and tokenizer threads exist. The forkserver is a fresh interpreter that
+            # imports the main script once; workers are forked from it.
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.num_workers,
+                mp_context=multiprocessing.get_context("forkserver"),
+                initializer=_init_worker,
+                initargs=(tokenizer, max_tokens)
+            )
+
+    def prepare(self, contents: Sequence[Any]) -> List[str]:
+        """Prepare contexts for a batch of articles.
+
+        Args:
+            contents: Raw HTML contents, possibly missing (NaN/None)
+
+        Returns:
+            Cleaned and truncated contexts in input order
+        """
+        keys = [content_hash(c) for c in contents]
+        missing = {}
+        for key, content in zip(keys, contents):
+            if key not in self._cache:
+                missing.setdefault(key, content)
+
+        if missing:
+            raw = list(missing.values())
+            if self._pool is not None:
+                chunksize = max(1, len(raw) // (4 * self.num_workers))
+                prepared = list(self._pool.map(_prepare_in_worker, raw, chunksize=chunksize))
+            else:
+                prepared = [prepare_context(c, self.tokenizer, self.max_tokens) for c in raw]
+            self._cache.update(zip(missing, prepared))
+
+        results = []
+        for key in keys:
+            self._cache.move_to_end(key)
+            results.append(self._cache[key])
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return results
+
+    def close(self) -> None:
+        """Shut down the worker pool."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self) -> "ContextPreprocessor":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -1,10 +1,15 @@
 """LLM utilities for headline rewriting using Mistral-7B."""
 
-from typing import List, Dict, Any
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
 import pandas as pd
 import torch
-from bs4 import BeautifulSoup
 from transformers import AutoTokenizer, AutoModelForCausalLM
+from context_utils import clean_html
+from speculative import SpeculativeStats, assisted_greedy_generate
+
+# Bump whenever the rewrite prompt changes so cached generations are not reused
+REWRITE_PROMPT_VERSION = "1"
 
 
 def generate_response(
@@ -12,7 +17,9 @@ def generate_response(
     model: AutoModelForCausalLM,
     tokenizer: AutoTokenizer,
     device: torch.device,
-    max_new_tokens: int = 256
+    max_new_tokens: int = 256,
+    draft_model: Optional[AutoModelForCausalLM] = None,
+    stats: Optional[SpeculativeStats] = None
 ) -> str:
     """Generate text response from LLM given a prompt.
     
@@ -22,6 +29,9 @@ def generate_response(
         tokenizer: Tokenizer matching the model
         device: PyTorch device (CPU or CUDA)
         max_new_tokens: Maximum number of tokens to generate
+        draft_model: Optional small model sharing the tokenizer; enables
+            assisted decoding, which yields the same greedy output
+        stats: Optional counters updated with the draft acceptance rate
         
     Returns:
         Generated text response, cleaned and trimmed
@@ -29,56 +39,231 @@ def generate_response(
     Note:
         Uses greedy decoding with caching enabled for efficiency.
     """
-    inputs = tokenizer(prompt, return_tensors='pt').to(device)
-    with torch.no_grad():
-        output = model.generate(
-            **inputs,
-            max_new_tokens=max_new_tokens,
-            use_cache=True,
-            pad_token_id=tokenizer.eos_token_id
-        )
-    output_decoded = tokenizer.decode(output[0], skip_special_tokens=True)
-    result = output_decoded.split('[/INST]')[-1].split('\n')[0].strip()
-    return result
+    batches = build_generation_batches([prompt], tokenizer, batch_size=1)
+    generated = generate_batches(
+        batches, model, tokenizer, device, max_new_tokens,
+        draft_model=draft_model, stats=stats
+    )
+    return decode_batches(generated, tokenizer, 1)[0]
 
 
-def rewrite_headline(
-    row: pd.Series,
+@lru_cache(maxsize=None)
+def newline_token_ids(tokenizer: AutoTokenizer) -> Tuple[int, ...]:
+    """Find every vocabulary token that contains a line break.
+    
+    Covers SentencePiece byte tokens (``<0x0A>``), byte-level BPE tokens
+    (``Ċ``) and merged tokens such as ``"\\n\\n"``.
+    
+    Args:
+        tokenizer: Tokenizer whose vocabulary is scanned
+        
+    Returns:
+        Sorted tuple of token ids that encode a newline
+    """
+    return tuple(sorted(
+        token_id for token, token_id in tokenizer.get_vocab().items()
+        if "\n" in token or "Ċ" in token or token == "<0x0A>"
+    ))
+
+
+def _length_buckets(lengths: List[int], batch_size: int) -> List[List[int]]:
+    """Group prompt indices into batches of similar token length.
+    
+    Args:
+        lengths: Token length of each prompt
+        batch_size: Maximum number of prompts per batch
+        
+    Returns:
+        List of batches, each a list of indices into ``lengths``
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+def generate_responses(
+    prompts: List[str],
     model: AutoModelForCausalLM,
     tokenizer: AutoTokenizer,
-    device: torch.device
-) -> pd.Series:
-    """Rewrite financial headline to focus on specific symbol.
+    device: torch.device,
+    batch_size: int = 16,
+    max_new_tokens: int = 256
+) -> List[str]:
+    """Generate text responses for many prompts with batched decoding.
     
-    Takes a generic financial headline and rewrites it to emphasize
-    the impact on a specific trading symbol, using article content
-    as additional context.
+    Prompts are sorted by token length and split into left-padded
+    batches so each ``model.generate`` call wastes as little compute
+    on padding as possible. Results are returned in input order.
+    
+    Only the first line of each response is kept, so newline tokens are
+    treated as end-of-sequence: every sequence stops as soon as it emits
+    a newline or EOS, and the batch stops once all of them have.
     
     Args:
-        row: DataFrame row containing symbol, headline, and content
-        model: Pre-trained Mistral-7B model
-        tokenizer: Mistral tokenizer
+        prompts: Input text prompts for the model
+        model: Pre-trained causal language model
+        tokenizer: Tokenizer matching the model
         device: PyTorch device (CPU or CUDA)
+        batch_size: Maximum number of prompts per generate call
+        max_new_tokens: Maximum number of tokens to generate
         
     Returns:
-        Series with original data plus generated headline
+        Generated text responses, cleaned and trimmed, in input order
         
     Example:
-        >>> row = pd.Series({
-        ...     "symbol": "GLD",
-        ...     "name": "Gold ETF",
-        ...     "headline": "Commodities rally on inflation fears",
-        ...     "content": "<p>Gold prices surge...</p>"
-        ... })
-        >>> result = rewrite_headline(row, model, tokenizer, device)
+        >>> generate_responses(prompts, model, tokenizer, device, batch_size=32)
+        ['Gold ETF climbs as inflation fears mount', ...]
+    """
+    batches = build_generation_batches(prompts, tokenizer, batch_size)
+    generated = generate_batches(batches, model, tokenizer, device, max_new_tokens)
+    return decode_batches(generated, tokenizer, len(prompts))
+
+
+# A padded generation batch: prompt indices plus tensors ready for generate()
+GenerationBatch = Tuple[List[int], Dict[str, torch.Tensor]]
+
+
+def build_generation_batches(
+    prompts: List[str],
+    tokenizer: AutoTokenizer,
+    batch_size: int = 16
+) -> List[GenerationBatch]:
+    """Tokenize prompts into left-padded, length-bucketed batches.
+    
+    CPU-only first step of :func:`generate_responses`, split out so it
+    can run in a separate thread from the GPU stage.
+    
+    Args:
+        prompts: Input text prompts for the model
+        tokenizer: Tokenizer matching the model
+        batch_size: Maximum number of prompts per batch
+        
+    Returns:
+        Batches of (prompt indices, padded CPU tensors)
+    """
+    # Decoder-only models must be left-padded so new tokens follow the prompt
+    tokenizer.padding_side = "left"
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+
+    encoded = [tokenizer.encode(p) for p in prompts]
+    batches = []
+    for batch in _length_buckets([len(ids) for ids in encoded], batch_size):
+        inputs = tokenizer.pad(
+            {"input_ids": [encoded[i] for i in batch]},
+            padding=True,
+            return_tensors="pt"
+        )
+        batches.append((batch, dict(inputs)))
+    return batches
+
+
+def generate_batches(
+    batches: List[GenerationBatch],
+    model: AutoModelForCausalLM,
+    tokenizer: AutoTokenizer,
+    device: torch.device,
+    max_new_tokens: int = 256,
+    draft_model: Optional[AutoModelForCausalLM] = None,
+    stats: Optional[SpeculativeStats] = None,
+    num_draft_tokens: int = 4
+) -> List[Tuple[List[int], torch.Tensor]]:
+    """Run greedy generation on prepared batches.
+    
+    With a ``draft_model``, each prompt is decoded on its own with
+    assisted (speculative) decoding instead of batched ``generate``.
+    
+    Args:
+        batches: Output of :func:`build_generation_batches`
+        model: Pre-trained causal language model
+        tokenizer: Tokenizer matching the model
+        device: PyTorch device (CPU or CUDA)
+        max_new_tokens: Maximum number of tokens to generate
+        draft_model: Optional draft model for assisted decoding
+        stats: Optional counters updated by assisted decoding
+        num_draft_tokens: Tokens proposed by the draft model per step
+        
+    Returns:
+        Pairs of (prompt indices, newly generated token ids on CPU)
+    """
+    stop_ids = [tokenizer.eos_token_id, *newline_token_ids(tokenizer)]
+    generated = []
+    if draft_model is not None:
+        for batch, inputs in batches:
+            sequences = [
+                assisted_greedy_generate(
+                    ids[mask.bool()].tolist(), model, draft_model,
+                    max_new_tokens, num_draft_tokens,
+                    eos_token_ids=stop_ids, stats=stats
+                )
+                for ids, mask in zip(inputs["input_ids"], inputs["attention_mask"])
+            ]
+            new_tokens = torch.full(
+                (len(sequences), max(len(s) for s in sequences)), tokenizer.pad_token_id
+            )
+            for row, sequence in enumerate(sequences):
+                new_tokens[row, :len(sequence)] = torch.tensor(sequence)
+            generated.append((batch, new_tokens))
+        return generated
+
+    for batch, inputs in batches:
+        inputs = {name: tensor.to(device) for name, tensor in inputs.items()}
+        with torch.no_grad():
+            output = model.generate(
+                **inputs,
+                max_new_tokens=max_new_tokens,
+                use_cache=True,
+                do_sample=False,
+                eos_token_id=stop_ids,
+                pad_token_id=tokenizer.pad_token_id
+            )
+        generated.append((batch, output[:, inputs["input_ids"].shape[1]:].cpu()))
+    return generated
+
+
+def decode_batches(
+    generated: List[Tuple[List[int], torch.Tensor]],
+    tokenizer: AutoTokenizer,
+    num_prompts: int
+) -> List[str]:
+    """Decode generated tokens back to first-line responses in input order.
+    
+    Args:
+        generated: Output of :func:`generate_batches`
+        tokenizer: Tokenizer matching the model
+        num_prompts: Number of prompts that were batched
+        
+    Returns:
+        Generated text responses, cleaned and trimmed, in input order
+    """
+    results: List[str] = [""] * num_prompts
+    for batch, new_tokens in generated:
+        decoded = tokenizer.batch_decode(new_tokens, skip_special_tokens=True)
+        for i, text in zip(batch, decoded):
+            results[i] = text.split('\n')[0].strip()
+    return results
+
+
+def build_rewrite_prompt(
+    row: pd.Series,
+    tokenizer: AutoTokenizer,
+    context: Optional[str] = None
+) -> str:
+    """Build the chat prompt asking the model to rewrite one headline.
+    
+    Args:
+        row: DataFrame row or input record containing symbol, name,
+            headline, and content
+        tokenizer: Mistral tokenizer providing the chat template
+        context: Pre-cleaned article text (see ``context_utils``); when
+            omitted, the HTML in ``row["content"]`` is cleaned inline
+        
+    Returns:
+        Prompt string with the chat template applied
     """
     symbol = row["symbol"]
     symbol_name = row["name"]
     headline = row["headline"]
-    content = row["content"]
-    
-    # Clean HTML from content
-    content = BeautifulSoup(content, "html.parser").get_text() if pd.notna(content) else ''
+    content = clean_html(row["content"]) if context is None else context
     
     messages = [
         {
@@ -93,17 +278,92 @@ def rewrite_headline(
         }
     ]
     
-    prompt = tokenizer.apply_chat_template(
+    return tokenizer.apply_chat_template(
         messages,
         tokenize=False,
         add_generation_prompt=True
     )
 
+
+def rewrite_headline(
+    row: pd.Series,
+    model: AutoModelForCausalLM,
+    tokenizer: AutoTokenizer,
+    device: torch.device
+) -> pd.Series:
+    """Rewrite financial headline to focus on specific symbol.
+    
+    Takes a generic financial headline and rewrites it to emphasize
+    the impact on a specific trading symbol, using article content
+    as additional context.
+    
+    Args:
+        row: DataFrame row containing symbol, headline, and content
+        model: Pre-trained Mistral-7B model
+        tokenizer: Mistral tokenizer
+        device: PyTorch device (CPU or CUDA)
+        
+    Returns:
+        Series with original data plus generated headline
+        
+    Example:
+        >>> row = pd.Series({
+        ...     "symbol": "GLD",
+        ...     "name": "Gold ETF",
+        ...     "headline": "Commodities rally on inflation fears",
+        ...     "content": "<p>Gold prices surge...</p>"
+        ... })
+        >>> result = rewrite_headline(row, model, tokenizer, device)
+    """
+    prompt = build_rewrite_prompt(row, tokenizer)
     generated = generate_response(prompt, model, tokenizer, device)
 
     return pd.Series({
-        "symbol": symbol,
-        "symbol_name": symbol_name,
-        "headline": headline,
+        "symbol": row["symbol"],
+        "symbol_name": row["name"],
+        "headline": row["headline"],
         "generated_headline": generated,
     })
+
+
+def rewrite_headlines(
+    rows: pd.DataFrame,
+    model: AutoModelForCausalLM,
+    tokenizer: AutoTokenizer,
+    device: torch.device,
+    batch_size: int = 16,
+    contexts: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """Rewrite a batch of financial headlines with batched generation.
+    
+    Batched counterpart of :func:`rewrite_headline`; prompts are grouped
+    by token length internally and results keep the order of ``rows``.
+    
+    Args:
+        rows: DataFrame with symbol, name, headline, and content columns
+        model: Pre-trained Mistral-7B model
+        tokenizer: Mistral tokenizer
+        device: PyTorch device (CPU or CUDA)
+        batch_size: Maximum number of prompts per generate call
+        contexts: Pre-cleaned article text per row, e.g. from
+            ``ContextPreprocessor.prepare``; cleaned inline when omitted
+        
+    Returns:
+        DataFrame with one output row per input row, same index as ``rows``
+    """
+    if contexts is None:
+        contexts = [None] * len(rows)
+    prompts = [
+        build_rewrite_prompt(row, tokenizer, context)
+        for (_, row), context in zip(rows.iterrows(), contexts)
+    ]
+    generated = generate_responses(
+        prompts, model, tokenizer, device, batch_size=batch_size
+    )
+
+    return pd.DataFrame({
+        "symbol": rows["symbol"],
+        "symbol_name": rows["name"],
+        "headline": rows["headline"],
+        "generated_headline": generated,
+    }, index=rows.index)
@@ -1,11 +1,22 @@
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
+
+import glob
 import warnings
 import torch
 from transformers import AutoTokenizer, AutoModelForCausalLM
 from tqdm import tqdm
-from llm_utils import rewrite_headline
-import pandas as pd
-import os
-import gc
+from llm_utils import REWRITE_PROMPT_VERSION
+from context_utils import ContextPreprocessor
+from result_cache import GenerationCache
+from rewrite_pipeline import RewritePipeline
+from src.data import (
+    ResumeManifest, BufferedCsvWriter, ShardSpec, ROW_ID_COLUMN, merge_shard_outputs,
+    iter_pending_chunks
+)
+from src.utils.memory import MemoryReleaser
+from src.utils.pipelining import PipelinedExecutor, Stage
 from huggingface_hub import login
 import shutil
 from dotenv import load_dotenv
@@ -13,41 +24,92 @@ from dotenv import load_dotenv
 # === Load environment variables ===
 load_dotenv()
 
-tqdm.pandas()
-
-# Login to Hugging Face Hub securely
-hf_token = os.getenv("HF_API_TOKEN")
-if hf_token:
-    login(hf_token)
-else:
-    raise ValueError("❌ Missing HF_API_TOKEN in environment variables")
-
 # Disable warnings and telemetry
 warnings.filterwarnings("ignore")
 
 is_sage_maker = "SM_MODEL_DIR" in os.environ
 
 if is_sage_maker:
-    # Look for paths
-    for root, dirs, files in os.walk('/opt/ml/processing'):
-        print(f"Directory: {root}")
-        for file in files:
-            print(f"-> {file}")
     input_path = '/opt/ml/processing/input/headline_news.csv'
     output_path = '/opt/ml/processing/output/output_headline_news_missing.csv'
     cache_dir = "/opt/ml/processing/cache"
-    print("Running in SageMaker")
+    # Written under the output dir so it is uploaded; earlier runs' copies come back here
+    generation_cache_dir = '/opt/ml/processing/output/generation_cache'
+    previous_cache_dir = '/opt/ml/processing/generation_cache'
 
 else:
     input_path = 'input/headline_news.csv'
     output_path = 'output/output_headline_news.csv'
     cache_dir = './cache'
-    print("Running Local")
+    generation_cache_dir = cache_dir
+    previous_cache_dir = None
 
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 model_name = 'mistralai/Mistral-7B-Instruct-v0.2'
-
+# Optional draft model for assisted decoding; must share the Mistral tokenizer
+draft_model_name = os.environ.get("DRAFT_MODEL_NAME")
+batch_size = int(os.environ.get("BATCH_SIZE", "16"))
+# Rows handed to the generator at once; prompts are length-bucketed within a chunk
+chunk_size = batch_size * int(os.environ.get("BUCKET_BATCHES", "16"))
+# Article context budget in tokens (0 = no limit) and HTML-cleaning pool size
+max_context_tokens = int(os.environ.get("MAX_CONTEXT_TOKENS", "512") or 0) or None
+preprocess_workers = int(os.environ.get("PREPROCESS_WORKERS", os.cpu_count() or 1))
+output_columns = ["symbol", "symbol_name", "headline", "generated_headline"]
+# Output is committed every FLUSH_ROWS rows or FLUSH_SECONDS seconds
+flush_rows = int(os.environ.get("FLUSH_ROWS", str(chunk_size)))
+flush_seconds = float(os.environ.get("FLUSH_SECONDS", "60"))
+# Rows are split across instances by SHARD_INDEX / NUM_SHARDS (or the SageMaker hosts)
+shard = ShardSpec.from_env()
+# Generation cache shared across runs (empty = disabled); one file per shard, so
+# parallel instances never overwrite each other's upload
+generation_cache_path = os.environ.get(
+    "GENERATION_CACHE_PATH",
+    shard.output_path(os.path.join(generation_cache_dir, "headline_generations.sqlite"))
+)
+release_memory_every = int(os.environ.get("RELEASE_MEMORY_EVERY", "50"))
+# Chunks in flight between pipeline stages
+pipeline_queue_size = int(os.environ.get("PIPELINE_QUEUE_SIZE", "2"))
+
+
+def to_records(job):
+    """Serialize a finished chunk into (row ids, output records)."""
+    row_ids = [row.row_id for row in job.rows]
+    records = [
+        {ROW_ID_COLUMN: row_id, **result}
+        for row_id, result in zip(row_ids, job.result())
+    ]
+    return row_ids, records
+
+
+# Side effects stay under __main__: the context-cleaning pool's forkserver and
+# its workers import this script as __mp_main__
 if __name__ == "__main__":
+    if is_sage_maker:
+        # Look for paths
+        for root, dirs, files in os.walk('/opt/ml/processing'):
+            print(f"Directory: {root}")
+            for file in files:
+                print(f"-> {file}")
+        print("Running in SageMaker")
+    else:
+        print("Running Local")
+
+    # Merge step: combine per-shard outputs into the single-instance output
+    if os.environ.get("MERGE_SHARDS"):
+        # run.py's merge job downloads the shard outputs next to its own output dir
+        merged_rows = merge_shard_outputs(
+            output_path, shard.count, os.environ.get("SHARD_INPUT_DIR") or None
+        )
+        print(f"Merged {merged_rows} rows from {shard.count} shards into {output_path}")
+        sys.exit(0)
+
+    # Login to Hugging Face Hub securely
+    hf_token = os.getenv("HF_API_TOKEN")
+    if hf_token:
+        login(hf_token)
+    else:
+        raise ValueError("❌ Missing HF_API_TOKEN in environment variables")
+
     tokenizer = AutoTokenizer.from_pretrained(
         model_name,
         trust_remote_code=True,
@@ -65,51 +127,80 @@ if __name__ == "__main__":
     )
     print("Model loaded successfully")
 
-    # Main input dataframe
-    df = pd.read_csv(input_path)
+    draft_model = None
+    if draft_model_name:
+        draft_model = AutoModelForCausalLM.from_pretrained(
+            draft_model_name,
+            trust_remote_code=True,
+            cache_dir=cache_dir,
+            torch_dtype=torch.float16,
+            device_map="auto"
+        )
+        print(f"Draft model {draft_model_name} loaded, using assisted decoding")
 
     head_rows = os.environ.get("NUM_ROWS", None)
 
-    # Look for processed rows in output file
-    if os.path.exists(output_path):
-        processed_rows = sum(1 for _ in open(output_path)) - 1
-    else:
-        processed_rows = 0
+    # Look for processed rows in this shard's resume manifest
+    shard_path = shard.output_path(output_path)
+    manifest = ResumeManifest.for_output(shard_path)
 
     # Define which rows still need to be processed
-    header_written = os.path.exists(output_path)
-
     if head_rows == 'ALL':
-        rows_to_process = df.iloc[processed_rows:]
+        row_limit = None
     elif head_rows is not None:
-        rows_to_process = df.iloc[processed_rows:int(head_rows)]
+        row_limit = int(head_rows)
     else:
         raise ValueError('NUM_ROWS must be defined as ALL or a number')
+    # The input is streamed from the manifest's checkpoint, never loaded whole
+    chunks = iter_pending_chunks(input_path, manifest, chunk_size, shard, row_limit)
 
     # Main loop
     not is_sage_maker and os.makedirs('output', exist_ok=True)
-    for _, row in tqdm(
-        rows_to_process.iterrows(),
-        total=len(rows_to_process),
-        desc="\n Rewrite headline bar progress"
-    ):
-        try:
-            result = rewrite_headline(row, model, tokenizer, device)
-        except Exception as e:
-            print(f"Erro na linha {row.name}: {e}")
-            result = pd.Series({
-                "symbol": row.get("symbol", ""),
-                "symbol_name": row.get("name", ""),
-                "headline": row.get("headline", ""),
-                "generated_headline": "[ERROR]",
-            })
-
-        result.to_frame().T.to_csv(
-            output_path, index=False, mode='a', header=not header_written
+    preprocessor = ContextPreprocessor(
+        tokenizer, max_tokens=max_context_tokens, num_workers=preprocess_workers
+    )
+    generation_cache = GenerationCache(
+        generation_cache_path, model_name, REWRITE_PROMPT_VERSION, max_context_tokens
+    ) if generation_cache_path else None
+    if generation_cache is not None and previous_cache_dir and os.path.isdir(previous_cache_dir):
+        # Start from every cache file the previous run (all of its shards) uploaded
+        for path in sorted(glob.glob(os.path.join(previous_cache_dir, "*.sqlite"))):
+            added = generation_cache.merge_from(path)
+            print(f"Generation cache: {added} entries from {os.path.basename(path)}")
+    writer = BufferedCsvWriter(
+        shard_path, ([ROW_ID_COLUMN] if shard.is_sharded else []) + output_columns, manifest,
+        flush_rows=flush_rows, flush_seconds=flush_seconds
+    )
+    releaser = MemoryReleaser(every_n_steps=release_memory_every)
+    progress = tqdm(desc="\n Rewrite headline bar progress")
+
+    def write_chunk(item):
+        row_ids, records = item
+        writer.write_many(row_ids, records)
+        progress.update(len(row_ids))
+        releaser.step()
+
+    # prepare (CPU) → generate (GPU) → decode (CPU) → serialize (CPU) → write
+    rewriter = RewritePipeline(
+        model, tokenizer, device, preprocessor, generation_cache,
+        batch_size=batch_size, draft_model=draft_model
+    )
+    executor = PipelinedExecutor(
+        rewriter.stages() + [Stage("serialize", to_records)],
+        queue_size=pipeline_queue_size
+    )
+    try:
+        executor.run(chunks, sink=write_chunk)
+    finally:
+        # Commit every chunk that made it through, even if a stage failed
+        writer.close()
+        progress.close()
+    preprocessor.close()
+    generation_cache and generation_cache.close()
+    if draft_model is not None:
+        stats = rewriter.speculative_stats
+        tqdm.write(
+            f"Assisted decoding: acceptance rate {stats.acceptance_rate:.1%}, "
+            f"{stats.tokens_per_target_call:.2f} tokens per target forward pass"
         )
-        header_written = True
-
-        torch.cuda.empty_cache()
-        gc.collect()
-
     tqdm.write("✅ Output successfully saved.")
@@ -0,0 +1,156 @@
+"""Persistent cache of rewritten headlines shared across pipeline runs."""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from context_utils import content_hash
+
+# SQLite limits the number of bound parameters per statement
+_QUERY_CHUNK = 500
+
+
+class GenerationCache:
+    """SQLite-backed store of generated headlines keyed by prompt inputs.
+
+    Keys hash the symbol, symbol name, headline and article content
+    together with the model name, prompt version and context budget, so
+    changing any of them naturally invalidates earlier results.
+
+    Attributes:
+        path: Location of the SQLite database file
+        model_name: Model whose generations are stored
+        prompt_version: Version tag of the rewrite prompt
+
+    Example:
+        >>> with GenerationCache("cache/headlines.sqlite", model_name, "1") as cache:
+        ...     key = cache.make_key("GLD", "Gold ETF", "Gold rallies", "<p>...</p>")
+        ...     cache.get_many([key])
+        {}
+    """
+
+    def __init__(
+        self,
+        path: str,
+        model_name: str,
+        prompt_version: str,
+        max_context_tokens: Optional[int] = None
+    ):
+        """Open (or create) the cache database.
+
+        Args:
+            path: Location of the SQLite database file
+            model_name: Model whose generations are stored
+            prompt_version: Version tag of the rewrite prompt
+            max_context_tokens: Context budget the prompts were built with
+        """
+        self.path = path
+        self.model_name = model_name
+        self.prompt_version = prompt_version
+        self.max_context_tokens = max_context_tokens
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Shared by the pipeline's prepare and decode threads, guarded by _lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        # WAL lets concurrent jobs read while another one writes
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS generations ("
+            "key TEXT PRIMARY KEY, generated TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def make_key(self, symbol: Any, symbol_name: Any, headline: Any, content: Any) -> str:
+        """Build the cache key for one rewrite request.
+
+        Args:
+            symbol: Target trading symbol
+            symbol_name: Human-readable symbol name
+            headline: Original headline
+            content: Raw article content (HTML), possibly missing
+
+        Returns:
+            Hex SHA-256 digest identifying the request
+        """
+        payload = json.dumps([
+            self.model_name,
+            self.prompt_version,
+            self.max_context_tokens,
+            str(symbol),
+            str(symbol_name),
+            str(headline),
+            content_hash(content),
+        ])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, str]:
+        """Look up cached generations.
+
+        Args:
+            keys: Cache keys from :meth:`make_key`
+
+        Returns:
+            Mapping of the keys found to their generated headline
+        """
+        found: Dict[str, str] = {}
+        unique = list(dict.fromkeys(keys))
+        for i in range(0, len(unique), _QUERY_CHUNK):
+            chunk = unique[i:i + _QUERY_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT key, generated FROM generations WHERE key IN ({placeholders})",
+                    chunk
+                ).fetchall()
+            found.update(rows)
+        return found
+
+    def put_many(self, items: Iterable[Tuple[str, str]]) -> None:
+        """Store generated headlines.
+
+        Args:
+            items: (key, generated headline) pairs
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO generations (key, generated, created_at) VALUES (?, ?, ?)",
+                [(key, generated, now) for key, generated in items]
+            )
+            self._conn.commit()
+
+    def merge_from(self, path: str) -> int:
+        """Add the entries of another cache database that this one lacks.
+
+        Args:
+            path: SQLite file written by another ``GenerationCache``
+
+        Returns:
+            Number of entries added
+        """
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.execute("ATTACH DATABASE ? AS other", (path,))
+            try:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO generations (key, generated, created_at) "
+                    "SELECT key, generated, created_at FROM other.generations"
+                )
+                self._conn.commit()
+            finally:
+                self._conn.execute("DETACH DATABASE other")
+            return self._conn.total_changes - before
+
+    def close(self) -> None:
+        """Close the database connection."""
+        self._conn.close()
+
+    def __enter__(self) -> "GenerationCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,166 @@
+"""Pipelined headline rewriting: prepare → generate → decode stages."""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+import torch
+from transformers import AutoTokenizer, AutoModelForCausalLM
+from context_utils import ContextPreprocessor
+from llm_utils import (
+    build_rewrite_prompt,
+    build_generation_batches,
+    generate_batches,
+    decode_batches,
+)
+from result_cache import GenerationCache
+from speculative import SpeculativeStats
+from src.data import InputRecord
+from src.utils.pipelining import Stage
+
+ERROR_MARKER = "[ERROR]"
+
+
+@dataclass
+class RewriteJob:
+    """A chunk of input rows travelling through the rewrite pipeline.
+
+    Attributes:
+        rows: Input records (symbol, name, headline, content)
+        keys: Generation cache key per row (empty without a cache)
+        generated: Generated headline per cache key or row position
+        pending: Positions of the rows that need the model
+        batches: Padded generation batches for the pending rows
+        outputs: Generated token batches for the pending rows
+        error: First error raised while processing the chunk
+    """
+    rows: List[InputRecord]
+    keys: List[str] = field(default_factory=list)
+    generated: Dict[Any, str] = field(default_factory=dict)
+    pending: List[int] = field(default_factory=list)
+    batches: list = field(default_factory=list)
+    outputs: list = field(default_factory=list)
+    error: Optional[Exception] = None
+
+    def result(self) -> List[Dict[str, Any]]:
+        """Output rows for the chunk, ``[ERROR]`` everywhere if it failed."""
+        rows = self.rows
+        if self.error is not None:
+            generated = [ERROR_MARKER] * len(rows)
+        elif self.keys:
+            generated = [self.generated[key] for key in self.keys]
+        else:
+            generated = [self.generated[i] for i in range(len(rows))]
+        return [{
+            "symbol": row.get("symbol", ""),
+            "symbol_name": row.get("name", ""),
+            "headline": row.get("headline", ""),
+            "generated_headline": text,
+        } for row, text in zip(rows, generated)]
+
+
+class RewritePipeline:
+    """Stage functions for rewriting headlines with overlapped CPU/GPU work.
+
+    ``prepare`` (cache lookup, context cleaning, prompt building and
+    tokenization) and ``decode`` (detokenization and cache writes) only
+    use the CPU, so running them in their own threads around ``generate``
+    keeps the GPU busy. A failing chunk is reported and written as
+    ``[ERROR]`` rows without stopping the job.
+
+    Example:
+        >>> rewriter = RewritePipeline(model, tokenizer, device, preprocessor)
+        >>> PipelinedExecutor(rewriter.stages()).run(chunks, sink=write)
+    """
+
+    def __init__(
+        self,
+        model: AutoModelForCausalLM,
+        tokenizer: AutoTokenizer,
+        device: torch.device,
+        preprocessor: ContextPreprocessor,
+        generation_cache: Optional[GenerationCache] = None,
+        batch_size: int = 16,
+        max_new_tokens: int = 256,
+        draft_model: Optional[AutoModelForCausalLM] = None
+    ):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.device = device
+        self.preprocessor = preprocessor
+        self.generation_cache = generation_cache
+        self.batch_size = batch_size
+        self.max_new_tokens = max_new_tokens
+        self.draft_model = draft_model
+        self.speculative_stats = SpeculativeStats()
+
+    def stages(self) -> List[Stage]:
+        """Pipeline stages in execution order."""
+        return [
+            Stage("prepare", self.prepare),
+            Stage("generate", self.generate),
+            Stage("decode", self.decode),
+        ]
+
+    def _fail(self, job: RewriteJob, error: Exception) -> RewriteJob:
+        rows = job.rows
+        print(f"Error at rows {rows[0].row_id}-{rows[-1].row_id}: {error}")
+        job.error = error
+        return job
+
+    def prepare(self, rows: List[InputRecord]) -> RewriteJob:
+        """Look up cached results and tokenize prompts for the rest."""
+        job = RewriteJob(rows=rows)
+        try:
+            if self.generation_cache is not None:
+                job.keys = [
+                    self.generation_cache.make_key(
+                        row["symbol"], row["name"], row["headline"], row["content"]
+                    )
+                    for row in rows
+                ]
+                job.generated = self.generation_cache.get_many(job.keys)
+                job.pending = [i for i, key in enumerate(job.keys) if key not in job.generated]
+            else:
+                job.pending = list(range(len(rows)))
+
+            if job.pending:
+                todo = [rows[i] for i in job.pending]
+                contexts = self.preprocessor.prepare([row["content"] for row in todo])
+                prompts = [
+                    build_rewrite_prompt(row, self.tokenizer, context)
+                    for row, context in zip(todo, contexts)
+                ]
+                job.batches = build_generation_batches(prompts, self.tokenizer, self.batch_size)
+        except Exception as e:
+            return self._fail(job, e)
+        return job
+
+    def generate(self, job: RewriteJob) -> RewriteJob:
+        """Run the model on the prepared batches."""
+        if job.error is not None or not job.batches:
+            return job
+        try:
+            job.outputs = generate_batches(
+                job.batches, self.model, self.tokenizer, self.device, self.max_new_tokens,
+                draft_model=self.draft_model, stats=self.speculative_stats
+            )
+        except Exception as e:
+            return self._fail(job, e)
+        job.batches = []
+        return job
+
+    def decode(self, job: RewriteJob) -> RewriteJob:
+        """Decode generated tokens and store them in the cache."""
+        if job.error is not None or not job.pending:
+            return job
+        try:
+            texts = decode_batches(job.outputs, self.tokenizer, len(job.pending))
+            if job.keys:
+                fresh = [(job.keys[i], text) for i, text in zip(job.pending, texts)]
+                job.generated.update(fresh)
+                self.generation_cache.put_many(fresh)
+            else:
+                job.generated = dict(zip(job.pending, texts))
+        except Exception as e:
+            return self._fail(job, e)
+        job.outputs = []
+        return job
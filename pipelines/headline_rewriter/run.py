@@ -0,0 +1,120 @@
+"""
+SageMaker job runner for the Mistral headline rewriter pipeline.
+Rewrites news headlines for their target symbol before sentiment analysis.
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
+
+from sagemaker.processing import ProcessingInput, ProcessingOutput
+from src.config.settings import Config
+from src.utils.sagemaker_utils import (
+    create_sagemaker_session,
+    generate_job_name,
+    create_processor,
+    run_processing_job,
+    s3_prefix_exists,
+    stage_source_dir
+)
+
+
+def main():
+    # Load configuration
+    config = Config.load()
+    config.validate()
+
+    # Setup SageMaker
+    session = create_sagemaker_session(config.aws.region)
+    job_name = generate_job_name("headline-rewriter")
+
+    # Create processor
+    processor = create_processor(
+        image_uri=config.aws.ecr_image,
+        role=config.aws.sagemaker_role,
+        instance_type=config.model.instance_type_inference,
+        instance_count=config.model.instance_count,
+        volume_size_gb=50,
+        job_name=job_name,
+        sagemaker_session=session,
+        env_vars={
+            'NUM_ROWS': config.model.num_rows,
+            'HF_API_TOKEN': config.model.hf_token,
+            'BATCH_SIZE': str(config.model.batch_size)
+        }
+    )
+
+    # Define I/O
+    inputs = [
+        ProcessingInput(
+            source=f's3://{config.aws.bucket}/rewriter_pipeline/input/',
+            destination='/opt/ml/processing/input/'
+        )
+    ]
+    # Generation caches uploaded by earlier runs (under the output dir); the job
+    # merges them into its own cache before rewriting
+    cache_prefix = 'rewriter_pipeline/output/generation_cache/'
+    if s3_prefix_exists(config.aws.bucket, cache_prefix, config.aws.region):
+        inputs.append(ProcessingInput(
+            source=f's3://{config.aws.bucket}/{cache_prefix}',
+            destination='/opt/ml/processing/generation_cache/',
+            input_name="generation_cache"
+        ))
+
+    outputs = [
+        ProcessingOutput(
+            source='/opt/ml/processing/output/',
+            destination=f's3://{config.aws.bucket}/rewriter_pipeline/output/'
+        )
+    ]
+
+    # Run job
+    print(f"🚀 Starting headline rewriter job: {job_name}")
+    # The job imports the shared src package, so it ships with the pipeline
+    source_dir = stage_source_dir({".": "pipelines/headline_rewriter", "src": "src"})
+    run_processing_job(
+        processor=processor,
+        code_file="process.py",
+        source_dir=source_dir,
+        inputs=inputs,
+        outputs=outputs,
+        job_name=job_name
+    )
+
+    # Each instance wrote its own shard output; a single-instance job merges
+    # them into the output an unsharded run would have produced
+    num_shards = config.model.instance_count
+    if num_shards > 1:
+        merge_job_name = generate_job_name("headline-rewriter-merge")
+        merge_processor = create_processor(
+            image_uri=config.aws.ecr_image,
+            role=config.aws.sagemaker_role,
+            instance_type=config.model.instance_type_inference,
+            instance_count=1,
+            volume_size_gb=50,
+            job_name=merge_job_name,
+            sagemaker_session=session,
+            env_vars={
+                'MERGE_SHARDS': '1',
+                'NUM_SHARDS': str(num_shards),
+                'SHARD_INPUT_DIR': '/opt/ml/processing/shards/'
+            }
+        )
+        print(f"🚀 Merging {num_shards} shard outputs: {merge_job_name}")
+        run_processing_job(
+            processor=merge_processor,
+            code_file="process.py",
+            source_dir=source_dir,
+            inputs=[
+                ProcessingInput(
+                    source=f's3://{config.aws.bucket}/rewriter_pipeline/output/',
+                    destination='/opt/ml/processing/shards/'
+                )
+            ],
+            outputs=outputs,
+            job_name=merge_job_name
+        )
+
+
+if __name__ == "__main__":
+    main()
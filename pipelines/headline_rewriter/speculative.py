@@ -0,0 +1,233 @@
+"""Assisted (speculative) greedy decoding with a small draft model.
+
+The draft model proposes a few tokens greedily and the target model checks
+them all in one forward pass. The longest prefix the target agrees with is
+kept, plus the target's own next token, so the output is the target's greedy
+decode.
+
+transformers' ``generate(..., assistant_model=draft)`` implements the same
+algorithm and produces the same tokens (the tests check this). This loop
+is kept because the library reports neither drafted nor accepted tokens,
+and the rewriter job logs the acceptance rate to show whether a draft
+model pays off; the library also grows and shrinks the draft length within
+a call unless the draft model's ``generation_config`` is switched to a
+constant schedule, while here it is the fixed ``num_draft_tokens`` being
+benchmarked. Runs on CPU with tiny random-weight models for benchmarking:
+
+    python speculative.py
+"""
+
+import os
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+import torch
+from transformers import AutoTokenizer, AutoModelForCausalLM
+
+
+@dataclass
+class SpeculativeStats:
+    """Counters collected during assisted decoding.
+
+    Attributes:
+        drafted: Tokens proposed by the draft model
+        accepted: Draft tokens accepted by the target model
+        generated: Tokens emitted in total
+        target_calls: Target model forward passes
+        draft_calls: Draft model forward passes
+    """
+    drafted: int = 0
+    accepted: int = 0
+    generated: int = 0
+    target_calls: int = 0
+    draft_calls: int = 0
+
+    @property
+    def acceptance_rate(self) -> float:
+        """Fraction of drafted tokens the target model accepted."""
+        return self.accepted / self.drafted if self.drafted else 0.0
+
+    @property
+    def tokens_per_target_call(self) -> float:
+        """Average tokens emitted per target forward pass (1.0 = plain greedy)."""
+        return self.generated / self.target_calls if self.target_calls else 0.0
+
+
+def _cache_length(past: Any) -> int:
+    if hasattr(past, "get_seq_length"):
+        return past.get_seq_length()
+    return past[0][0].shape[2]
+
+
+def _crop_cache(past: Any, length: int) -> Any:
+    """Drop cached positions past ``length`` (rejected draft tokens)."""
+    if hasattr(past, "crop"):
+        past.crop(length)
+        return past
+    return tuple((k[:, :, :length], v[:, :, :length]) for k, v in past)
+
+
+def _forward(
+    model: AutoModelForCausalLM,
+    tokens: List[int],
+    past: Any,
+    device: torch.device
+) -> Tuple[torch.Tensor, Any]:
+    input_ids = torch.tensor([tokens], dtype=torch.long, device=device)
+    out = model(input_ids=input_ids, past_key_values=past, use_cache=True)
+    return out.logits[0], out.past_key_values
+
+
+@torch.no_grad()
+def assisted_greedy_generate(
+    input_ids: Sequence[int],
+    model: AutoModelForCausalLM,
+    draft_model: AutoModelForCausalLM,
+    max_new_tokens: int = 256,
+    num_draft_tokens: int = 4,
+    eos_token_ids: Iterable[int] = (),
+    stats: Optional[SpeculativeStats] = None
+) -> List[int]:
+    """Greedy-decode one prompt with draft-model speculation.
+
+    Args:
+        input_ids: Prompt token ids (unpadded)
+        model: Target causal language model
+        draft_model: Smaller model sharing the target's tokenizer
+        max_new_tokens: Maximum number of tokens to generate
+        num_draft_tokens: Tokens proposed by the draft model per step
+        eos_token_ids: Token ids that end the sequence (kept in the output)
+        stats: Optional counters updated in place
+
+    Returns:
+        Newly generated token ids, identical to greedy decoding of ``model``
+    """
+    stats = stats if stats is not None else SpeculativeStats()
+    device = next(model.parameters()).device
+    draft_device = next(draft_model.parameters()).device
+    eos = set(eos_token_ids)
+
+    # Invariant: both caches cover at most seq[:-1]; seq[-1] is not yet fed
+    prompt = [int(t) for t in input_ids]
+    logits, target_past = _forward(model, prompt, None, device)
+    _, draft_past = _forward(draft_model, prompt, None, draft_device)
+    stats.target_calls += 1
+    stats.draft_calls += 1
+    seq = prompt + [int(logits[-1].argmax())]
+    new = seq[len(prompt):]
+
+    while len(new) < max_new_tokens and new[-1] not in eos:
+        # The target always adds one token of its own, so leave room for it
+        k = min(num_draft_tokens, max_new_tokens - len(new) - 1)
+        draft: List[int] = []
+        feed = seq[_cache_length(draft_past):]
+        for _ in range(k):
+            draft_logits, draft_past = _forward(draft_model, feed, draft_past, draft_device)
+            stats.draft_calls += 1
+            token = int(draft_logits[-1].argmax())
+            draft.append(token)
+            feed = [token]
+            if token in eos:
+                break
+
+        # Verify all draft tokens with a single target forward pass
+        feed = seq[_cache_length(target_past):] + draft
+        logits, target_past = _forward(model, feed, target_past, device)
+        stats.target_calls += 1
+        preds = logits[-(len(draft) + 1):].argmax(dim=-1).tolist()
+
+        n = 0
+        while n < len(draft) and draft[n] == preds[n]:
+            n += 1
+        accepted = draft[:n] + [preds[n]]
+        stats.drafted += len(draft)
+        stats.accepted += n
+
+        for i, token in enumerate(accepted):
+            if token in eos:
+                accepted = accepted[:i + 1]
+                break
+        accepted = accepted[:max_new_tokens - len(new)]
+        seq += accepted
+        new += accepted
+
+        target_past = _crop_cache(target_past, len(seq) - 1)
+        draft_past = _crop_cache(draft_past, min(_cache_length(draft_past), len(seq) - 1))
+
+    stats.generated += len(new)
+    return new
+
+
+def benchmark(
+    prompts: List[str],
+    model: AutoModelForCausalLM,
+    draft_model: AutoModelForCausalLM,
+    tokenizer: AutoTokenizer,
+    max_new_tokens: int = 32,
+    num_draft_tokens: int = 4
+) -> dict:
+    """Compare assisted decoding against plain greedy ``generate``.
+
+    Args:
+        prompts: Prompts decoded one at a time by both methods
+        model: Target causal language model
+        draft_model: Draft model sharing the tokenizer
+        tokenizer: Shared tokenizer
+        max_new_tokens: Maximum number of tokens to generate
+        num_draft_tokens: Tokens proposed by the draft model per step
+
+    Returns:
+        Dictionary with exact-match rate, acceptance rate and timings
+    """
+    stats = SpeculativeStats()
+    device = next(model.parameters()).device
+    greedy_time = assisted_time = 0.0
+    matches = 0
+    for prompt in prompts:
+        ids = tokenizer.encode(prompt)
+
+        start = time.perf_counter()
+        with torch.no_grad():
+            output = model.generate(
+                torch.tensor([ids], device=device),
+                max_new_tokens=max_new_tokens,
+                do_sample=False,
+                eos_token_id=tokenizer.eos_token_id,
+                pad_token_id=tokenizer.eos_token_id,
+            )
+        greedy_time += time.perf_counter() - start
+        greedy = output[0, len(ids):].tolist()
+
+        start = time.perf_counter()
+        assisted = assisted_greedy_generate(
+            ids, model, draft_model, max_new_tokens, num_draft_tokens,
+            eos_token_ids=[tokenizer.eos_token_id], stats=stats
+        )
+        assisted_time += time.perf_counter() - start
+        matches += assisted == greedy
+
+    return {
+        "exact_match_rate": matches / len(prompts),
+        "acceptance_rate": stats.acceptance_rate,
+        "tokens_per_target_call": stats.tokens_per_target_call,
+        "greedy_seconds": greedy_time,
+        "assisted_seconds": assisted_time,
+        "speedup": greedy_time / assisted_time if assisted_time else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
+    from src.testing import build_tiny_model_pair, build_tiny_tokenizer
+
+    prompts = [
+        "[INST] Rewrite the headline to focus only on the symbol GLD. [/INST]",
+        "[INST] Gold prices surge as the dollar weakens [/INST]",
+        "[INST] Miners rally after central bank purchases [/INST]",
+        "[INST] Silver slips while gold holds near record highs [/INST]",
+    ]
+    tokenizer = build_tiny_tokenizer(prompts)
+    target, draft = build_tiny_model_pair(tokenizer)
+    for name, value in benchmark(prompts, target, draft, tokenizer).items():
+        print(f"{name}: {value:.3f}")
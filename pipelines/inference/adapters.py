@@ -0,0 +1,270 @@
+"""Serving many LoRA adapters on one resident base model.
+
+``load_lora_model`` loads a full base model per adapter. ``AdapterRegistry``
+keeps a single base model on the device and loads the (small) LoRA weights
+of registered adapters on demand, evicting the least recently used one when
+``max_loaded`` is reached, so device memory grows with the number of
+adapters rather than with base-model copies. A batch of requests for
+different adapters is grouped by adapter and each group runs under its
+adapter, which costs at most one switch per adapter in the batch. Compare
+switches with and without grouping on CPU with a tiny random model:
+
+    python adapters.py
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
+import torch
+from transformers import AutoTokenizer, AutoModelForCausalLM
+from peft import PeftModel
+from inference import load_base_model
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+@dataclass
+class AdapterStats:
+    """Counters of adapter loads and switches.
+
+    Attributes:
+        requests: Requests served
+        loads: Adapters loaded from disk
+        evictions: Adapters unloaded to make room
+        switches: Changes of the active adapter
+    """
+    requests: int = 0
+    loads: int = 0
+    evictions: int = 0
+    switches: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """Share of activations served by an adapter already in memory."""
+        return 1 - self.loads / self.switches if self.switches else 0.0
+
+
+class AdapterRegistry:
+    """LRU set of LoRA adapters on a single base model.
+
+    Example:
+        >>> registry = AdapterRegistry.from_base(base_model, "./cache", {"GLD": "output/gld"})
+        >>> with registry.use("GLD") as model:
+        ...     generate_json_response(prompt, model, registry.tokenizer, device)
+    """
+
+    def __init__(
+        self,
+        base_model: AutoModelForCausalLM,
+        tokenizer: AutoTokenizer,
+        adapters: Optional[Dict[str, str]] = None,
+        max_loaded: int = 4
+    ):
+        """
+        Args:
+            base_model: Base model, loaded once and shared by all adapters
+            tokenizer: Matching tokenizer
+            adapters: Adapter name to adapter directory
+            max_loaded: Adapters kept in memory at the same time
+        """
+        if max_loaded < 1:
+            raise ValueError(f"max_loaded must be at least 1, got {max_loaded}")
+        self.base_model = base_model
+        self.tokenizer = tokenizer
+        self.max_loaded = max_loaded
+        self.adapter_dirs: Dict[str, str] = dict(adapters or {})
+        self.stats = AdapterStats()
+        self.model: Optional[PeftModel] = None
+        self.active: Optional[str] = None
+        # Loaded adapters, least recently used first
+        self._loaded: "OrderedDict[str, None]" = OrderedDict()
+
+    @classmethod
+    def from_base(
+        cls,
+        base_model: str,
+        cache_dir: str,
+        adapters: Optional[Dict[str, str]] = None,
+        max_loaded: int = 4
+    ) -> "AdapterRegistry":
+        """Load the base model once, as ``load_lora_model`` does, and wrap it in a registry."""
+        model, tokenizer = load_base_model(base_model, cache_dir)
+        return cls(model, tokenizer, adapters, max_loaded)
+
+    @property
+    def loaded(self) -> List[str]:
+        """Adapters in memory, least recently used first."""
+        return list(self._loaded)
+
+    def register(self, name: str, adapter_dir: str) -> None:
+        """Make an adapter available without loading it."""
+        if name in self._loaded and self.adapter_dirs.get(name) != adapter_dir:
+            self._unload(name)
+        self.adapter_dirs[name] = adapter_dir
+
+    def activate(self, name: str) -> PeftModel:
+        """Load the adapter if needed and make it the active one.
+
+        Args:
+            name: Registered adapter name
+
+        Returns:
+            The shared model with ``name`` active
+        """
+        if name not in self.adapter_dirs:
+            raise KeyError(f"Unknown adapter: {name}")
+        if name not in self._loaded:
+            while len(self._loaded) >= self.max_loaded:
+                self._unload(next(iter(self._loaded)))
+            self._load(name)
+        self._loaded.move_to_end(name)
+        if self.active != name:
+            self.model.set_adapter(name)
+            self.active = name
+            self.stats.switches += 1
+        return self.model
+
+    @contextmanager
+    def use(self, name: str) -> Iterator[PeftModel]:
+        """Context manager form of :meth:`activate`."""
+        yield self.activate(name)
+
+    def run_grouped(
+        self,
+        requests: Sequence[Tuple[str, T]],
+        fn: Callable[[PeftModel, List[T]], List[R]]
+    ) -> List[R]:
+        """Serve a batch of mixed-adapter requests with the fewest switches.
+
+        Args:
+            requests: ``(adapter name, payload)`` pairs
+            fn: Called once per adapter with the active model and that
+                adapter's payloads; returns one result per payload
+
+        Returns:
+            Results in the order of ``requests``
+        """
+        results: List[Optional[R]] = [None] * len(requests)
+        for name, indices in group_by_adapter([name for name, _ in requests], self.active):
+            model = self.activate(name)
+            outputs = fn(model, [requests[i][1] for i in indices])
+            for i, output in zip(indices, outputs):
+                results[i] = output
+            self.stats.requests += len(indices)
+        return results
+
+    def _load(self, name: str) -> None:
+        adapter_dir = self.adapter_dirs[name]
+        if self.model is None:
+            self.model = PeftModel.from_pretrained(self.base_model, adapter_dir, adapter_name=name)
+            self.model.eval()
+        else:
+            self.model.load_adapter(adapter_dir, adapter_name=name)
+        self._loaded[name] = None
+        self.stats.loads += 1
+
+    def _unload(self, name: str) -> None:
+        self.model.base_model.delete_adapter(name)
+        del self._loaded[name]
+        if self.active == name:
+            self.active = None
+        self.stats.evictions += 1
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+
+def group_by_adapter(names: Sequence[str], active: Optional[str] = None) -> List[Tuple[str, List[int]]]:
+    """Group request indices by adapter.
+
+    Groups follow first appearance, except that the active adapter (if
+    requested at all) goes first so the batch starts without a switch.
+
+    Args:
+        names: Adapter name of each request
+        active: Currently active adapter
+
+    Returns:
+        ``(adapter name, request indices)`` per adapter
+    """
+    groups: Dict[str, List[int]] = {}
+    for i, name in enumerate(names):
+        groups.setdefault(name, []).append(i)
+    order = sorted(groups, key=lambda name: name != active)
+    return [(name, groups[name]) for name in order]
+
+
+def benchmark(
+    registry: AdapterRegistry,
+    requests: Sequence[Tuple[str, str]],
+    batch_size: int = 16
+) -> Dict[str, float]:
+    """Compare request-by-request adapter switching with grouped batches.
+
+    Args:
+        registry: Registry with every adapter of ``requests`` registered
+        requests: ``(adapter name, prompt)`` pairs
+        batch_size: Requests grouped together
+
+    Returns:
+        Dictionary with switches, loads and seconds of each mode
+    """
+    device = next(registry.base_model.parameters()).device
+
+    def forward(model: PeftModel, prompts: List[str]) -> List[int]:
+        with torch.no_grad():
+            outputs = []
+            for prompt in prompts:
+                ids = registry.tokenizer(prompt, return_tensors="pt")["input_ids"].to(device)
+                outputs.append(int(model(input_ids=ids).logits[0, -1].argmax()))
+            return outputs
+
+    results: Dict[str, float] = {}
+    for mode in ("sequential", "grouped"):
+        for name in registry.loaded:
+            registry._unload(name)
+        registry.stats = AdapterStats()
+        start = time.perf_counter()
+        if mode == "sequential":
+            for name, prompt in requests:
+                forward(registry.activate(name), [prompt])
+        else:
+            for i in range(0, len(requests), batch_size):
+                registry.run_grouped(requests[i:i + batch_size], forward)
+        results[f"{mode}_seconds"] = time.perf_counter() - start
+        results[f"{mode}_switches"] = float(registry.stats.switches)
+        results[f"{mode}_loads"] = float(registry.stats.loads)
+    return results
+
+
+if __name__ == "__main__":
+    from peft import LoraConfig, get_peft_model
+    sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
+    from src.testing import build_tiny_model, build_tiny_tokenizer
+    from schema import tokenizer_corpus
+
+    tokenizer = build_tiny_tokenizer(tokenizer_corpus())
+    symbols = ["GLD", "IAU", "GDX", "NEM", "GOLD", "SLV"]
+    with tempfile.TemporaryDirectory() as tmp:
+        adapters = {}
+        for seed, symbol in enumerate(symbols):
+            lora = LoraConfig(
+                r=8, lora_alpha=16, target_modules=["q_proj", "v_proj"],
+                task_type="CAUSAL_LM", init_lora_weights=False,
+            )
+            get_peft_model(build_tiny_model(tokenizer, seed=seed), lora).save_pretrained(
+                os.path.join(tmp, symbol)
+            )
+            adapters[symbol] = os.path.join(tmp, symbol)
+
+        registry = AdapterRegistry(build_tiny_model(tokenizer), tokenizer, adapters, max_loaded=4)
+        rng = random.Random(0)
+        requests = [(rng.choice(symbols), f"News: {symbol} moves on Fed remarks") for symbol in symbols * 32]
+        for name, value in benchmark(registry, requests).items():
+            print(f"{name}: {value:.3f}")
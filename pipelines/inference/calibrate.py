@@ -0,0 +1,202 @@
+"""Fit the score-mode softmax temperature on labelled rows.
+
+Every labelled prompt is scored with ``score_prediction``; the
+log-likelihoods of all horizons whose true (direction, magnitude) pair is
+known are pooled and ``fit_temperature`` picks the temperature that
+minimizes their NLL. The result is saved as ``temperature.json`` in the
+model directory, where ``process.py`` (``DECODING_MODE=score``) loads
+it:
+
+    python calibrate.py --input input/training_database.csv --adapter-dir output/finetuned-mistral
+    python calibrate.py --input input/training_database.csv --merged-dir output/merged
+
+Prompts are built with the layout saved in the model directory's
+``training_config.yaml`` (``--prompt-layout`` overrides it). Use rows the
+model was not trained on (``--holdout-every`` keeps every n-th input row).
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
+# build_prompt is shipped next to this script; locally it lives with the training code
+sys.path.append(os.path.join(os.path.dirname(__file__), '../model_training'))
+
+import argparse
+import itertools
+import math
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import torch
+import torch.nn.functional as F
+from transformers import AutoTokenizer, AutoModelForCausalLM
+from tqdm import tqdm
+from constrained import prediction_trie
+from inference import load_training_config
+from prefix_cache import PrefixCache
+from prompts import PROMPT_LAYOUTS, build_prompt
+from schema import DIRECTIONS, HORIZONS, MAGNITUDES
+from scoring import candidate_index, fit_temperature, save_temperature, score_prediction
+from src.data import iter_records
+
+
+def horizon_targets(labels: Dict[str, Any]) -> List[Optional[int]]:
+    """Index of the true pair of each horizon, None where a label is missing or unknown."""
+    targets = []
+    for horizon in HORIZONS:
+        direction, magnitude = labels.get(f"direction_{horizon}"), labels.get(f"magnitude_{horizon}")
+        known = direction in DIRECTIONS and magnitude in MAGNITUDES
+        targets.append(candidate_index(direction, magnitude) if known else None)
+    return targets
+
+
+def collect_log_likelihoods(
+    prompts: Sequence[str],
+    labels: Sequence[Dict[str, Any]],
+    model: AutoModelForCausalLM,
+    tokenizer: AutoTokenizer,
+    prefix_cache: Optional[PrefixCache] = None
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Score labelled prompts and pair each horizon's scores with its true pair.
+
+    Args:
+        prompts: Prediction prompts
+        labels: Direction and magnitude labels of each prompt, keyed like
+            the prediction (``direction_6h``, ``magnitude_6h``, ...)
+        model: Fine-tuned causal language model
+        tokenizer: Matching tokenizer with a chat template
+        prefix_cache: Optional cache of the shared prompt prefix
+
+    Returns:
+        Tuple of (``[examples, len(HORIZON_CANDIDATES)]`` log-likelihoods,
+        ``[examples]`` target indices), one example per labelled horizon
+    """
+    trie = prediction_trie(tokenizer)
+    scores, targets = [], []
+    for prompt, row_labels in zip(tqdm(prompts, desc="Scoring"), labels):
+        text = tokenizer.apply_chat_template(
+            [{"role": "user", "content": prompt}], tokenize=False, add_generation_prompt=True
+        )
+        _, log_likelihoods = score_prediction(
+            tokenizer(text)["input_ids"], model, trie, prefix_cache=prefix_cache
+        )
+        for horizon_scores, target in zip(log_likelihoods, horizon_targets(row_labels)):
+            if target is not None:
+                scores.append(horizon_scores)
+                targets.append(target)
+    if not targets:
+        raise ValueError("No labelled horizons to calibrate on")
+    return torch.stack(scores), torch.tensor(targets)
+
+
+def calibrate(
+    prompts: Sequence[str],
+    labels: Sequence[Dict[str, Any]],
+    model: AutoModelForCausalLM,
+    tokenizer: AutoTokenizer,
+    prefix_cache: Optional[PrefixCache] = None
+) -> Dict[str, float]:
+    """Fit the temperature on labelled prompts.
+
+    Returns:
+        Dictionary with the ``temperature``, the number of ``examples``
+        (labelled horizons) and their NLL before and after scaling
+    """
+    scores, targets = collect_log_likelihoods(prompts, labels, model, tokenizer, prefix_cache)
+    temperature = fit_temperature(scores, targets)
+    return {
+        "temperature": temperature,
+        "examples": len(targets),
+        "nll_before": F.cross_entropy(scores, targets).item(),
+        "nll_after": F.cross_entropy(scores / temperature, targets).item(),
+    }
+
+
+def resolve_prompt_layout(model_dir: str, override: Optional[str] = None) -> str:
+    """Prompt layout to calibrate with.
+
+    Args:
+        model_dir: Adapter or merged-model directory
+        override: Layout given on the command line, if any
+
+    Returns:
+        ``override`` if given, else the layout the model was trained with
+        (``instructions_last`` for models saved without a training config)
+
+    Raises:
+        ValueError: If the directory holds a classification-heads model,
+            which has no answer tokens to score
+    """
+    trained = load_training_config(model_dir)
+    if trained.get("model", {}).get("variant") == "heads":
+        raise ValueError(f"{model_dir} holds a heads model, which score-mode calibration does not apply to")
+    trained_layout = trained.get("tokenization", {}).get("prompt_layout")
+    if override and trained_layout and override != trained_layout:
+        print(f"⚠️ Using --prompt-layout {override}, but {model_dir} was trained with {trained_layout}")
+    return override or trained_layout or "instructions_last"
+
+
+def labelled_prompts(
+    input_path: str,
+    layout: str,
+    num_rows: Optional[int] = None,
+    holdout_every: int = 1
+) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """Prompts and labels of every ``holdout_every``-th input row.
+
+    Args:
+        input_path: CSV or Parquet file with the training columns
+        layout: Prompt layout the model was trained with
+        num_rows: Maximum number of rows
+        holdout_every: Keep rows whose ``row_id`` is a multiple of this
+
+    Returns:
+        Tuple of (prompts, label dictionaries)
+    """
+    rows = (r for r in iter_records(input_path) if r.row_id % holdout_every == 0)
+    prompts, labels = [], []
+    for row in itertools.islice(rows, num_rows):
+        # Empty CSV fields are None here but nan in the pandas rows used at training
+        fields = {key: math.nan if value is None else value for key, value in row.data.items()}
+        try:
+            prompts.append(build_prompt(fields, layout=layout))
+        except KeyError as e:
+            print(f"Skipping row {row.row_id}: missing column {e}")
+            continue
+        labels.append(row.data)
+    return prompts, labels
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit the score-mode temperature on labelled rows")
+    parser.add_argument("--input", required=True, help="CSV or Parquet file with labels")
+    parser.add_argument("--base-model", default="mistralai/Mistral-7B-Instruct-v0.2")
+    parser.add_argument("--adapter-dir", default="output/finetuned-mistral")
+    parser.add_argument("--merged-dir", help="Snapshot written by export.py (skips the adapter)")
+    parser.add_argument("--cache-dir", default="./cache")
+    parser.add_argument("--prompt-layout", choices=PROMPT_LAYOUTS,
+                        help="Override the layout saved in the model's training_config.yaml")
+    parser.add_argument("--num-rows", type=int, default=500)
+    parser.add_argument("--holdout-every", type=int, default=1,
+                        help="Use every n-th input row")
+    parser.add_argument("--output-dir", help="Where to save temperature.json (default: the model dir)")
+    args = parser.parse_args()
+    prompt_layout = resolve_prompt_layout(args.merged_dir or args.adapter_dir, args.prompt_layout)
+
+    if args.merged_dir:
+        from inference import load_merged_model
+        model, tokenizer = load_merged_model(args.merged_dir)
+    else:
+        from inference import load_lora_model
+        model, tokenizer = load_lora_model(args.base_model, args.adapter_dir, args.cache_dir)
+    model.eval()
+
+    prefix_cache = None
+    if prompt_layout == "instructions_first":
+        prefix_cache = PrefixCache.from_instructions(model, tokenizer)
+
+    prompts, labels = labelled_prompts(args.input, prompt_layout, args.num_rows, args.holdout_every)
+    result = calibrate(prompts, labels, model, tokenizer, prefix_cache)
+    path = save_temperature(args.output_dir or args.merged_dir or args.adapter_dir, **result)
+    print(
+        f"Temperature {result['temperature']:.3f} on {result['examples']} labelled horizons "
+        f"(NLL {result['nll_before']:.3f} → {result['nll_after']:.3f}), saved to {path}"
+    )
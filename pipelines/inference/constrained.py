@@ -0,0 +1,236 @@
+"""Schema-constrained greedy decoding of predictions.
+
+Every valid answer is tokenized once, exactly as the training targets were,
+into a token trie. Decoding walks the trie: runs of tokens shared by all
+remaining answers (braces, keys, quotes, the rest of a value once it is
+unambiguous) are appended without a model call, and at each branch the
+model only chooses among the allowed next tokens. The KV cache carries
+over between branches, so a prediction costs one forward pass per branch
+point instead of one per generated token, and the output always parses.
+Compare against free-form generation on CPU with a tiny random model:
+
+    python constrained.py
+"""
+
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import torch
+from transformers import AutoTokenizer, AutoModelForCausalLM
+from prefix_cache import PrefixCache
+from schema import iter_predictions, render_prediction, tokenizer_corpus
+
+@dataclass
+class DecodingStats:
+    """Counters collected while decoding predictions.
+
+    Free-form generation counts every new token as chosen and as one
+    forward pass. Scoring counts the answer it picks as forced and chosen
+    tokens, and every candidate token it evaluates as scored.
+
+    Attributes:
+        predictions: Predictions decoded
+        forced: Tokens appended without a model choice
+        chosen: Tokens chosen by the model
+        model_calls: Forward passes, including the prompt pass
+        prompt_tokens: Prompt tokens, including those read from a prefix cache
+        scored: Candidate answer tokens scored (score mode)
+    """
+    predictions: int = 0
+    forced: int = 0
+    chosen: int = 0
+    model_calls: int = 0
+    prompt_tokens: int = 0
+    scored: int = 0
+
+    @property
+    def tokens(self) -> int:
+        return self.forced + self.chosen
+
+    @property
+    def calls_per_prediction(self) -> float:
+        return self.model_calls / self.predictions if self.predictions else 0.0
+
+
+@dataclass
+class _TrieNode:
+    """Forced token run followed by a branch, or by the end of one answer."""
+    tokens: Tuple[int, ...] = ()
+    children: Dict[int, "_TrieNode"] = field(default_factory=dict)
+    answer: Optional[int] = None
+
+
+def _build_node(sequences: List[List[int]], indices: List[int], depth: int) -> _TrieNode:
+    node = _TrieNode()
+    forced: List[int] = []
+    while True:
+        if len(indices) == 1 and depth == len(sequences[indices[0]]):
+            node.answer = indices[0]
+            break
+        groups: Dict[int, List[int]] = {}
+        for i in indices:
+            groups.setdefault(sequences[i][depth], []).append(i)
+        if len(groups) > 1:
+            node.children = {
+                token: _build_node(sequences, group, depth + 1)
+                for token, group in groups.items()
+            }
+            break
+        forced.append(sequences[indices[0]][depth])
+        depth += 1
+    node.tokens = tuple(forced)
+    return node
+
+
+class PredictionTrie:
+    """Token trie over every valid prediction JSON.
+
+    Answers are tokenized like ``target_json`` at training time (no special
+    tokens, followed by EOS), so constrained decoding stays on the token
+    paths the model was fine-tuned on. Every answer ends with EOS, so no
+    answer is a prefix of another.
+
+    Attributes:
+        root: Node holding the tokens common to all answers
+        answers: Parsed prediction of each answer, indexed by leaf ``answer``
+        sequences: Token ids of each answer, in ``iter_predictions`` order
+    """
+
+    def __init__(self, tokenizer: AutoTokenizer):
+        """
+        Args:
+            tokenizer: Tokenizer of the fine-tuned model
+        """
+        texts = [render_prediction(values) for values in iter_predictions()]
+        sequences = [
+            ids + [tokenizer.eos_token_id]
+            for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]
+        ]
+        self.answers = [json.loads(text) for text in texts]
+        self.sequences = sequences
+        self.root = _build_node(sequences, list(range(len(sequences))), 0)
+
+
+@lru_cache(maxsize=None)
+def prediction_trie(tokenizer: AutoTokenizer) -> PredictionTrie:
+    """Build the prediction trie of a tokenizer once per process.
+
+    Tokenizes every valid answer (a few seconds with a slow tokenizer).
+    """
+    return PredictionTrie(tokenizer)
+
+
+@torch.no_grad()
+def constrained_generate(
+    input_ids: Sequence[int],
+    model: AutoModelForCausalLM,
+    trie: PredictionTrie,
+    stats: Optional[DecodingStats] = None,
+    prefix_cache: Optional[PrefixCache] = None
+) -> Tuple[List[int], Dict[str, Any]]:
+    """Greedy-decode one prediction restricted to the schema.
+
+    Args:
+        input_ids: Prompt token ids, as produced for free-form generation
+        model: Fine-tuned causal language model
+        trie: Prediction trie built with the model's tokenizer
+        stats: Optional counters updated in place
+        prefix_cache: Optional cache of the shared prompt prefix
+
+    Returns:
+        Tuple of (generated token ids ending with EOS, parsed prediction)
+    """
+    stats = stats if stats is not None else DecodingStats()
+    device = next(model.parameters()).device
+    past, reused = prefix_cache.match(input_ids) if prefix_cache is not None else (None, 0)
+    feed = [int(t) for t in input_ids[reused:]]
+    stats.prompt_tokens += len(input_ids)
+    generated: List[int] = []
+    node = trie.root
+    while True:
+        feed.extend(node.tokens)
+        generated.extend(node.tokens)
+        stats.forced += len(node.tokens)
+        if node.answer is not None:
+            break
+
+        # One pass over everything appended since the last branch
+        out = model(
+            input_ids=torch.tensor([feed], dtype=torch.long, device=device),
+            past_key_values=past,
+            use_cache=True,
+        )
+        past = out.past_key_values
+        stats.model_calls += 1
+
+        allowed = list(node.children)
+        scores = out.logits[0, -1, allowed]
+        token = allowed[int(scores.argmax())]
+        generated.append(token)
+        feed = [token]
+        stats.chosen += 1
+        node = node.children[token]
+
+    stats.predictions += 1
+    return generated, dict(trie.answers[node.answer])
+
+
+def benchmark(
+    prompts: List[str],
+    model: AutoModelForCausalLM,
+    tokenizer: AutoTokenizer,
+    max_new_tokens: int = 256
+) -> Dict[str, float]:
+    """Compare free-form and constrained JSON generation on the same prompts.
+
+    Args:
+        prompts: Prediction prompts
+        model: Causal language model
+        tokenizer: Matching tokenizer with a chat template
+        max_new_tokens: Token limit of free-form generation
+
+    Returns:
+        Dictionary with parse rate, forward passes per prediction and
+        wall time of both modes
+    """
+    # utils' prediction_trie: run as a script, this module has a separate cache
+    from utils import generate_json_response, prediction_trie as cached_trie
+
+    device = next(model.parameters()).device
+    cached_trie(tokenizer)  # keep the one-off trie build out of the timing
+    results: Dict[str, float] = {}
+    for mode in ("free", "constrained"):
+        stats = DecodingStats()
+        parsed = 0
+        start = time.perf_counter()
+        for prompt in prompts:
+            prediction = generate_json_response(
+                prompt, model, tokenizer, device, max_new_tokens,
+                constrained=mode == "constrained", stats=stats
+            )
+            parsed += "raw_prediction" not in prediction
+        results[f"{mode}_seconds"] = time.perf_counter() - start
+        results[f"{mode}_parse_rate"] = parsed / len(prompts)
+        results[f"{mode}_calls_per_prediction"] = stats.calls_per_prediction
+        results[f"{mode}_tokens_per_prediction"] = stats.tokens / len(prompts)
+    return results
+
+
+if __name__ == "__main__":
+    sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
+    from src.testing import build_tiny_model, build_tiny_tokenizer
+
+    tokenizer = build_tiny_tokenizer(tokenizer_corpus())
+    model = build_tiny_model(tokenizer)
+    prompts = [
+        "News: Gold prices surge as the dollar weakens\nSentiment: Positive (0.95)",
+        "News: Miners slip after hawkish Fed remarks\nSentiment: Negative (0.81)",
+        "News: Gold steady ahead of CPI data\nSentiment: Neutral (0.64)",
+        "News: Central banks extend record gold purchases\nSentiment: Positive (0.88)",
+    ]
+    for name, value in benchmark(prompts, model, tokenizer).items():
+        print(f"{name}: {value:.3f}")
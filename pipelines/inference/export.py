@@ -0,0 +1,247 @@
+"""Export the fine-tuned predictor as a merged, ready-to-load snapshot.
+
+Loading the LoRA predictor normally means downloading the base model,
+quantizing it while loading and wrapping it with the adapter on every job
+start. ``export`` does that work once: the adapter is merged into the
+float16 base weights and the result is written as sharded safetensors
+(memory-mapped at load time), optionally re-saved pre-quantized to 4-bit.
+``compare`` loads both variants in fresh subprocesses and reports load
+time and peak RSS:
+
+    python export.py export --adapter-dir output/finetuned-mistral --output-dir output/merged
+    python export.py compare --adapter-dir output/finetuned-mistral --merged-dir output/merged
+"""
+
+import argparse
+import json
+import os
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import time
+from typing import Any, Dict, Optional
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig
+from peft import PeftModel
+from inference import TRAINING_CONFIG_FILE, load_training_config
+from scoring import TEMPERATURE_FILE
+
+DEFAULT_BASE_MODEL = "mistralai/Mistral-7B-Instruct-v0.2"
+EXPORT_INFO_NAME = "export_info.json"
+
+
+def publish_snapshot(src: str, link: str) -> str:
+    """Publish the snapshot directory ``src`` at the path ``link``.
+
+    ``link`` is a symlink to a versioned directory next to it
+    (``<link>.<time in ns>-<pid>``). ``src`` is renamed to a new version and
+    a fresh symlink is moved over ``link`` with ``os.replace``, which is
+    atomic, so readers always find either the previous or the new
+    snapshot. The previous version is kept, so a loader that resolved the
+    link just before the swap can finish reading it; older versions are
+    deleted. A plain directory left at ``link`` by an earlier export is
+    moved aside once to become the previous version; only during that
+    first swap is ``link`` briefly missing.
+
+    Args:
+        src: Complete snapshot directory
+        link: Path readers load the snapshot from
+
+    Returns:
+        Path of the published version
+    """
+    link = link.rstrip('/')
+    stamp = time.time_ns()
+    version = f"{link}.{stamp}-{os.getpid()}"
+    os.replace(src, version)
+
+    previous = os.path.realpath(link) if os.path.islink(link) else None
+    legacy = None
+    if previous is None and os.path.isdir(link):
+        legacy = previous = f"{link}.legacy-{os.getpid()}"
+        os.replace(link, legacy)
+
+    tmp_link = f"{link}.link-{os.getpid()}"
+    try:
+        if os.path.lexists(tmp_link):
+            os.remove(tmp_link)
+        # Relative target, so the snapshot and its versions can be moved together
+        os.symlink(os.path.basename(version), tmp_link)
+        os.replace(tmp_link, link)
+    except OSError:
+        if legacy is not None:
+            os.replace(legacy, link)
+        raise
+
+    # Delete versions older than the previous one; a concurrent export's
+    # newer version is left alone
+    kept = {os.path.basename(version), os.path.basename(previous or "")}
+    parent = os.path.dirname(os.path.abspath(link))
+    versions = re.compile(re.escape(os.path.basename(link)) + r"\.(?:(\d+)|legacy)-\d+")
+    for name in os.listdir(parent):
+        match = versions.fullmatch(name)
+        if match and name not in kept and int(match.group(1) or 0) < stamp:
+            shutil.rmtree(os.path.join(parent, name), ignore_errors=True)
+    return version
+
+
+def export_merged_model(
+    base_model: str,
+    adapter_dir: str,
+    output_dir: str,
+    cache_dir: Optional[str] = None,
+    quantize_4bit: bool = False,
+    max_shard_size: str = "2GB"
+) -> str:
+    """Merge a LoRA adapter into its base model and save a safetensors snapshot.
+
+    The merge happens in float16 (4-bit weights cannot absorb the adapter
+    exactly). With ``quantize_4bit`` the merged model is then reloaded with
+    the NF4 settings used at inference and saved pre-quantized, so loading
+    skips quantization too.
+
+    Args:
+        base_model: Hugging Face id of the base model
+        adapter_dir: Trained LoRA adapter directory
+        output_dir: Path the snapshot is published at (a symlink swapped
+            atomically by :func:`publish_snapshot`)
+        cache_dir: Model download cache
+        quantize_4bit: Also save the merged weights quantized to 4-bit
+        max_shard_size: Size limit of each safetensors shard
+
+    Returns:
+        Path of the snapshot
+
+    Raises:
+        ValueError: If the adapter was trained with classification heads,
+            which live outside the adapter and would be lost by the merge
+    """
+    variant = load_training_config(adapter_dir).get("model", {}).get("variant")
+    if variant == "heads":
+        raise ValueError(
+            f"{adapter_dir} holds a heads model (model.variant: heads); "
+            "serve it with DECODING_MODE=heads instead of exporting it"
+        )
+
+    tmp_dir = f"{output_dir.rstrip('/')}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    tokenizer = AutoTokenizer.from_pretrained(base_model, trust_remote_code=True, use_fast=False)
+    model = AutoModelForCausalLM.from_pretrained(
+        base_model,
+        torch_dtype=torch.float16,
+        cache_dir=cache_dir,
+        low_cpu_mem_usage=True,
+        trust_remote_code=True,
+    )
+    model = PeftModel.from_pretrained(model, adapter_dir).merge_and_unload()
+    model.save_pretrained(tmp_dir, safe_serialization=True, max_shard_size=max_shard_size)
+    del model
+
+    if quantize_4bit:
+        merged_dir = f"{tmp_dir}-fp16"
+        os.replace(tmp_dir, merged_dir)
+        model = AutoModelForCausalLM.from_pretrained(
+            merged_dir,
+            quantization_config=BitsAndBytesConfig(
+                load_in_4bit=True,
+                bnb_4bit_compute_dtype=torch.float16,
+                bnb_4bit_use_double_quant=True,
+                bnb_4bit_quant_type="nf4",
+            ),
+            torch_dtype=torch.float16,
+            device_map="auto",
+        )
+        model.save_pretrained(tmp_dir, safe_serialization=True, max_shard_size=max_shard_size)
+        del model
+        shutil.rmtree(merged_dir, ignore_errors=True)
+
+    tokenizer.save_pretrained(tmp_dir)
+    # Score-mode calibration and the prompt layout of the adapter apply to the merged weights too
+    for name in (TEMPERATURE_FILE, TRAINING_CONFIG_FILE):
+        if os.path.exists(os.path.join(adapter_dir, name)):
+            shutil.copy2(os.path.join(adapter_dir, name), tmp_dir)
+    with open(os.path.join(tmp_dir, EXPORT_INFO_NAME), "w") as f:
+        json.dump({
+            "base_model": base_model,
+            "adapter_dir": os.path.abspath(adapter_dir),
+            "quantized_4bit": quantize_4bit,
+        }, f, indent=2)
+
+    publish_snapshot(tmp_dir, output_dir)
+    return output_dir
+
+
+def measure_load(loader: str, args: argparse.Namespace) -> Dict[str, Any]:
+    """Load a model variant in this process and report the cost.
+
+    Args:
+        loader: ``lora`` (base + adapter) or ``merged`` (exported snapshot)
+        args: Parsed command line arguments
+
+    Returns:
+        Dictionary with load seconds, peak RSS and peak GPU memory in MiB
+    """
+    from inference import load_lora_model, load_merged_model
+
+    start = time.perf_counter()
+    if loader == "lora":
+        model, _ = load_lora_model(args.base_model, args.adapter_dir, args.cache_dir)
+    else:
+        model, _ = load_merged_model(args.merged_dir)
+    # First forward pass, so lazily initialized kernels count as cold start
+    with torch.no_grad():
+        model(input_ids=torch.tensor([[1]], device=next(model.parameters()).device))
+    seconds = time.perf_counter() - start
+
+    gpu_mib = torch.cuda.max_memory_allocated() / 2**20 if torch.cuda.is_available() else 0.0
+    return {
+        "loader": loader,
+        "load_seconds": seconds,
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "peak_gpu_mib": gpu_mib,
+    }
+
+
+def compare_loads(args: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    """Measure both loaders, each in a fresh interpreter so neither warms the other."""
+    results = {}
+    for loader in ("lora", "merged"):
+        command = [
+            sys.executable, os.path.abspath(__file__), "measure", "--loader", loader,
+            "--base-model", args.base_model, "--adapter-dir", args.adapter_dir or "",
+            "--merged-dir", args.merged_dir or "", "--cache-dir", args.cache_dir,
+        ]
+        out = subprocess.run(command, check=True, capture_output=True, text=True)
+        results[loader] = json.loads(out.stdout.strip().splitlines()[-1])
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merged LoRA export and cold-start comparison")
+    parser.add_argument("command", choices=["export", "compare", "measure"])
+    parser.add_argument("--base-model", default=DEFAULT_BASE_MODEL)
+    parser.add_argument("--adapter-dir")
+    parser.add_argument("--merged-dir", help="Snapshot to load (compare/measure)")
+    parser.add_argument("--output-dir", help="Snapshot to write (export)")
+    parser.add_argument("--cache-dir", default="./cache")
+    parser.add_argument("--quantize-4bit", action="store_true")
+    parser.add_argument("--loader", choices=["lora", "merged"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        path = export_merged_model(
+            args.base_model, args.adapter_dir, args.output_dir, args.cache_dir, args.quantize_4bit
+        )
+        print(f"✅ Merged model saved to {path}")
+    elif args.command == "measure":
+        print(json.dumps(measure_load(args.loader, args)))
+    else:
+        for loader, result in compare_loads(args).items():
+            print(
+                f"{loader}: {result['load_seconds']:.1f}s, peak RSS {result['peak_rss_mib']:.0f} MiB, "
+                f"peak GPU {result['peak_gpu_mib']:.0f} MiB"
+            )
@@ -0,0 +1,163 @@
+"""Inference for the classification-heads model variant.
+
+A model trained with ``model.variant: heads`` is a LoRA adapter on the
+Mistral backbone (no LM head) plus eight linear heads stored in
+``heads.safetensors`` / ``heads_config.json``. Every prediction is one
+batched forward pass over the prompts; there is no decoding.
+"""
+
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+import torch
+from torch import nn
+from safetensors.torch import load_file
+from transformers import AutoModel, AutoTokenizer, BitsAndBytesConfig
+from peft import PeftModel
+from constrained import DecodingStats
+
+HEADS_WEIGHTS_NAME = "heads.safetensors"
+HEADS_CONFIG_NAME = "heads_config.json"
+
+
+class ClassificationHeads(nn.Module):
+    """Linear heads rebuilt from a saved ``heads_config.json``.
+
+    Attributes:
+        fields: ``(field, labels)`` per head, in training order
+    """
+
+    def __init__(self, fields: List[Tuple[str, List[str]]], hidden_size: int):
+        """
+        Args:
+            fields: ``(field, labels)`` per head
+            hidden_size: Hidden size of the backbone
+        """
+        super().__init__()
+        self.fields = [(field, list(labels)) for field, labels in fields]
+        self.heads = nn.ModuleDict({
+            field: nn.Linear(hidden_size, len(labels)) for field, labels in self.fields
+        })
+
+    @classmethod
+    def from_pretrained(cls, path: str) -> "ClassificationHeads":
+        with open(os.path.join(path, HEADS_CONFIG_NAME)) as f:
+            config = json.load(f)
+        if config.get("pooling", "last") != "last":
+            raise ValueError(f"Unsupported pooling: {config['pooling']}")
+        heads = cls(config["fields"], config["hidden_size"])
+        heads.heads.load_state_dict(load_file(os.path.join(path, HEADS_WEIGHTS_NAME)))
+        return heads.eval()
+
+    def forward(self, pooled: torch.Tensor) -> Dict[str, torch.Tensor]:
+        return {field: self.heads[field](pooled) for field, _ in self.fields}
+
+
+def load_heads_model(
+    base_model: str,
+    adapter_dir: str,
+    cache_dir: str
+) -> Tuple[PeftModel, ClassificationHeads, AutoTokenizer]:
+    """Load the 4-bit backbone with its LoRA adapter and the classification heads.
+
+    Args:
+        base_model: Hugging Face id of the base model
+        adapter_dir: Directory saved by the heads training variant
+        cache_dir: Model download cache
+
+    Returns:
+        Tuple of (backbone, heads, tokenizer)
+    """
+    tokenizer = AutoTokenizer.from_pretrained(base_model, trust_remote_code=True, use_fast=False)
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    tokenizer.padding_side = "right"
+
+    quant_config = BitsAndBytesConfig(
+        load_in_4bit=True,
+        bnb_4bit_compute_dtype="float16",
+        bnb_4bit_use_double_quant=True,
+        bnb_4bit_quant_type="nf4"
+    )
+    backbone = AutoModel.from_pretrained(
+        base_model,
+        torch_dtype=torch.float16,
+        quantization_config=quant_config,
+        device_map="auto",
+        cache_dir=cache_dir,
+        trust_remote_code=True,
+    )
+    backbone = PeftModel.from_pretrained(backbone, adapter_dir).eval()
+    heads = ClassificationHeads.from_pretrained(adapter_dir)
+    heads.to(next(backbone.parameters()).device)
+    return backbone, heads, tokenizer
+
+
+@torch.no_grad()
+def predict_with_heads(
+    prompts: List[str],
+    backbone: PeftModel,
+    heads: ClassificationHeads,
+    tokenizer: AutoTokenizer,
+    batch_size: int = 16,
+    stats: Optional[DecodingStats] = None
+) -> List[Dict[str, Any]]:
+    """Predict every horizon for a list of prompts with one pass per batch.
+
+    Prompts are wrapped in the chat template exactly as in training and
+    batched in length order to limit padding.
+
+    Args:
+        prompts: Input prompts with news and market context
+        backbone: LoRA backbone from :func:`load_heads_model`
+        heads: Classification heads from :func:`load_heads_model`
+        tokenizer: Matching tokenizer
+        batch_size: Prompts per forward pass
+        stats: Optional counters of predictions, forward passes and prompt tokens
+
+    Returns:
+        One dictionary per prompt, in input order, with prediction keys
+        (direction_6h, magnitude_6h, etc.) and ``probabilities``, a
+        ``{key: {label: probability}}`` mapping
+
+    Example:
+        >>> backbone, heads, tok = load_heads_model(base, "output/heads", "./cache")
+        >>> predict_with_heads([prompt], backbone, heads, tok)[0]["direction_6h"]
+        "Up"
+    """
+    device = next(backbone.parameters()).device
+    encoded = [
+        tokenizer(tokenizer.apply_chat_template(
+            [{"role": "user", "content": prompt}], tokenize=False, add_generation_prompt=True
+        ))["input_ids"]
+        for prompt in prompts
+    ]
+    order = sorted(range(len(encoded)), key=lambda i: len(encoded[i]))
+    if stats is not None:
+        stats.predictions += len(encoded)
+        stats.prompt_tokens += sum(len(ids) for ids in encoded)
+        stats.model_calls += -(-len(encoded) // batch_size)
+    results: List[Dict[str, Any]] = [{} for _ in prompts]
+
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        lengths = torch.tensor([len(encoded[i]) for i in batch], device=device)
+        input_ids = torch.full(
+            (len(batch), int(lengths.max())), tokenizer.pad_token_id, dtype=torch.long, device=device
+        )
+        for row, i in enumerate(batch):
+            input_ids[row, :len(encoded[i])] = torch.tensor(encoded[i], device=device)
+        attention_mask = (torch.arange(input_ids.shape[1], device=device)[None] < lengths[:, None]).long()
+
+        hidden = backbone(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+        pooled = hidden[torch.arange(len(batch), device=device), lengths - 1].float()
+        probs = {field: torch.softmax(logits, dim=-1).cpu() for field, logits in heads(pooled).items()}
+
+        for row, i in enumerate(batch):
+            prediction: Dict[str, Any] = {"probabilities": {}}
+            for field, labels in heads.fields:
+                row_probs = probs[field][row]
+                prediction[field] = labels[int(row_probs.argmax())]
+                prediction["probabilities"][field] = dict(zip(labels, row_probs.tolist()))
+            results[i] = prediction
+    return results
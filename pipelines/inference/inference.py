@@ -1,9 +1,14 @@
+import os
 import torch
+import yaml
 from transformers import AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig
 from peft import PeftModel
 
+# config.yaml of the training job, saved next to the adapter it trained
+TRAINING_CONFIG_FILE = "training_config.yaml"
 
-def load_lora_model(base_model: str, adapter_dir: str, cache_dir: str):
+
+def load_base_model(base_model: str, cache_dir: str):
     tokenizer = AutoTokenizer.from_pretrained(base_model, trust_remote_code=True, use_fast=False)
     quant_config = BitsAndBytesConfig(
         load_in_4_bit =True,
@@ -21,5 +26,37 @@ def load_lora_model(base_model: str, adapter_dir: str, cache_dir: str):
         cache_dir=cache_dir,
         trust_remote_code=True,
     )
+    return model, tokenizer
+
+
+def load_lora_model(base_model: str, adapter_dir: str, cache_dir: str):
+    model, tokenizer = load_base_model(base_model, cache_dir)
     model = PeftModel.from_pretrained(model, adapter_dir)
     return model, tokenizer
+
+
+def load_merged_model(model_dir: str, device_map: str = "auto"):
+    """Load a snapshot written by ``export.py`` (adapter already merged).
+
+    Safetensors shards are memory-mapped and, for pre-quantized snapshots,
+    the saved 4-bit weights are used as-is, so there is no adapter wrapping
+    or load-time quantization.
+    """
+    tokenizer = AutoTokenizer.from_pretrained(model_dir, use_fast=False)
+    model = AutoModelForCausalLM.from_pretrained(
+        model_dir,
+        torch_dtype=torch.float16,
+        device_map=device_map,
+        low_cpu_mem_usage=True,
+        use_safetensors=True,
+    )
+    return model.eval(), tokenizer
+
+
+def load_training_config(model_dir: str) -> dict:
+    """Training config saved in an adapter or merged-model directory ({} if absent)."""
+    path = os.path.join(model_dir, TRAINING_CONFIG_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return yaml.safe_load(f) or {}
@@ -0,0 +1,44 @@
+"""Helpers for reusing a model's KV cache across forward passes.
+
+Caches are handled in the legacy format (a tuple of ``(key, value)``
+tensors per layer, each ``[batch, heads, seq, head_dim]``); ``Cache``
+objects are converted on the way in.
+"""
+
+from typing import Any, Tuple
+import torch
+
+LegacyCache = Tuple[Tuple[torch.Tensor, torch.Tensor], ...]
+
+
+def to_legacy(past: Any) -> LegacyCache:
+    """Convert a ``Cache`` object to the legacy tuple format."""
+    if hasattr(past, "to_legacy_cache"):
+        return past.to_legacy_cache()
+    return past
+
+
+def cache_length(past: LegacyCache) -> int:
+    """Number of cached positions."""
+    return past[0][0].shape[2]
+
+
+def expand_cache(past: LegacyCache, batch_size: int) -> LegacyCache:
+    """Repeat a single-sequence cache across a batch without copying it."""
+    return tuple(
+        (k.expand(batch_size, -1, -1, -1), v.expand(batch_size, -1, -1, -1))
+        for k, v in past
+    )
+
+
+def select_cache(past: LegacyCache, index: int, length: int) -> LegacyCache:
+    """Keep one row of a batched cache, cropped to its first ``length`` positions."""
+    return tuple(
+        (k[index:index + 1, :, :length], v[index:index + 1, :, :length])
+        for k, v in past
+    )
+
+
+def crop_cache(past: LegacyCache, length: int) -> LegacyCache:
+    """Keep the first ``length`` cached positions (views, no copy)."""
+    return tuple((k[:, :, :length], v[:, :, :length]) for k, v in past)
@@ -0,0 +1,201 @@
+"""Reuse of the KV cache of the static prompt prefix across requests.
+
+With the ``instructions_first`` prompt layout every prompt starts with the
+chat template header and the same answer-format block, and only the news
+and market fields after it change. The prefix is encoded once; each
+request then only prefills its own tokens on top of a view of the cached
+keys/values. Compare prefill work and latency on CPU with a tiny random
+model:
+
+    python prefix_cache.py
+"""
+
+import os
+import sys
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+import torch
+from transformers import AutoTokenizer, AutoModelForCausalLM
+from kv_cache import LegacyCache, crop_cache, expand_cache, to_legacy
+from schema import PROMPT_INSTRUCTIONS, tokenizer_corpus
+
+
+@dataclass
+class PrefixCacheStats:
+    """Prefill counters of requests served from a prefix cache.
+
+    Attributes:
+        requests: Prompts matched against the prefix
+        prompt_tokens: Prompt tokens of those requests
+        reused_tokens: Prompt tokens served from the cache instead of prefilled
+    """
+    requests: int = 0
+    prompt_tokens: int = 0
+    reused_tokens: int = 0
+
+    @property
+    def saved_per_request(self) -> float:
+        """Average prefill tokens saved per request."""
+        return self.reused_tokens / self.requests if self.requests else 0.0
+
+    @property
+    def saved_fraction(self) -> float:
+        """Share of all prompt tokens that were not prefilled."""
+        return self.reused_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+
+class PrefixCache:
+    """KV cache of a token prefix shared by many prompts.
+
+    Requests are matched token by token, so a prompt that diverges early
+    (or uses the original layout) simply reuses less. The cached tensors
+    are never modified; requests get cropped or expanded views.
+
+    Example:
+        >>> prefix = PrefixCache.from_instructions(model, tokenizer)
+        >>> generate_json_response(prompt, model, tokenizer, device, prefix_cache=prefix)
+        >>> prefix.stats.saved_per_request
+        112.0
+    """
+
+    def __init__(self, model: AutoModelForCausalLM, prefix_ids: Sequence[int]):
+        """Encode the prefix once.
+
+        Args:
+            model: Model whose keys/values are cached
+            prefix_ids: Token ids of the shared prefix
+        """
+        self.prefix_ids = [int(t) for t in prefix_ids]
+        self.stats = PrefixCacheStats()
+        device = next(model.parameters()).device
+        with torch.no_grad():
+            out = model(
+                input_ids=torch.tensor([self.prefix_ids], dtype=torch.long, device=device),
+                use_cache=True,
+            )
+        self.past: LegacyCache = to_legacy(out.past_key_values)
+
+    @classmethod
+    def from_instructions(
+        cls,
+        model: AutoModelForCausalLM,
+        tokenizer: AutoTokenizer,
+        instructions: str = PROMPT_INSTRUCTIONS
+    ) -> "PrefixCache":
+        """Cache the chat template header plus the answer-format block.
+
+        Args:
+            model: Model whose keys/values are cached
+            tokenizer: Matching tokenizer with a chat template
+            instructions: Static block that starts every prompt
+
+        Returns:
+            Prefix cache for ``instructions_first`` prompts
+        """
+        text = tokenizer.apply_chat_template(
+            [{"role": "user", "content": instructions + "\n"}],
+            tokenize=False,
+            add_generation_prompt=True
+        )
+        prefix_ids = tokenizer(text[:text.index(instructions) + len(instructions)])["input_ids"]
+        # The last token could merge with the text that follows the block
+        return cls(model, prefix_ids[:-1])
+
+    def match(self, input_ids: Sequence[int]) -> Tuple[Optional[LegacyCache], int]:
+        """Cache covering the longest shared prefix of a prompt.
+
+        At least one prompt token is left uncached so the caller's first
+        forward pass still yields next-token logits.
+
+        Args:
+            input_ids: Full prompt token ids of one request
+
+        Returns:
+            Tuple of (cache view or None, number of prompt tokens it covers)
+        """
+        limit = min(len(self.prefix_ids), len(input_ids) - 1)
+        n = 0
+        while n < limit and self.prefix_ids[n] == input_ids[n]:
+            n += 1
+        self.stats.requests += 1
+        self.stats.prompt_tokens += len(input_ids)
+        self.stats.reused_tokens += n
+        return (crop_cache(self.past, n) if n else None), n
+
+    def batch(self, batch_size: int, length: int) -> LegacyCache:
+        """The first ``length`` cached positions repeated across a batch."""
+        return expand_cache(crop_cache(self.past, length), batch_size)
+
+
+def benchmark(
+    prompts: List[str],
+    model: AutoModelForCausalLM,
+    tokenizer: AutoTokenizer
+) -> Dict[str, float]:
+    """Compare constrained decoding and scoring with and without the prefix cache.
+
+    Args:
+        prompts: ``instructions_first`` prompts
+        model: Causal language model
+        tokenizer: Matching tokenizer with a chat template
+
+    Returns:
+        Dictionary with seconds per prediction of each mode, whether the
+        predictions match, and the prefill tokens saved per request
+    """
+    from constrained import prediction_trie
+    from utils import generate_json_response, score_json_response
+
+    device = next(model.parameters()).device
+    prediction_trie(tokenizer)  # keep the one-off trie build out of the timing
+    prefix = PrefixCache.from_instructions(model, tokenizer)
+    results: Dict[str, float] = {}
+    for mode in ("constrained", "score"):
+        outputs = {}
+        for name, cache in (("full", None), ("prefix", prefix)):
+            start = time.perf_counter()
+            if mode == "score":
+                outputs[name] = [
+                    score_json_response(p, model, tokenizer, device, prefix_cache=cache)
+                    for p in prompts
+                ]
+            else:
+                outputs[name] = [
+                    generate_json_response(
+                        p, model, tokenizer, device, constrained=True, prefix_cache=cache
+                    )
+                    for p in prompts
+                ]
+            results[f"{mode}_{name}_seconds"] = (time.perf_counter() - start) / len(prompts)
+        same = [
+            {k: v for k, v in a.items() if k != "probabilities"}
+            == {k: v for k, v in b.items() if k != "probabilities"}
+            for a, b in zip(outputs["full"], outputs["prefix"])
+        ]
+        results[f"{mode}_same_prediction_rate"] = sum(same) / len(prompts)
+    results["prefix_tokens"] = float(len(prefix.prefix_ids))
+    results["prefill_tokens_saved_per_request"] = prefix.stats.saved_per_request
+    results["prefill_saved_fraction"] = prefix.stats.saved_fraction
+    return results
+
+
+if __name__ == "__main__":
+    sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
+    from src.testing import build_tiny_model, build_tiny_tokenizer
+
+    tokenizer = build_tiny_tokenizer(tokenizer_corpus())
+    model = build_tiny_model(tokenizer)
+    headlines = [
+        "Gold prices surge as the dollar weakens",
+        "Miners slip after hawkish Fed remarks",
+        "Gold steady ahead of CPI data",
+        "Central banks extend record gold purchases",
+    ]
+    prompts = [
+        f"{PROMPT_INSTRUCTIONS}\nNews: {headline}\nSentiment: Positive (0.9)\n"
+        "Asset Context:\n- Symbol: GLD (SPDR Gold Trust)"
+        for headline in headlines
+    ]
+    for name, value in benchmark(prompts, model, tokenizer).items():
+        print(f"{name}: {value:.3f}")
@@ -0,0 +1,305 @@
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
+# build_prompt is shipped next to this script; locally it lives with the training code
+sys.path.append(os.path.join(os.path.dirname(__file__), '../model_training'))
+
+import json
+import time
+import warnings
+import torch
+from tqdm import tqdm
+from constrained import DecodingStats
+from heads import load_heads_model, predict_with_heads
+from inference import load_lora_model, load_merged_model, load_training_config
+from prefix_cache import PrefixCache
+from prompts import build_prompt
+from schema import PREDICTION_FIELDS, is_valid_prediction
+from scoring import load_temperature
+from utils import generate_json_response, generate_json_responses, score_json_response
+from src.data import (
+    ResumeManifest, BufferedParquetWriter, ShardSpec, ROW_ID_COLUMN, iter_pending_chunks
+)
+from src.utils.memory import MemoryReleaser
+from src.utils.pipelining import PipelinedExecutor, Stage
+
+warnings.filterwarnings("ignore")
+
+is_sage_maker = "SM_MODEL_DIR" in os.environ
+input_file = os.environ.get("INPUT_FILE", "training_database.csv")
+
+if is_sage_maker:
+    #Look for paths
+    for root, dirs, files in os.walk('/opt/ml/processing'):
+        print(f"Directory: {root}")
+        for file in files:
+            print(f"-> {file}")
+    input_path = f'/opt/ml/processing/input/{input_file}'
+    output_dir = '/opt/ml/processing/output/predictions'
+    cache_dir = "/opt/ml/processing/cache"
+    adapter_dir = os.environ.get("ADAPTER_DIR", "/opt/ml/processing/input/model")
+    print("Running in SageMaker")
+
+else:
+    input_path = f'input/{input_file}'
+    output_dir = 'output/predictions'
+    cache_dir = './cache'
+    adapter_dir = os.environ.get("ADAPTER_DIR", "output/finetuned-mistral")
+    print("Running Local")
+
+device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+base_model = os.environ.get("BASE_MODEL", "mistralai/Mistral-7B-Instruct-v0.2")
+# Snapshot written by export.py; loads faster than base model + adapter (empty = use the adapter)
+merged_model_dir = os.environ.get("MERGED_MODEL_DIR")
+# free (batched generate), constrained (schema trie), score (label likelihoods)
+# or heads (classification heads, for models trained with model.variant: heads)
+decoding_mode = os.environ.get("DECODING_MODE", "free")
+# Must match tokenization.prompt_layout of the trained model; empty = the layout
+# saved with the model (instructions_last if none was saved)
+prompt_layout = os.environ.get("PROMPT_LAYOUT")
+max_new_tokens = int(os.environ.get("MAX_NEW_TOKENS", "96"))
+# Score-mode softmax temperature; empty = the one calibrate.py saved with the model (or 1.0)
+score_temperature = float(os.environ.get("SCORE_TEMPERATURE", "") or 0) or None
+# Parquet output columns: one label column per prediction key, plus its probability
+# (score mode only), whether the answer matched the schema and the raw answer otherwise
+output_columns = {
+    ROW_ID_COLUMN: "int64",
+    "id": "int64",
+    "symbol": "string",
+    **{key: "string" for key, _ in PREDICTION_FIELDS},
+    **{f"{key}_prob": "double" for key, _ in PREDICTION_FIELDS},
+    "valid": "bool",
+    "raw_prediction": "string",
+}
+# Output is committed as one Parquet part every FLUSH_ROWS rows or FLUSH_SECONDS seconds
+flush_rows = int(os.environ.get("FLUSH_ROWS", "1024"))
+flush_seconds = float(os.environ.get("FLUSH_SECONDS", "60"))
+# Rows are split across instances by SHARD_INDEX / NUM_SHARDS (or the SageMaker hosts)
+shard = ShardSpec.from_env()
+release_memory_every = int(os.environ.get("RELEASE_MEMORY_EVERY", "50"))
+# Prompts per generate call, rows per pipeline chunk and chunks in flight between stages
+batch_size = int(os.environ.get("BATCH_SIZE", "16"))
+chunk_size = batch_size * int(os.environ.get("BUCKET_BATCHES", "8"))
+pipeline_queue_size = int(os.environ.get("PIPELINE_QUEUE_SIZE", "2"))
+
+
+def prompt_fields(row):
+    """Row values as build_prompt saw them in training (pandas renders empty CSV fields as nan)."""
+    return {key: float("nan") if value is None else value for key, value in row.data.items()}
+
+
+def build_chunk_prompts(rows):
+    """Build the prompt of every row; rows that cannot be prompted get None."""
+    prompts = []
+    for row in rows:
+        try:
+            prompts.append(build_prompt(prompt_fields(row), layout=prompt_layout))
+        except KeyError as e:
+            print(f"Error at row {row.row_id}: missing column {e}")
+            prompts.append(None)
+    return rows, prompts
+
+
+def predict_chunk(item, model, tokenizer, stats, prefix_cache=None, heads=None):
+    """Predict a chunk of prompts; failing rows get an empty prediction."""
+    rows, prompts = item
+    predictions = [{}] * len(prompts)
+    valid = [i for i, prompt in enumerate(prompts) if prompt is not None]
+    try:
+        if decoding_mode == "heads":
+            # One forward pass per length-sorted batch, no decoding
+            outputs = predict_with_heads(
+                [prompts[i] for i in valid], model, heads, tokenizer, batch_size, stats
+            )
+            for i, prediction in zip(valid, outputs):
+                predictions[i] = prediction
+        elif decoding_mode == "free":
+            # Length-sorted batches keep padding low; results go back to row order
+            valid.sort(key=lambda i: len(prompts[i]))
+            for start in range(0, len(valid), batch_size):
+                batch = valid[start:start + batch_size]
+                outputs = generate_json_responses(
+                    [prompts[i] for i in batch], model, tokenizer, device, max_new_tokens, stats
+                )
+                for i, prediction in zip(batch, outputs):
+                    predictions[i] = prediction
+        else:
+            # Constrained decoding and scoring walk the answer trie prompt by prompt
+            # (batch_size does not apply); the prefix cache saves their shared prefill
+            for i in valid:
+                if decoding_mode == "score":
+                    predictions[i] = score_json_response(
+                        prompts[i], model, tokenizer, device, score_temperature, stats, prefix_cache
+                    )
+                else:
+                    predictions[i] = generate_json_response(
+                        prompts[i], model, tokenizer, device, constrained=True,
+                        stats=stats, prefix_cache=prefix_cache
+                    )
+    except Exception as e:
+        print(f"Error at rows {rows[0].row_id}-{rows[-1].row_id}: {e}")
+    return rows, predictions
+
+
+def prediction_record(prediction):
+    """Typed per-horizon columns of one parsed prediction."""
+    probabilities = prediction.get("probabilities", {})
+    record = {}
+    for key, values in PREDICTION_FIELDS:
+        label = prediction.get(key)
+        record[key] = label if label in values else None
+        record[f"{key}_prob"] = probabilities.get(key, {}).get(label) if record[key] else None
+    record["valid"] = is_valid_prediction(prediction)
+    record["raw_prediction"] = None if record["valid"] else (
+        prediction.get("raw_prediction") or json.dumps(prediction, ensure_ascii=False)
+    )
+    return record
+
+
+def check_training_config(model_dir):
+    """Reject a decoding mode or prompt layout the model was not trained for.
+
+    Returns:
+        The prompt layout to use
+    """
+    trained = load_training_config(model_dir)
+    variant = trained.get("model", {}).get("variant")
+    if variant == "heads" and decoding_mode != "heads":
+        raise ValueError(f"{model_dir} holds a heads model, set DECODING_MODE=heads")
+    if variant == "causal_lm" and decoding_mode == "heads":
+        raise ValueError(f"{model_dir} holds a causal LM adapter, DECODING_MODE=heads needs a heads model")
+
+    trained_layout = trained.get("tokenization", {}).get("prompt_layout")
+    if prompt_layout and trained_layout and prompt_layout != trained_layout:
+        raise ValueError(
+            f"PROMPT_LAYOUT={prompt_layout} but {model_dir} was trained with {trained_layout}"
+        )
+    return prompt_layout or trained_layout or "instructions_last"
+
+
+def to_records(item):
+    """Serialize predicted rows into (row ids, output records)."""
+    rows, predictions = item
+    records = [{
+        ROW_ID_COLUMN: row.row_id,
+        # Malformed ids are written as null instead of failing the chunk
+        "id": row.get_int("id"),
+        "symbol": row.get("symbol"),
+        **prediction_record(prediction),
+    } for row, prediction in zip(rows, predictions)]
+    return [row.row_id for row in rows], records
+
+
+def run_predictions(model, tokenizer, head_rows, prefix_cache=None, heads=None):
+    """Predict every pending input row and commit it to the Parquet dataset.
+
+    Rows committed by an earlier, interrupted run are skipped.
+
+    Args:
+        head_rows: NUM_ROWS, "ALL" or a number of rows
+
+    Returns:
+        Tuple of (rows written, seconds, decoding stats)
+    """
+    # Shards write their own parts into one dataset directory, so no merge step is needed.
+    # Manifests start with "_" so query engines skip them.
+    part_prefix = f"part-{shard.index:05d}-of-{shard.count:05d}" if shard.is_sharded else "part"
+    manifest = ResumeManifest.load(os.path.join(output_dir, f"_{part_prefix}.manifest.json"))
+
+    # Define which rows still need to be processed
+    if head_rows == 'ALL':
+        row_limit = None
+    elif head_rows is not None:
+        row_limit = int(head_rows)
+    else:
+        raise ValueError('NUM_ROWS must be defined as ALL or a number')
+    # The input is streamed from the manifest's checkpoint, never loaded whole
+    chunks = iter_pending_chunks(input_path, manifest, chunk_size, shard, row_limit)
+
+    # Main loop
+    writer = BufferedParquetWriter(
+        output_dir, output_columns, manifest,
+        flush_rows=flush_rows, flush_seconds=flush_seconds, prefix=part_prefix
+    )
+    releaser = MemoryReleaser(every_n_steps=release_memory_every)
+    progress = tqdm(desc="\n Prediction bar progress")
+    stats = DecodingStats()
+    rows_done = 0
+
+    def write_chunk(item):
+        nonlocal rows_done
+        row_ids, records = item
+        writer.write_many(row_ids, records)
+        rows_done += len(row_ids)
+        progress.update(len(row_ids))
+        releaser.step()
+
+    # prompt (CPU) → predict (GPU) → serialize (CPU) → write, overlapped across chunks
+    executor = PipelinedExecutor([
+        Stage("prompt", build_chunk_prompts),
+        Stage("predict", lambda item: predict_chunk(item, model, tokenizer, stats, prefix_cache, heads)),
+        Stage("serialize", to_records),
+    ], queue_size=pipeline_queue_size)
+    run_start = time.perf_counter()
+    try:
+        executor.run(chunks, sink=write_chunk)
+    finally:
+        # Commit every chunk that made it through, even if a stage failed
+        writer.close()
+        progress.close()
+    return rows_done, time.perf_counter() - run_start, stats
+
+
+def throughput_report(rows_done, elapsed, stats):
+    """One-line summary of rows/s, token rates and forward passes per prediction."""
+    seconds = max(elapsed, 1e-9)
+    token_rates = [f"{stats.prompt_tokens / seconds:.1f} prompt tokens/s"]
+    if decoding_mode == "score":
+        # Scoring reads every candidate answer instead of generating one
+        token_rates.append(f"{stats.scored / seconds:.1f} scored tokens/s")
+    elif decoding_mode != "heads":
+        token_rates.append(f"{stats.tokens / seconds:.1f} generated tokens/s")
+    return (
+        f"Throughput: {rows_done} rows in {elapsed:.1f}s, {rows_done / seconds:.2f} rows/s, "
+        f"{', '.join(token_rates)}, {stats.calls_per_prediction:.1f} forward passes per prediction"
+    )
+
+
+if __name__ == "__main__":
+    if decoding_mode not in ("free", "constrained", "score", "heads"):
+        raise ValueError(
+            f"DECODING_MODE must be free, constrained, score or heads, got {decoding_mode!r}"
+        )
+    if decoding_mode == "heads" and merged_model_dir:
+        raise ValueError("DECODING_MODE=heads loads the adapter and heads, unset MERGED_MODEL_DIR")
+    prompt_layout = check_training_config(merged_model_dir or adapter_dir)
+    print(f"Prompt layout: {prompt_layout}")
+
+    load_start = time.perf_counter()
+    heads = None
+    if decoding_mode == "heads":
+        model, heads, tokenizer = load_heads_model(base_model, adapter_dir, cache_dir)
+    elif merged_model_dir:
+        model, tokenizer = load_merged_model(merged_model_dir)
+    else:
+        model, tokenizer = load_lora_model(base_model, adapter_dir, cache_dir)
+    model.eval()
+    device = next(model.parameters()).device
+    print(f"Model loaded in {time.perf_counter() - load_start:.1f}s ({decoding_mode} decoding)")
+    if decoding_mode == "score":
+        if score_temperature is None:
+            score_temperature = load_temperature(merged_model_dir or adapter_dir)
+        print(f"Score temperature {score_temperature:.3f}")
+
+    # The static prompt prefix is only shared with the instructions_first layout
+    prefix_cache = None
+    if prompt_layout == "instructions_first" and decoding_mode in ("constrained", "score"):
+        prefix_cache = PrefixCache.from_instructions(model, tokenizer)
+
+    rows_done, elapsed, stats = run_predictions(
+        model, tokenizer, os.environ.get("NUM_ROWS", None), prefix_cache, heads
+    )
+    tqdm.write(throughput_report(rows_done, elapsed, stats))
+    if prefix_cache is not None:
+        tqdm.write(f"Prefix cache: {prefix_cache.stats.saved_fraction:.1%} of prompt tokens reused")
+    tqdm.write("✅ Output successfully saved.")
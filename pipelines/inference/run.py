@@ -1,4 +1,7 @@
+import sys
 import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
+
 import uuid
 import boto3
 from dotenv import load_dotenv
@@ -6,6 +9,7 @@ from sagemaker import Session
 from sagemaker.pytorch import PyTorchProcessor
 from sagemaker.processing import ProcessingInput, ProcessingOutput
 from sagemaker.network import NetworkConfig
+from src.utils.sagemaker_utils import stage_source_dir
 
 # Load environment variables
 load_dotenv()
@@ -41,7 +45,12 @@ processor = PyTorchProcessor(
 
 processor.run(
     code="process.py",
-    source_dir="./code",
+    # The job imports the shared src package and the training prompt builder
+    source_dir=stage_source_dir({
+        ".": "pipelines/inference",
+        "src": "src",
+        "prompts.py": "pipelines/model_training/prompts.py",
+    }),
     inputs=[
         ProcessingInput(
             source=f's3://{bucket}/llm_pipeline/input/',
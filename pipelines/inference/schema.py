@@ -0,0 +1,73 @@
+"""Output schema of the gold movement predictor.
+
+The fine-tuned model answers with one compact JSON object holding a
+direction and a magnitude for each horizon, in the key order used by
+``build_target_json`` at training time.
+"""
+
+import itertools
+import json
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+HORIZONS = ("6h", "12h", "24h", "48h")
+DIRECTIONS = ("Up", "Down", "Neutral")
+MAGNITUDES = ("low impact", "medium-low impact", "medium-high impact", "high impact")
+
+# (key, allowed values) in the order the model was trained to emit them
+PREDICTION_FIELDS: Tuple[Tuple[str, Tuple[str, ...]], ...] = tuple(
+    field
+    for horizon in HORIZONS
+    for field in ((f"direction_{horizon}", DIRECTIONS), (f"magnitude_{horizon}", MAGNITUDES))
+)
+
+# Answer-format block of the training prompts (prompts.PROMPT_INSTRUCTIONS)
+PROMPT_INSTRUCTIONS = (
+    "Respond ONLY with a compact JSON using keys: "
+    + ",".join(json.dumps(key) for key, _ in PREDICTION_FIELDS) + ".\n"
+    + "Directions: " + "|".join(json.dumps(value) for value in DIRECTIONS) + ". "
+    + "Magnitudes: " + "|".join(json.dumps(value) for value in MAGNITUDES) + "."
+)
+
+
+def render_prediction(values: Sequence[str]) -> str:
+    """Serialize field values exactly as ``build_target_json`` does.
+
+    Args:
+        values: One value per entry of ``PREDICTION_FIELDS``, in order
+
+    Returns:
+        Compact JSON string
+    """
+    payload = {key: value for (key, _), value in zip(PREDICTION_FIELDS, values)}
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+
+def iter_predictions() -> Iterator[Tuple[str, ...]]:
+    """Every valid combination of field values, in ``PREDICTION_FIELDS`` order."""
+    return itertools.product(*(values for _, values in PREDICTION_FIELDS))
+
+
+def prediction_index(values: Sequence[str]) -> int:
+    """Position of a combination of field values in ``iter_predictions`` order."""
+    index = 0
+    for (_, allowed), value in zip(PREDICTION_FIELDS, values):
+        index = index * len(allowed) + allowed.index(value)
+    return index
+
+
+def is_valid_prediction(prediction: Dict[str, Any]) -> bool:
+    """Check that a parsed prediction has every key with an allowed value."""
+    return all(prediction.get(key) in values for key, values in PREDICTION_FIELDS)
+
+
+
+def tokenizer_corpus() -> List[str]:
+    """Texts to train an offline stand-in tokenizer on (``src.testing``).
+
+    The answer-format block and a sample of rendered predictions, so
+    answers split into multi-token runs and branches as they do with the
+    Mistral tokenizer.
+    """
+    return [PROMPT_INSTRUCTIONS] + [
+        render_prediction(values) for values in itertools.islice(iter_predictions(), 0, None, 97)
+    ]
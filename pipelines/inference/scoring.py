@@ -0,0 +1,289 @@
+"""Likelihood scoring of predictions, one horizon at a time.
+
+Instead of generating the answer, every (direction, magnitude) pair of a
+horizon is scored by the log-likelihood of its tokens. The prompt is
+encoded once; each horizon then costs one batched forward pass over its
+twelve candidate tails, all reading the same cached prompt keys/values.
+The best pair is appended to the context before the next horizon, so a
+prediction takes five forward passes in total. Softmax over the
+candidates (optionally temperature-scaled with :func:`fit_temperature`)
+gives a probability per label that can be thresholded. Compare against
+generation on CPU with a tiny random model:
+
+    python scoring.py
+
+``calibrate.py`` fits the temperature on labelled rows and saves it next to
+the model, where :func:`load_temperature` finds it.
+"""
+
+import itertools
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import torch
+import torch.nn.functional as F
+from transformers import AutoTokenizer, AutoModelForCausalLM
+from constrained import DecodingStats, PredictionTrie, prediction_trie
+from kv_cache import cache_length, expand_cache, select_cache, to_legacy
+from prefix_cache import PrefixCache
+from schema import (
+    DIRECTIONS, HORIZONS, MAGNITUDES, PREDICTION_FIELDS, prediction_index, tokenizer_corpus
+)
+
+# Candidates of one horizon, direction-major: index = direction * len(MAGNITUDES) + magnitude
+HORIZON_CANDIDATES: Tuple[Tuple[str, str], ...] = tuple(itertools.product(DIRECTIONS, MAGNITUDES))
+# Fitted temperature, saved in the adapter or merged-model directory
+TEMPERATURE_FILE = "temperature.json"
+
+
+def candidate_index(direction: str, magnitude: str) -> int:
+    """Position of a (direction, magnitude) pair in ``HORIZON_CANDIDATES``."""
+    return DIRECTIONS.index(direction) * len(MAGNITUDES) + MAGNITUDES.index(magnitude)
+
+
+def _common_prefix(a: Sequence[int], b: Sequence[int]) -> int:
+    n = 0
+    while n < min(len(a), len(b)) and a[n] == b[n]:
+        n += 1
+    return n
+
+
+def horizon_tails(trie: PredictionTrie, chosen: List[str]) -> Tuple[List[int], List[List[int]]]:
+    """Answer tokens before the next horizon and each candidate's tail.
+
+    Tails run from the first token where the candidates differ up to the
+    first token that depends on the following horizon (or to EOS for the
+    last one), so they cover closing quotes and separators too and follow
+    the training tokenization exactly.
+
+    Args:
+        trie: Prediction trie of the model's tokenizer
+        chosen: Values already chosen for the preceding fields
+
+    Returns:
+        Tuple of (answer tokens shared by all candidates, one tail per
+        entry of ``HORIZON_CANDIDATES``)
+    """
+    field = len(chosen)
+    defaults = [values[0] for _, values in PREDICTION_FIELDS[field + 2:]]
+    sequences, ends = [], []
+    for pair in HORIZON_CANDIDATES:
+        values = chosen + list(pair) + defaults
+        sequence = trie.sequences[prediction_index(values)]
+        if defaults:
+            # Where this answer departs from one with a different next direction
+            values[field + 2] = PREDICTION_FIELDS[field + 2][1][1]
+            ends.append(_common_prefix(sequence, trie.sequences[prediction_index(values)]))
+        else:
+            ends.append(len(sequence))
+        sequences.append(sequence)
+    start = min(_common_prefix(sequences[0], sequence) for sequence in sequences[1:])
+    return sequences[0][:start], [s[start:end] for s, end in zip(sequences, ends)]
+
+
+@torch.no_grad()
+def score_prediction(
+    input_ids: Sequence[int],
+    model: AutoModelForCausalLM,
+    trie: PredictionTrie,
+    temperature: float = 1.0,
+    stats: Optional[DecodingStats] = None,
+    prefix_cache: Optional[PrefixCache] = None
+) -> Tuple[Dict[str, Any], List[torch.Tensor]]:
+    """Pick every label by likelihood and return its probability distribution.
+
+    Args:
+        input_ids: Prompt token ids, as produced for free-form generation
+        model: Fine-tuned causal language model
+        trie: Prediction trie built with the model's tokenizer
+        temperature: Softmax temperature from :func:`fit_temperature`
+        stats: Optional counters updated in place
+        prefix_cache: Optional cache of the shared prompt prefix
+
+    Returns:
+        Tuple of (prediction, log-likelihoods). The prediction maps each
+        key to its most probable label and ``probabilities`` to a
+        ``{key: {label: probability}}`` dictionary. The log-likelihoods
+        are one float32 tensor per horizon over ``HORIZON_CANDIDATES``,
+        for calibration.
+    """
+    stats = stats if stats is not None else DecodingStats()
+    device = next(model.parameters()).device
+    chosen: List[str] = []
+    prediction: Dict[str, Any] = {}
+    probabilities: Dict[str, Dict[str, float]] = {}
+    log_likelihoods: List[torch.Tensor] = []
+    past, reused = prefix_cache.match(input_ids) if prefix_cache is not None else (None, 0)
+    prompt_pending = list(input_ids[reused:])
+    stats.prompt_tokens += len(input_ids)
+    last_logits, answer_fed = None, 0
+
+    for horizon in HORIZONS:
+        prefix, tails = horizon_tails(trie, chosen)
+        pending = prompt_pending + prefix[answer_fed:]
+        stats.forced += len(prefix) - answer_fed
+        prompt_pending = []
+        if pending:
+            out = model(
+                input_ids=torch.tensor([pending], dtype=torch.long, device=device),
+                past_key_values=past,
+                use_cache=True,
+            )
+            past, last_logits = to_legacy(out.past_key_values), out.logits[0, -1]
+            stats.model_calls += 1
+        answer_fed = len(prefix)
+
+        # All candidate tails in one pass over the shared cached context
+        context = cache_length(past)
+        lengths = torch.tensor([len(tail) for tail in tails], device=device)
+        width = int(lengths.max())
+        ids = torch.zeros((len(tails), width), dtype=torch.long, device=device)
+        mask = torch.ones((len(tails), context + width), dtype=torch.long, device=device)
+        for row, tail in enumerate(tails):
+            ids[row, :len(tail)] = torch.tensor(tail, device=device)
+            mask[row, context + len(tail):] = 0
+        out = model(
+            input_ids=ids,
+            attention_mask=mask,
+            past_key_values=expand_cache(past, len(tails)),
+            use_cache=True,
+        )
+        stats.model_calls += 1
+        stats.scored += int(lengths.sum())
+
+        logprobs = F.log_softmax(out.logits[:, :-1].float(), dim=-1)
+        token_ll = logprobs.gather(-1, ids[:, 1:, None]).squeeze(-1)
+        in_tail = torch.arange(1, width, device=device)[None] < lengths[:, None]
+        first_ll = F.log_softmax(last_logits.float(), dim=-1)[ids[:, 0]]
+        scores = (first_ll + (token_ll * in_tail).sum(-1)).cpu()
+        log_likelihoods.append(scores)
+
+        joint = torch.softmax(scores / temperature, dim=-1).view(len(DIRECTIONS), len(MAGNITUDES))
+        for key, labels, marginal in (
+            (f"direction_{horizon}", DIRECTIONS, joint.sum(dim=1)),
+            (f"magnitude_{horizon}", MAGNITUDES, joint.sum(dim=0)),
+        ):
+            prediction[key] = labels[int(marginal.argmax())]
+            probabilities[key] = dict(zip(labels, marginal.tolist()))
+            chosen.append(prediction[key])
+
+        best = candidate_index(chosen[-2], chosen[-1])
+        tail_length = len(tails[best])
+        stats.chosen += tail_length
+        past = select_cache(to_legacy(out.past_key_values), best, context + tail_length)
+        last_logits = out.logits[best, tail_length - 1]
+        answer_fed += tail_length
+
+    stats.predictions += 1
+    prediction["probabilities"] = probabilities
+    return prediction, log_likelihoods
+
+
+def fit_temperature(log_likelihoods: torch.Tensor, targets: torch.Tensor, max_iter: int = 100) -> float:
+    """Fit the softmax temperature that minimizes NLL on labelled examples.
+
+    Args:
+        log_likelihoods: ``[examples, len(HORIZON_CANDIDATES)]`` scores from
+            :func:`score_prediction`, one row per (prompt, horizon)
+        targets: Index of the true pair of each row (see :func:`candidate_index`)
+        max_iter: L-BFGS iterations
+
+    Returns:
+        Temperature to pass to :func:`score_prediction`
+    """
+    log_t = torch.zeros((), requires_grad=True)
+    optimizer = torch.optim.LBFGS([log_t], lr=0.1, max_iter=max_iter)
+
+    def closure():
+        optimizer.zero_grad()
+        loss = F.cross_entropy(log_likelihoods / log_t.exp(), targets)
+        loss.backward()
+        return loss
+
+    optimizer.step(closure)
+    return float(log_t.detach().exp())
+
+
+def save_temperature(model_dir: str, temperature: float, **metadata: Any) -> str:
+    """Save a fitted temperature in a model directory.
+
+    Args:
+        model_dir: Adapter or merged-model directory the temperature was fitted for
+        temperature: Value returned by :func:`fit_temperature`
+        **metadata: Extra fields stored alongside (e.g. example counts)
+
+    Returns:
+        Path of the written file
+    """
+    path = os.path.join(model_dir, TEMPERATURE_FILE)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        json.dump({"temperature": temperature, **metadata}, f, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_temperature(model_dir: Optional[str], default: float = 1.0) -> float:
+    """Temperature saved in a model directory by ``calibrate.py``, or ``default``."""
+    path = os.path.join(model_dir, TEMPERATURE_FILE) if model_dir else None
+    if path is None or not os.path.exists(path):
+        return default
+    with open(path) as f:
+        return float(json.load(f)["temperature"])
+
+
+def benchmark(
+    prompts: List[str],
+    model: AutoModelForCausalLM,
+    tokenizer: AutoTokenizer,
+    max_new_tokens: int = 256
+) -> Dict[str, float]:
+    """Compare free-form, constrained and scored predictions on the same prompts.
+
+    Args:
+        prompts: Prediction prompts
+        model: Causal language model
+        tokenizer: Matching tokenizer with a chat template
+        max_new_tokens: Token limit of free-form generation
+
+    Returns:
+        Dictionary with forward passes per prediction and seconds per
+        prediction of each mode
+    """
+    from utils import generate_json_response, score_json_response
+
+    device = next(model.parameters()).device
+    prediction_trie(tokenizer)  # keep the one-off trie build out of the timing
+    results: Dict[str, float] = {}
+    for mode in ("free", "constrained", "score"):
+        stats = DecodingStats()
+        start = time.perf_counter()
+        for prompt in prompts:
+            if mode == "score":
+                score_json_response(prompt, model, tokenizer, device, stats=stats)
+            else:
+                generate_json_response(
+                    prompt, model, tokenizer, device, max_new_tokens,
+                    constrained=mode == "constrained", stats=stats
+                )
+        results[f"{mode}_seconds_per_prediction"] = (time.perf_counter() - start) / len(prompts)
+        results[f"{mode}_calls_per_prediction"] = stats.calls_per_prediction
+    return results
+
+
+if __name__ == "__main__":
+    sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
+    from src.testing import build_tiny_model, build_tiny_tokenizer
+
+    tokenizer = build_tiny_tokenizer(tokenizer_corpus())
+    model = build_tiny_model(tokenizer)
+    prompts = [
+        "News: Gold prices surge as the dollar weakens\nSentiment: Positive (0.95)",
+        "News: Miners slip after hawkish Fed remarks\nSentiment: Negative (0.81)",
+        "News: Gold steady ahead of CPI data\nSentiment: Neutral (0.64)",
+        "News: Central banks extend record gold purchases\nSentiment: Positive (0.88)",
+    ]
+    for name, value in benchmark(prompts, model, tokenizer).items():
+        print(f"{name}: {value:.3f}")
@@ -0,0 +1,384 @@
+"""Local HTTP prediction service with dynamic micro-batching.
+
+Requests are put on an asyncio queue; a single worker drains it into
+micro-batches of at most ``max_batch_size`` prompts, waiting at most
+``max_wait_ms`` after the first one for others to arrive, and predicts
+each batch with one ``generate_json_responses`` call in a worker thread
+so the event loop keeps accepting requests meanwhile. Label scoring is
+left to the batch job (``process.py``, ``DECODING_MODE=score``): it picks
+each horizon before scoring the next, so it cannot share one padded
+forward pass across a micro-batch. Endpoints:
+
+    POST /predict   {"prompt": "..."} -> prediction JSON
+    GET  /metrics   latency percentiles, batch-size histogram, queue depth
+    GET  /health
+
+Serve the fine-tuned model, or run a CPU load test against a tiny random
+model:
+
+    python server.py --adapter-dir output/finetuned-mistral --port 8080
+    python server.py --tiny --max-new-tokens 32 --load-test 256 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from transformers import AutoTokenizer, AutoModelForCausalLM
+from utils import generate_json_responses
+
+PredictBatch = Callable[[List[str]], List[Dict[str, Any]]]
+MAX_BODY_BYTES = 1 << 20
+
+
+class ServerMetrics:
+    """Latency, batch-size and queue-depth metrics of the server.
+
+    Latencies are kept over a sliding window of recent requests.
+    """
+
+    def __init__(self, window: int = 10_000):
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.latencies_ms: Deque[float] = deque(maxlen=window)
+        self.queue_wait_ms: Deque[float] = deque(maxlen=window)
+        self.batch_sizes: Counter = Counter()
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.started = time.monotonic()
+
+    def record_enqueue(self, depth: int) -> None:
+        self.queue_depth = depth
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    def record_batch(self, size: int, depth: int) -> None:
+        self.batches += 1
+        self.batch_sizes[size] += 1
+        self.queue_depth = depth
+
+    def record_request(self, latency_ms: float, queue_wait_ms: float, failed: bool = False) -> None:
+        self.requests += 1
+        self.errors += failed
+        self.latencies_ms.append(latency_ms)
+        self.queue_wait_ms.append(queue_wait_ms)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Metrics as a JSON-serializable dictionary."""
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "batches": self.batches,
+            "uptime_seconds": time.monotonic() - self.started,
+            "latency_ms": _percentiles(self.latencies_ms),
+            "queue_wait_ms": _percentiles(self.queue_wait_ms),
+            "batch_size_histogram": {str(size): n for size, n in sorted(self.batch_sizes.items())},
+            "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+        }
+
+
+def _percentiles(values: Deque[float]) -> Dict[str, float]:
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "mean": 0.0}
+    ordered = sorted(values)
+    p50, p95, p99 = (ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in (0.50, 0.95, 0.99))
+    return {"p50": p50, "p95": p95, "p99": p99, "mean": statistics.fmean(ordered)}
+
+
+class MicroBatcher:
+    """Collects concurrent requests into bounded micro-batches.
+
+    Example:
+        >>> batcher = MicroBatcher(predict_batch, max_batch_size=16, max_wait_ms=10)
+        >>> batcher.start()
+        >>> prediction = await batcher.submit(prompt)
+    """
+
+    def __init__(
+        self,
+        predict_batch: PredictBatch,
+        max_batch_size: int = 16,
+        max_wait_ms: float = 10.0,
+        metrics: Optional[ServerMetrics] = None
+    ):
+        """
+        Args:
+            predict_batch: Predicts a list of prompts, one result per prompt
+            max_batch_size: Most prompts per model call
+            max_wait_ms: Longest wait for a batch to fill after its first request
+            metrics: Metrics to update (a new instance if omitted)
+        """
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.metrics = metrics or ServerMetrics()
+        self._queue: "asyncio.Queue[Tuple[str, asyncio.Future, float]]" = asyncio.Queue()
+        # One thread: the model runs a single batch at a time
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._worker: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=False)
+
+    async def submit(self, prompt: str) -> Dict[str, Any]:
+        """Queue one prompt and wait for its prediction."""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((prompt, future, time.perf_counter()))
+        self.metrics.record_enqueue(self._queue.qsize())
+        return await future
+
+    async def _next_batch(self) -> List[Tuple[str, asyncio.Future, float]]:
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            self.metrics.record_batch(len(batch), self._queue.qsize())
+            started = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, self.predict_batch, [prompt for prompt, _, _ in batch]
+                )
+                error = None
+            except Exception as e:  # reported to every request of the batch
+                results, error = [None] * len(batch), e
+            finished = time.perf_counter()
+            for (_, future, enqueued), result in zip(batch, results):
+                self.metrics.record_request(
+                    (finished - enqueued) * 1000, (started - enqueued) * 1000, failed=error is not None
+                )
+                if future.done():  # client went away
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+
+class PredictionServer:
+    """Minimal HTTP/1.1 front end of a :class:`MicroBatcher` (one request per connection)."""
+
+    def __init__(self, batcher: MicroBatcher):
+        self.batcher = batcher
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            status, body = await self._dispatch(reader)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        payload = json.dumps(body).encode()
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode() + payload
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def _dispatch(self, reader: asyncio.StreamReader) -> Tuple[str, Dict[str, Any]]:
+        request_line = (await reader.readline()).decode("latin-1").split()
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if len(request_line) < 2:
+            return "400 Bad Request", {"error": "malformed request line"}
+        method, path = request_line[0], request_line[1]
+
+        if method == "GET" and path == "/health":
+            return "200 OK", {"status": "ok"}
+        if method == "GET" and path == "/metrics":
+            return "200 OK", self.batcher.metrics.snapshot()
+        if method != "POST" or path != "/predict":
+            return "404 Not Found", {"error": f"no route for {method} {path}"}
+
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            return "400 Bad Request", {"error": "invalid Content-Length"}
+        if length > MAX_BODY_BYTES:
+            return "413 Payload Too Large", {"error": "request body too large"}
+        try:
+            prompt = json.loads(await reader.readexactly(length))["prompt"]
+        except (json.JSONDecodeError, KeyError, TypeError):
+            return "400 Bad Request", {"error": 'expected a JSON body {"prompt": "..."}'}
+        if not isinstance(prompt, str):
+            return "400 Bad Request", {"error": "prompt must be a string"}
+        try:
+            return "200 OK", await self.batcher.submit(prompt)
+        except Exception as e:
+            return "500 Internal Server Error", {"error": str(e)}
+
+
+async def serve(
+    predict_batch: PredictBatch,
+    host: str = "127.0.0.1",
+    port: int = 8080,
+    max_batch_size: int = 16,
+    max_wait_ms: float = 10.0
+) -> Tuple[asyncio.AbstractServer, MicroBatcher]:
+    """Start the batcher and the HTTP server on the running event loop.
+
+    Returns:
+        Tuple of (started ``asyncio`` server, batcher)
+    """
+    batcher = MicroBatcher(predict_batch, max_batch_size, max_wait_ms)
+    batcher.start()
+    server = await asyncio.start_server(PredictionServer(batcher).handle, host, port)
+    return server, batcher
+
+
+async def _post(host: str, port: int, path: str, body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    reader, writer = await asyncio.open_connection(host, port)
+    payload = json.dumps(body).encode() if body is not None else b""
+    method = "POST" if body is not None else "GET"
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode() + payload
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return json.loads(response.split(b"\r\n\r\n", 1)[1])
+
+
+async def load_test(
+    prompts: List[str],
+    host: str,
+    port: int,
+    concurrency: int = 32
+) -> Dict[str, Any]:
+    """Send prompts with bounded concurrency and return the server metrics.
+
+    Args:
+        prompts: Prompts to send, one request each
+        host: Server host
+        port: Server port
+        concurrency: Requests in flight at the same time
+
+    Returns:
+        Server metrics plus the client-side ``requests_per_second``
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(prompt: str) -> None:
+        async with semaphore:
+            await _post(host, port, "/predict", {"prompt": prompt})
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(prompt) for prompt in prompts))
+    elapsed = time.perf_counter() - start
+    metrics = await _post(host, port, "/metrics")
+    metrics["requests_per_second"] = len(prompts) / elapsed
+    return metrics
+
+
+def batch_predictor(
+    model: AutoModelForCausalLM,
+    tokenizer: AutoTokenizer,
+    max_new_tokens: int = 256
+) -> PredictBatch:
+    """Predict a micro-batch with a single left-padded ``generate`` call."""
+    device = next(model.parameters()).device
+
+    def predict_batch(prompts: List[str]) -> List[Dict[str, Any]]:
+        return generate_json_responses(prompts, model, tokenizer, device, max_new_tokens)
+
+    return predict_batch
+
+
+def load_predictor(args: argparse.Namespace) -> Tuple[AutoModelForCausalLM, AutoTokenizer]:
+    if args.tiny:
+        from schema import tokenizer_corpus
+
+        sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
+        from src.testing import build_tiny_model, build_tiny_tokenizer
+
+        tokenizer = build_tiny_tokenizer(tokenizer_corpus())
+        return build_tiny_model(tokenizer), tokenizer
+    if args.merged_dir:
+        from inference import load_merged_model
+
+        return load_merged_model(args.merged_dir)
+    from inference import load_lora_model
+
+    return load_lora_model(args.base_model, args.adapter_dir, args.cache_dir)
+
+
+async def main(args: argparse.Namespace) -> None:
+    model, tokenizer = load_predictor(args)
+    model.eval()
+    server, batcher = await serve(
+        batch_predictor(model, tokenizer, args.max_new_tokens), args.host, args.port, args.max_batch_size, args.max_wait_ms
+    )
+    port = server.sockets[0].getsockname()[1]
+    print(f"Serving predictions on http://{args.host}:{port}")
+    try:
+        if args.load_test:
+            prompts = [
+                f"News: Gold headline {i} as the dollar moves\nSentiment: Positive (0.9)"
+                for i in range(args.load_test)
+            ]
+            print(json.dumps(await load_test(prompts, args.host, port, args.concurrency), indent=2))
+        else:
+            await server.serve_forever()
+    finally:
+        server.close()
+        await server.wait_closed()
+        await batcher.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-batching prediction server")
+    parser.add_argument("--base-model", default="mistralai/Mistral-7B-Instruct-v0.2")
+    parser.add_argument("--adapter-dir", default="output/finetuned-mistral")
+    parser.add_argument("--merged-dir", help="Snapshot written by export.py (skips the adapter)")
+    parser.add_argument("--cache-dir", default="./cache")
+    parser.add_argument("--tiny", action="store_true", help="Tiny random model on CPU")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=10.0)
+    parser.add_argument("--max-new-tokens", type=int, default=256)
+    parser.add_argument("--load-test", type=int, default=0, help="Send N requests, print metrics and exit")
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -1,9 +1,12 @@
 """Inference utilities for gold price prediction."""
 
 import json
-from typing import Dict, Any, Union
+from typing import Dict, Any, List, Optional, Union
 import torch
 from transformers import AutoTokenizer, AutoModelForCausalLM
+from constrained import DecodingStats, constrained_generate, prediction_trie
+from prefix_cache import PrefixCache
+from scoring import score_prediction
 
 
 def generate_json_response(
@@ -11,19 +14,29 @@ def generate_json_response(
     model: AutoModelForCausalLM,
     tokenizer: AutoTokenizer,
     device: torch.device,
-    max_new_tokens: int = 256
+    max_new_tokens: int = 256,
+    constrained: bool = False,
+    stats: Optional[DecodingStats] = None,
+    prefix_cache: Optional[PrefixCache] = None
 ) -> Dict[str, Any]:
     """Generate JSON prediction from model given a prompt.
     
     Applies chat template, generates response, and parses JSON output.
-    Falls back to raw prediction if JSON parsing fails.
+    Falls back to raw prediction if JSON parsing fails. With
+    ``constrained=True`` the answer is decoded along the prediction
+    schema instead: keys and punctuation cost no forward pass and the
+    model only picks among valid values, so the output always parses.
     
     Args:
         prompt: Input prompt with news and market context
         model: Fine-tuned Mistral model for predictions
         tokenizer: Mistral tokenizer
         device: PyTorch device (CPU or CUDA)
-        max_new_tokens: Maximum tokens to generate
+        max_new_tokens: Maximum tokens to generate (free-form only)
+        constrained: Decode with the schema-constrained trie
+        stats: Optional counters of forward passes and tokens
+        prefix_cache: Optional KV cache of the static prompt prefix
+            (``instructions_first`` prompts); only the rest is prefilled
         
     Returns:
         Dictionary with prediction keys (direction_6h, magnitude_6h, etc.)
@@ -42,20 +55,149 @@ def generate_json_response(
         add_generation_prompt=True
     )
     
+    if constrained:
+        input_ids = tokenizer(text)["input_ids"]
+        _, prediction = constrained_generate(
+            input_ids, model, prediction_trie(tokenizer), stats, prefix_cache
+        )
+        return prediction
+
     inputs = tokenizer(text, return_tensors="pt").to(device)
+    past = None
+    if prefix_cache is not None:
+        past, _ = prefix_cache.match(inputs["input_ids"][0].tolist())
     
     with torch.no_grad():
         output = model.generate(
             **inputs,
+            past_key_values=past,
             max_new_tokens=max_new_tokens,
             do_sample=False,
             temperature=0.0,
             pad_token_id=tokenizer.eos_token_id,
         )
     
-    decoded = tokenizer.decode(output[0], skip_special_tokens=True).strip()
-    
+    new_tokens = output[0, inputs["input_ids"].shape[1]:]
+    if stats is not None:
+        stats.predictions += 1
+        stats.prompt_tokens += inputs["input_ids"].shape[1]
+        stats.chosen += len(new_tokens)
+        stats.model_calls += len(new_tokens)
+    decoded = tokenizer.decode(new_tokens, skip_special_tokens=True).strip()
+    return _parse_prediction(decoded)
+
+
+def generate_json_responses(
+    prompts: List[str],
+    model: AutoModelForCausalLM,
+    tokenizer: AutoTokenizer,
+    device: torch.device,
+    max_new_tokens: int = 256,
+    stats: Optional[DecodingStats] = None
+) -> List[Dict[str, Any]]:
+    """Generate JSON predictions for several prompts in one ``generate`` call.
+
+    Prompts are left-padded so every row's answer starts at the same
+    position; each decoding step is then one forward pass for the whole
+    batch instead of one per prompt.
+
+    Args:
+        prompts: Input prompts with news and market context
+        model: Fine-tuned Mistral model for predictions
+        tokenizer: Mistral tokenizer
+        device: PyTorch device (CPU or CUDA)
+        max_new_tokens: Maximum tokens to generate per prompt
+        stats: Optional counters of forward passes and tokens
+
+    Returns:
+        One dictionary per prompt, in input order, as returned by
+        :func:`generate_json_response`
+    """
+    texts = [
+        tokenizer.apply_chat_template(
+            [{"role": "user", "content": prompt}],
+            tokenize=False,
+            add_generation_prompt=True
+        )
+        for prompt in prompts
+    ]
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    pad_token_id = tokenizer.pad_token_id
+    padding_side, tokenizer.padding_side = tokenizer.padding_side, "left"
+    try:
+        inputs = tokenizer(texts, return_tensors="pt", padding=True).to(device)
+    finally:
+        tokenizer.padding_side = padding_side
+
+    with torch.no_grad():
+        output = model.generate(
+            **inputs,
+            max_new_tokens=max_new_tokens,
+            do_sample=False,
+            temperature=0.0,
+            pad_token_id=pad_token_id,
+        )
+
+    new_tokens = output[:, inputs["input_ids"].shape[1]:]
+    if stats is not None:
+        stats.predictions += len(prompts)
+        stats.prompt_tokens += int(inputs["attention_mask"].sum())
+        stats.chosen += int((new_tokens != pad_token_id).sum())
+        stats.model_calls += new_tokens.shape[1]
+    return [
+        _parse_prediction(tokenizer.decode(row, skip_special_tokens=True).strip())
+        for row in new_tokens
+    ]
+
+
+def _parse_prediction(decoded: str) -> Dict[str, Any]:
     try:
         return json.loads(decoded)
     except json.JSONDecodeError:
         return {"raw_prediction": decoded}
+
+
+def score_json_response(
+    prompt: str,
+    model: AutoModelForCausalLM,
+    tokenizer: AutoTokenizer,
+    device: torch.device,
+    temperature: float = 1.0,
+    stats: Optional[DecodingStats] = None,
+    prefix_cache: Optional[PrefixCache] = None
+) -> Dict[str, Any]:
+    """Predict every horizon by scoring its candidate labels.
+
+    Ranks each horizon's (direction, magnitude) pairs by log-likelihood
+    in one batched forward pass that reuses the cached prompt, instead of
+    generating the answer token by token.
+
+    Args:
+        prompt: Input prompt with news and market context
+        model: Fine-tuned Mistral model for predictions
+        tokenizer: Mistral tokenizer
+        device: PyTorch device (CPU or CUDA)
+        temperature: Calibration temperature (see ``scoring.fit_temperature``)
+        stats: Optional counters of forward passes
+        prefix_cache: Optional KV cache of the static prompt prefix
+
+    Returns:
+        Dictionary with prediction keys (direction_6h, magnitude_6h, etc.)
+        and ``probabilities``, a ``{key: {label: probability}}`` mapping
+
+    Example:
+        >>> prediction = score_json_response(prompt, model, tokenizer, device)
+        >>> prediction["probabilities"]["direction_6h"]
+        {"Up": 0.71, "Down": 0.08, "Neutral": 0.21}
+    """
+    text = tokenizer.apply_chat_template(
+        [{"role": "user", "content": prompt}],
+        tokenize=False,
+        add_generation_prompt=True
+    )
+    input_ids = tokenizer(text)["input_ids"]
+    prediction, _ = score_prediction(
+        input_ids, model, prediction_trie(tokenizer), temperature, stats, prefix_cache
+    )
+    return prediction
@@ -0,0 +1,118 @@
+"""Equivalence check and benchmark of the row-wise vs column-wise prompt builders.
+
+    python benchmark_prompts.py                      # synthetic data, 1M rows
+    python benchmark_prompts.py --csv ../input/training_database.csv
+
+Exits with an error if any prompt or target differs between the two paths.
+"""
+
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from prompts import (
+    PROMPT_LAYOUTS, build_prompt, build_target_json, build_prompts, build_target_jsons
+)
+
+DIRECTIONS = ["Up", "Down", "Neutral"]
+MAGNITUDES = ["low impact", "medium-low impact", "medium-high impact", "high impact"]
+
+
+def make_frame(num_rows: int, seed: int = 0) -> pd.DataFrame:
+    """Synthetic training rows covering the value kinds seen in the real table.
+
+    Includes missing values (NaN and None), non-ASCII text, quotes and
+    backslashes, and float sentiment strengths.
+
+    Args:
+        num_rows: Number of rows
+        seed: Random seed
+
+    Returns:
+        DataFrame with every column the prompt builders read
+    """
+    rng = np.random.default_rng(seed)
+    headlines = np.array([
+        "Gold prices surge as the dollar weakens",
+        "Ouro sobe após decisão do Fed — investidores reagem",
+        'Miners slip after "hawkish" remarks \\ analysts',
+        "Silver and gold steady ahead of CPI data",
+    ], dtype=object)
+
+    def pick(values, missing=0.0):
+        column = np.asarray(values, dtype=object)[rng.integers(0, len(values), num_rows)]
+        if missing:
+            column[rng.random(num_rows) < missing] = np.nan
+        return column
+
+    frame = {
+        "generated_headline": pick(headlines, missing=0.01),
+        "label": pick(["Positive", "Negative", "Neutral"], missing=0.01),
+        "sentiment_strength": rng.random(num_rows).round(4),
+        "explanation": pick(["strongly positive", "weakly negative", None]),
+        "symbol": pick(["GLD", "IAU", "XAUUSD"]),
+        "symbol_name": pick(["SPDR Gold Trust", "iShares Gold Trust", "Gold Spot"]),
+        "market_closed_verifier": pick(["Open", "Closed"]),
+    }
+    for hours in (6, 12, 24, 48):
+        frame[f"market_closed_verifier_{hours}h"] = pick(["Open", "Closed"])
+        frame[f"direction_{hours}h"] = pick(DIRECTIONS, missing=0.001)
+        frame[f"magnitude_{hours}h"] = pick(MAGNITUDES, missing=0.001)
+    return pd.DataFrame(frame)
+
+
+def check_equivalence(df: pd.DataFrame) -> None:
+    """Raise AssertionError unless both paths give identical strings for every row."""
+    checks = [
+        (f"prompt[{layout}]",
+         lambda d, layout=layout: d.apply(build_prompt, axis=1, layout=layout),
+         lambda d, layout=layout: build_prompts(d, layout))
+        for layout in PROMPT_LAYOUTS
+    ]
+    checks.append(("target_json", lambda d: d.apply(build_target_json, axis=1), build_target_jsons))
+    for name, rowwise, columnwise in checks:
+        expected = rowwise(df).tolist()
+        actual = columnwise(df).tolist()
+        assert len(expected) == len(actual), f"{name}: {len(actual)} rows, expected {len(expected)}"
+        for i, (e, a) in enumerate(zip(expected, actual)):
+            assert e.encode("utf-8") == a.encode("utf-8"), f"{name} differs at row {i}:\n{e!r}\n{a!r}"
+
+
+def benchmark(df: pd.DataFrame) -> dict:
+    """Time both paths on the same rows.
+
+    Returns:
+        Dictionary with seconds per path and the speedup
+    """
+    start = time.perf_counter()
+    df.apply(build_prompt, axis=1)
+    df.apply(build_target_json, axis=1)
+    rowwise = time.perf_counter() - start
+
+    start = time.perf_counter()
+    build_prompts(df)
+    build_target_jsons(df)
+    columnwise = time.perf_counter() - start
+    return {
+        "rows": len(df),
+        "rowwise_seconds": rowwise,
+        "columnwise_seconds": columnwise,
+        "speedup": rowwise / columnwise,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--csv", help="Check equivalence on a real training CSV too")
+    args = parser.parse_args()
+
+    if args.csv:
+        check_equivalence(pd.read_csv(args.csv))
+        print(f"✅ Identical output on {args.csv}")
+
+    df = make_frame(args.rows)
+    check_equivalence(df.head(10_000))
+    print("✅ Identical output on 10,000 synthetic rows")
+    for name, value in benchmark(df).items():
+        print(f"{name}: {value:,.2f}" if isinstance(value, float) else f"{name}: {value:,}")
@@ -1,13 +1,20 @@
 """Dataset loading and preprocessing for model training."""
 
-from typing import Tuple
+import os
+import shutil
+from typing import Optional, Tuple
 import pandas as pd
 from sklearn.model_selection import train_test_split
-from datasets import Dataset
-from src.prompts import build_prompt, build_target_json
+from datasets import Dataset, DatasetDict, load_from_disk
+from transformers import AutoTokenizer
+from src.prompts import build_prompts, build_target_jsons
+from src.tokenization import dataset_fingerprint, tokenize_dataset
 
 
-def load_dataset(csv_path: str) -> Tuple[Dataset, Dataset, Dataset]:
+def load_dataset(
+    csv_path: str,
+    layout: str = "instructions_last"
+) -> Tuple[Dataset, Dataset, Dataset]:
     """Load and split dataset for training, validation, and testing.
     
     Reads CSV file, builds prompt and target columns, and splits data
@@ -15,6 +22,7 @@ def load_dataset(csv_path: str) -> Tuple[Dataset, Dataset, Dataset]:
     
     Args:
         csv_path: Path to CSV file containing training data
+        layout: Prompt layout, one of ``PROMPT_LAYOUTS``
         
     Returns:
         Tuple of (test_dataset, train_dataset, validation_dataset)
@@ -32,8 +40,8 @@ def load_dataset(csv_path: str) -> Tuple[Dataset, Dataset, Dataset]:
     df = df.head(100)  # TODO: Remove for production
     
     # Build prompt and target_json columns
-    df["prompt"] = df.apply(build_prompt, axis=1)
-    df["target_json"] = df.apply(build_target_json, axis=1)
+    df["prompt"] = build_prompts(df, layout)
+    df["target_json"] = build_target_jsons(df)
 
     # Split: 95% train+val, 5% test
     train_val_df, test_df = train_test_split(
@@ -50,3 +58,74 @@ def load_dataset(csv_path: str) -> Tuple[Dataset, Dataset, Dataset]:
     val_ds = Dataset.from_pandas(val_df)
 
     return test_ds, train_ds, val_ds
+
+
+def load_tokenized_dataset(
+    csv_path: str,
+    tokenizer: AutoTokenizer,
+    max_length: int,
+    cache_dir: str,
+    num_proc: Optional[int] = None,
+    layout: str = "instructions_last",
+    previous_cache_dir: Optional[str] = None
+) -> Tuple[Dataset, Dataset, Dataset]:
+    """Load tokenized splits from the cache, building them on a miss.
+
+    Splits are tokenized in ``num_proc`` processes with prompt tokens
+    masked out of the labels, then saved as Arrow files under
+    ``cache_dir/<fingerprint>``. The fingerprint covers the CSV contents,
+    the tokenizer, the prompt version and layout, and ``max_length``, so a
+    later job with the same inputs memory-maps the saved splits instead of
+    re-tokenizing. On SageMaker ``cache_dir`` is under the uploaded outputs
+    and ``previous_cache_dir`` is where earlier uploads are mounted back.
+
+    Args:
+        csv_path: Path to CSV file containing training data
+        tokenizer: Model tokenizer with a chat template
+        max_length: Maximum number of tokens per example
+        cache_dir: Directory holding tokenized datasets
+        num_proc: Tokenization worker processes (default: all cores)
+        layout: Prompt layout, one of ``PROMPT_LAYOUTS``
+        previous_cache_dir: Read-only directory with datasets cached by
+            earlier jobs, checked when ``cache_dir`` has no match
+
+    Returns:
+        Tuple of (test_dataset, train_dataset, validation_dataset) with
+        ``input_ids``, ``labels`` and ``length`` columns
+
+    Example:
+        >>> test_ds, train_ds, val_ds = load_tokenized_dataset(
+        ...     "data/training.csv", tokenizer, 1024, "cache/tokenized")
+    """
+    fingerprint = dataset_fingerprint(csv_path, tokenizer, max_length, layout)
+    path = os.path.join(cache_dir, fingerprint)
+    candidates = [path]
+    if previous_cache_dir:
+        candidates.append(os.path.join(previous_cache_dir, fingerprint))
+    cached = next(
+        (c for c in candidates if os.path.exists(os.path.join(c, "dataset_dict.json"))), None
+    )
+
+    if cached is None:
+        test_ds, train_ds, val_ds = load_dataset(csv_path, layout)
+        num_proc = num_proc or os.cpu_count()
+        splits = DatasetDict({
+            "test": tokenize_dataset(test_ds, tokenizer, max_length, num_proc),
+            "train": tokenize_dataset(train_ds, tokenizer, max_length, num_proc),
+            "validation": tokenize_dataset(val_ds, tokenizer, max_length, num_proc),
+        })
+        # Save next to the target and rename, so readers never see a partial cache
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        splits.save_to_disk(tmp_path)
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            # Another job finished the same cache first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        print(f"💾 Tokenized dataset saved to {path}")
+    else:
+        print(f"⚡ Reusing tokenized dataset {cached}")
+        path = cached
+
+    splits = load_from_disk(path)
+    return splits["test"], splits["train"], splits["validation"]
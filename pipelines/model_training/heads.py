@@ -0,0 +1,184 @@
+"""Multi-horizon classification heads on the Mistral backbone.
+
+Alternative to teaching the model to write the JSON answer: the prompt is
+encoded once, the hidden state of its last token is pooled, and eight
+linear heads (direction and magnitude for each horizon) classify it. The
+backbone is adapted with LoRA and everything is trained with cross-entropy.
+Saved models hold the LoRA adapter plus ``heads.safetensors`` and
+``heads_config.json``, which the inference pipeline reads to rebuild the
+heads without this module.
+"""
+
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+import torch
+from torch import nn
+import torch.nn.functional as F
+from safetensors.torch import load_file, save_file
+from datasets import Dataset
+from transformers import AutoTokenizer
+from transformers.modeling_outputs import SequenceClassifierOutput
+from src.tokenization import IGNORE_INDEX, prompt_token_ids
+
+DIRECTIONS = ["Up", "Down", "Neutral"]
+MAGNITUDES = ["low impact", "medium-low impact", "medium-high impact", "high impact"]
+# (field, labels) per head, in the order of the concatenated logits
+HEAD_FIELDS: List[Tuple[str, List[str]]] = [
+    field
+    for horizon in ("6h", "12h", "24h", "48h")
+    for field in ((f"direction_{horizon}", DIRECTIONS), (f"magnitude_{horizon}", MAGNITUDES))
+]
+HEADS_WEIGHTS_NAME = "heads.safetensors"
+HEADS_CONFIG_NAME = "heads_config.json"
+
+
+def encode_labels(example: Dict[str, Any]) -> List[int]:
+    """Class index of every head for one example (``IGNORE_INDEX`` if missing/unknown)."""
+    return [
+        labels.index(example.get(field)) if example.get(field) in labels else IGNORE_INDEX
+        for field, labels in HEAD_FIELDS
+    ]
+
+
+def split_logits(logits: torch.Tensor) -> List[torch.Tensor]:
+    """Split concatenated ``[batch, sum(labels)]`` logits into one tensor per head."""
+    return list(torch.split(logits, [len(labels) for _, labels in HEAD_FIELDS], dim=-1))
+
+
+def tokenize_classification_dataset(
+    dataset: Dataset,
+    tokenizer: AutoTokenizer,
+    max_length: int,
+    num_proc: Optional[int] = None
+) -> Dataset:
+    """Tokenize prompts and encode per-head labels for the classification variant.
+
+    Args:
+        dataset: Dataset from ``load_dataset`` (``prompt`` plus the raw
+            direction and magnitude columns)
+        tokenizer: Model tokenizer with a chat template
+        max_length: Maximum number of prompt tokens
+        num_proc: Worker processes (None tokenizes in this process)
+
+    Returns:
+        Dataset with ``input_ids``, ``labels`` (one class index per head)
+        and ``length`` columns only
+    """
+    def tokenize_row(example: Dict[str, Any]) -> Dict[str, Any]:
+        input_ids = prompt_token_ids(example["prompt"], tokenizer)[:max_length]
+        return {"input_ids": input_ids, "labels": encode_labels(example), "length": len(input_ids)}
+
+    return dataset.map(
+        tokenize_row,
+        remove_columns=dataset.column_names,
+        num_proc=num_proc if num_proc and num_proc > 1 and len(dataset) > num_proc else None,
+        desc="Tokenizing",
+    )
+
+
+class MultiHorizonClassifier(nn.Module):
+    """LoRA-adapted decoder with one linear classification head per field.
+
+    The forward pass returns a ``SequenceClassifierOutput`` whose logits
+    are the heads' logits concatenated in ``HEAD_FIELDS`` order, and whose
+    loss is the mean cross-entropy over heads, so it trains with the
+    standard ``Trainer``.
+
+    Example:
+        >>> model = MultiHorizonClassifier(peft_backbone, hidden_size=4096)
+        >>> out = model(input_ids, attention_mask, labels=labels)  # labels: [batch, 8]
+        >>> [t.shape for t in split_logits(out.logits)]
+        [torch.Size([2, 3]), torch.Size([2, 4]), ...]
+    """
+
+    def __init__(self, backbone: nn.Module, hidden_size: int, dropout: float = 0.1):
+        """
+        Args:
+            backbone: Decoder returning ``last_hidden_state`` (e.g. a LoRA
+                ``MistralModel``)
+            hidden_size: Hidden size of the backbone
+            dropout: Dropout on the pooled hidden state during training
+        """
+        super().__init__()
+        self.backbone = backbone
+        self.hidden_size = hidden_size
+        self.dropout = nn.Dropout(dropout)
+        self.heads = nn.ModuleDict({
+            field: nn.Linear(hidden_size, len(labels)) for field, labels in HEAD_FIELDS
+        })
+
+    def gradient_checkpointing_enable(self, **kwargs) -> None:
+        self.backbone.gradient_checkpointing_enable(**kwargs)
+
+    def forward(
+        self,
+        input_ids: torch.Tensor,
+        attention_mask: torch.Tensor,
+        labels: Optional[torch.Tensor] = None,
+        **kwargs
+    ) -> SequenceClassifierOutput:
+        hidden = self.backbone(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+        # Right padding: the last real token sees the whole prompt
+        last = attention_mask.sum(dim=1) - 1
+        pooled = hidden[torch.arange(hidden.shape[0], device=hidden.device), last]
+        pooled = self.dropout(pooled.float())
+        logits = [self.heads[field](pooled) for field, _ in HEAD_FIELDS]
+
+        loss = None
+        if labels is not None:
+            losses = [
+                F.cross_entropy(head_logits, labels[:, i], ignore_index=IGNORE_INDEX)
+                for i, head_logits in enumerate(logits)
+                if (labels[:, i] != IGNORE_INDEX).any()
+            ]
+            loss = torch.stack(losses).mean() if losses else pooled.sum() * 0
+        return SequenceClassifierOutput(loss=loss, logits=torch.cat(logits, dim=-1))
+
+    def save_pretrained(self, path: str) -> None:
+        """Save the LoRA adapter, head weights and head config to ``path``."""
+        os.makedirs(path, exist_ok=True)
+        self.backbone.save_pretrained(path)
+        save_file(
+            {name: tensor.contiguous() for name, tensor in self.heads.state_dict().items()},
+            os.path.join(path, HEADS_WEIGHTS_NAME)
+        )
+        with open(os.path.join(path, HEADS_CONFIG_NAME), "w") as f:
+            json.dump(
+                {"fields": HEAD_FIELDS, "pooling": "last", "hidden_size": self.hidden_size},
+                f, indent=2
+            )
+
+    def load_heads(self, path: str) -> None:
+        """Load head weights saved by :meth:`save_pretrained`."""
+        state = load_file(os.path.join(path, HEADS_WEIGHTS_NAME))
+        device = next(self.heads.parameters()).device
+        self.heads.load_state_dict({name: tensor.to(device) for name, tensor in state.items()})
+
+
+class ClassificationCollator:
+    """Right-pad prompts and stack the per-head labels of a batch."""
+
+    def __init__(self, pad_token_id: int, pad_to_multiple_of: Optional[int] = 8):
+        """
+        Args:
+            pad_token_id: Token id used for padding
+            pad_to_multiple_of: Round the padded length up to a multiple of this
+        """
+        self.pad_token_id = pad_token_id
+        self.pad_to_multiple_of = pad_to_multiple_of
+
+    def __call__(self, features: List[Dict[str, Any]]) -> Dict[str, torch.Tensor]:
+        seq_len = max(len(f["input_ids"]) for f in features)
+        if self.pad_to_multiple_of:
+            multiple = self.pad_to_multiple_of
+            seq_len = (seq_len + multiple - 1) // multiple * multiple
+
+        input_ids = torch.full((len(features), seq_len), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(features), seq_len), dtype=torch.long)
+        for b, f in enumerate(features):
+            n = len(f["input_ids"])
+            input_ids[b, :n] = torch.tensor(f["input_ids"])
+            attention_mask[b, :n] = 1
+        labels = torch.tensor([f["labels"] for f in features], dtype=torch.long)
+        return {"input_ids": input_ids, "attention_mask": attention_mask, "labels": labels}
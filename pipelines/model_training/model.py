@@ -1,16 +1,20 @@
 # src/model.py
-from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig
+from transformers import AutoTokenizer, AutoModel, AutoModelForCausalLM, BitsAndBytesConfig
 from peft import LoraConfig, get_peft_model, prepare_model_for_kbit_training, TaskType
 import torch
+from src.heads import MultiHorizonClassifier
 
-def load_model_tokenizer(cfg, cache_dir):
+def _load_tokenizer(cfg, cache_dir):
     tok = AutoTokenizer.from_pretrained(
         cfg["model"]["name"], trust_remote_code=True, use_fast=False, cache_dir=cache_dir
     )
     if tok.pad_token is None:
         tok.pad_token = tok.eos_token
     tok.padding_side = "right"
+    return tok
+
 
+def _load_backbone(model_cls, cfg, cache_dir):
     # 1. Carrega o modelo em 4-bit ou full precision
     if cfg["model"]["load_in_4bit"]:
         bnb_config = BitsAndBytesConfig(
@@ -19,7 +23,7 @@ def load_model_tokenizer(cfg, cache_dir):
             bnb_4bit_quant_type="nf4",
             bnb_4bit_compute_dtype=torch.bfloat16,
         )
-        mdl = AutoModelForCausalLM.from_pretrained(
+        mdl = model_cls.from_pretrained(
             cfg["model"]["name"],
             cache_dir=cache_dir,
             device_map="auto",
@@ -27,7 +31,7 @@ def load_model_tokenizer(cfg, cache_dir):
             trust_remote_code=True,
         )
     else:
-        mdl = AutoModelForCausalLM.from_pretrained(
+        mdl = model_cls.from_pretrained(
             cfg["model"]["name"],
             cache_dir=cache_dir,
             torch_dtype=torch.bfloat16,
@@ -43,10 +47,12 @@ def load_model_tokenizer(cfg, cache_dir):
         mdl.enable_input_require_grads()
     except Exception:
         pass  # not all models expose this method
+    return mdl
 
-    # 3. Aplica LoRA
-    lora = LoraConfig(
-        task_type=TaskType.CAUSAL_LM,
+
+def _lora_config(cfg, task_type):
+    return LoraConfig(
+        task_type=task_type,
         r=cfg["lora"]["r"],
         lora_alpha=cfg["lora"]["alpha"],
         lora_dropout=cfg["lora"]["dropout"],
@@ -54,6 +60,26 @@ def load_model_tokenizer(cfg, cache_dir):
         inference_mode=False,
         bias="none",
     )
-    mdl = get_peft_model(mdl, lora)
 
+
+def load_model_tokenizer(cfg, cache_dir):
+    tok = _load_tokenizer(cfg, cache_dir)
+    mdl = _load_backbone(AutoModelForCausalLM, cfg, cache_dir)
+
+    # 3. Aplica LoRA
+    mdl = get_peft_model(mdl, _lora_config(cfg, TaskType.CAUSAL_LM))
+
+    return mdl, tok
+
+
+def load_heads_model_tokenizer(cfg, cache_dir):
+    """Load the LoRA backbone (no LM head) wrapped with classification heads."""
+    tok = _load_tokenizer(cfg, cache_dir)
+    backbone = _load_backbone(AutoModel, cfg, cache_dir)
+    hidden_size = backbone.config.hidden_size
+    backbone = get_peft_model(backbone, _lora_config(cfg, TaskType.FEATURE_EXTRACTION))
+    mdl = MultiHorizonClassifier(
+        backbone, hidden_size, dropout=cfg.get("heads", {}).get("dropout", 0.1)
+    )
+    mdl.heads.to(next(backbone.parameters()).device)
     return mdl, tok
@@ -0,0 +1,228 @@
+"""Sequence packing, batch collation and padding statistics for fine-tuning.
+
+Prompt+JSON examples are short and vary in length, so padding every batch
+to its longest example wastes a large share of each step. Packing puts
+several examples into one row of up to ``max_length`` tokens; a
+block-diagonal causal attention mask and per-example position ids keep the
+examples from seeing each other.
+"""
+
+import random
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+import torch
+from datasets import Dataset
+from transformers.trainer_pt_utils import get_length_grouped_indices
+from src.tokenization import IGNORE_INDEX
+
+
+def pack_lengths(lengths: Sequence[int], max_length: int) -> List[List[int]]:
+    """Group example indices into packs of at most ``max_length`` tokens.
+
+    Best-fit decreasing: longest examples first, each into the fullest pack
+    that still has room for it.
+
+    Args:
+        lengths: Token count of every example
+        max_length: Token capacity of a pack
+
+    Returns:
+        Lists of example indices, one per pack
+    """
+    packs: List[List[int]] = []
+    # free[c] holds the packs with exactly c tokens of room left
+    free: List[List[int]] = [[] for _ in range(max_length + 1)]
+    for index in sorted(range(len(lengths)), key=lambda i: -lengths[i]):
+        length = min(lengths[index], max_length)
+        room = next((c for c in range(length, max_length + 1) if free[c]), None)
+        if room is None:
+            pack, room = len(packs), max_length
+            packs.append([])
+        else:
+            pack = free[room].pop()
+        packs[pack].append(index)
+        free[room - length].append(pack)
+    return packs
+
+
+def pack_dataset(dataset: Dataset, max_length: int, seed: int = 42) -> Dataset:
+    """Pack a tokenized dataset into rows of up to ``max_length`` tokens.
+
+    Args:
+        dataset: Dataset with ``input_ids``, ``labels`` and ``length`` columns
+        max_length: Token capacity of a packed row
+        seed: Seed for shuffling the examples inside each pack
+
+    Returns:
+        Dataset with ``input_ids``, ``labels``, ``position_ids``,
+        ``seq_lengths`` (example lengths in order) and ``length`` columns
+    """
+    rng = random.Random(seed)
+    input_ids, labels = dataset["input_ids"], dataset["labels"]
+    rows: Dict[str, List[Any]] = {
+        "input_ids": [], "labels": [], "position_ids": [], "seq_lengths": [], "length": []
+    }
+    for pack in pack_lengths(dataset["length"], max_length):
+        rng.shuffle(pack)
+        row_ids, row_labels, positions, seq_lengths = [], [], [], []
+        for index in pack:
+            ids = input_ids[index][:max_length]
+            row_ids.extend(ids)
+            row_labels.extend(labels[index][:max_length])
+            positions.extend(range(len(ids)))
+            seq_lengths.append(len(ids))
+        rows["input_ids"].append(row_ids)
+        rows["labels"].append(row_labels)
+        rows["position_ids"].append(positions)
+        rows["seq_lengths"].append(seq_lengths)
+        rows["length"].append(len(row_ids))
+    return Dataset.from_dict(rows)
+
+
+class CausalLMCollator:
+    """Pad examples (packed or not) into a causal LM training batch.
+
+    With ``block_diagonal=True`` the batch carries a 4D ``[batch, 1, seq,
+    seq]`` attention mask in the 1 = attend / 0 = masked format accepted
+    by ``transformers`` 4.37, causal within each packed example and zero
+    across examples, plus per-example ``position_ids``. Otherwise a plain
+    2D padding mask is used. Columns other than the token fields (e.g.
+    ``length``) are dropped.
+
+    Example:
+        >>> collator = CausalLMCollator(tokenizer.pad_token_id, block_diagonal=True,
+        ...                             mask_dtype=torch.bfloat16)
+        >>> batch = collator([packed_ds[0], packed_ds[1]])
+        >>> batch["attention_mask"].shape
+        torch.Size([2, 1, 1024, 1024])
+    """
+
+    def __init__(
+        self,
+        pad_token_id: int,
+        pad_to_multiple_of: Optional[int] = 8,
+        block_diagonal: bool = False,
+        mask_dtype: torch.dtype = torch.float32
+    ):
+        """
+        Args:
+            pad_token_id: Token id used for padding
+            pad_to_multiple_of: Round the padded length up to a multiple of this
+            block_diagonal: Build the 4D per-example mask for packed rows
+            mask_dtype: Dtype of the 4D mask; match the model's compute dtype
+        """
+        self.pad_token_id = pad_token_id
+        self.pad_to_multiple_of = pad_to_multiple_of
+        self.block_diagonal = block_diagonal
+        self.mask_dtype = mask_dtype
+
+    def __call__(self, features: List[Dict[str, Any]]) -> Dict[str, torch.Tensor]:
+        seq_len = max(len(f["input_ids"]) for f in features)
+        if self.pad_to_multiple_of:
+            multiple = self.pad_to_multiple_of
+            seq_len = (seq_len + multiple - 1) // multiple * multiple
+
+        batch_size = len(features)
+        input_ids = torch.full((batch_size, seq_len), self.pad_token_id, dtype=torch.long)
+        labels = torch.full((batch_size, seq_len), IGNORE_INDEX, dtype=torch.long)
+        for b, f in enumerate(features):
+            n = len(f["input_ids"])
+            input_ids[b, :n] = torch.tensor(f["input_ids"])
+            labels[b, :n] = torch.tensor(f["labels"])
+
+        if not self.block_diagonal:
+            attention_mask = torch.zeros((batch_size, seq_len), dtype=torch.long)
+            for b, f in enumerate(features):
+                attention_mask[b, :len(f["input_ids"])] = 1
+            return {"input_ids": input_ids, "labels": labels, "attention_mask": attention_mask}
+
+        causal = torch.tril(torch.ones((seq_len, seq_len), dtype=self.mask_dtype))
+        attention_mask = torch.zeros((batch_size, 1, seq_len, seq_len), dtype=self.mask_dtype)
+        position_ids = torch.zeros((batch_size, seq_len), dtype=torch.long)
+        for b, f in enumerate(features):
+            n = len(f["input_ids"])
+            seq_lengths = f.get("seq_lengths") or [n]
+            start = 0
+            for length in seq_lengths:
+                end = start + length
+                attention_mask[b, 0, start:end, start:end] = causal[:length, :length]
+                position_ids[b, start:end] = torch.arange(length)
+                start = end
+            # Padding rows attend to themselves only, which keeps softmax finite
+            pad = torch.arange(n, seq_len)
+            attention_mask[b, 0, pad, pad] = 1
+        return {
+            "input_ids": input_ids,
+            "labels": labels,
+            "attention_mask": attention_mask,
+            "position_ids": position_ids,
+        }
+
+
+def padding_ratio(batches: Iterable[Sequence[int]]) -> float:
+    """Share of padded tokens when each batch is padded to its longest row."""
+    padded = real = 0
+    for lengths in batches:
+        if lengths:
+            padded += max(lengths) * len(lengths)
+            real += sum(lengths)
+    return 1 - real / padded if padded else 0.0
+
+
+def padding_report(
+    lengths: Sequence[int],
+    batch_size: int,
+    max_length: int,
+    packing: bool = False,
+    group_by_length: bool = False,
+    seed: int = 42
+) -> Dict[str, float]:
+    """Estimate the padding of random batches versus the configured strategy.
+
+    Args:
+        lengths: Token count of every training example
+        batch_size: Per-device training batch size
+        max_length: Token capacity of a packed row
+        packing: Whether examples are packed
+        group_by_length: Whether batches are grouped by length (ignored
+            when packing)
+        seed: Seed of the simulated batch order
+
+    Returns:
+        Dictionary with ``padding_ratio_before`` (random batches),
+        ``padding_ratio_after`` (configured strategy) and the number of
+        training rows before and after packing
+    """
+    lengths = list(lengths)
+    rng = random.Random(seed)
+    order = list(range(len(lengths)))
+    rng.shuffle(order)
+
+    def batched(indices: List[int], row_lengths: List[int]) -> List[List[int]]:
+        return [
+            [row_lengths[i] for i in indices[start:start + batch_size]]
+            for start in range(0, len(indices), batch_size)
+        ]
+
+    before = padding_ratio(batched(order, lengths))
+    rows = len(lengths)
+    if packing:
+        pack_sizes = [
+            sum(min(lengths[i], max_length) for i in pack)
+            for pack in pack_lengths(lengths, max_length)
+        ]
+        pack_order = list(range(len(pack_sizes)))
+        rng.shuffle(pack_order)
+        after = padding_ratio(batched(pack_order, pack_sizes))
+        rows = len(pack_sizes)
+    elif group_by_length:
+        generator = torch.Generator().manual_seed(seed)
+        grouped = get_length_grouped_indices(lengths, batch_size, generator=generator)
+        after = padding_ratio(batched(grouped, lengths))
+    else:
+        after = before
+    return {
+        "padding_ratio_before": before,
+        "padding_ratio_after": after,
+        "train_rows_before": float(len(lengths)),
+        "train_rows_after": float(rows),
+    }
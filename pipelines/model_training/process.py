@@ -0,0 +1,87 @@
+# Training job entry point. In the job's code directory the training modules
+# live under src/ (see run.py), next to this script and config.yaml.
+import os
+os.environ["TRANSFORMERS_NO_TF"] = "1"
+
+import yaml
+from transformers.trainer_utils import get_last_checkpoint
+from src.data import load_dataset, load_tokenized_dataset
+from src.evaluate import run_test_evaluation
+from src.heads import tokenize_classification_dataset
+from src.model import load_heads_model_tokenizer, load_model_tokenizer
+from src.train import make_heads_trainer, make_trainer
+
+is_sage_maker = "SM_MODEL_DIR" in os.environ
+config_path = os.environ.get("CONFIG_PATH", os.path.join(os.path.dirname(__file__), "config.yaml"))
+
+with open(config_path) as f:
+    cfg = yaml.safe_load(f)
+paths = cfg["paths"]
+
+if is_sage_maker:
+    input_csv = paths["input_csv_sagemaker"]
+    output_dir = paths["output_dir_sagemaker"]
+    cache_dir = paths["cache_sagemaker"]
+    tokenized_cache_dir = paths["tokenized_cache_sagemaker"]
+    previous_tokenized_cache_dir = paths.get("tokenized_cache_previous_sagemaker")
+    print("Running in SageMaker")
+
+else:
+    input_csv = paths["input_csv_local"]
+    output_dir = paths["output_dir_local"]
+    cache_dir = paths["cache_local"]
+    tokenized_cache_dir = paths["tokenized_cache_local"]
+    previous_tokenized_cache_dir = None
+    print("Running Local")
+
+
+if __name__ == "__main__":
+    variant = cfg["model"].get("variant", "causal_lm")
+    layout = cfg["tokenization"]["prompt_layout"]
+    max_length = cfg["tokenization"]["max_input_length"]
+    print(f"Variant: {variant}, prompt layout: {layout}")
+
+    if variant == "causal_lm":
+        model, tokenizer = load_model_tokenizer(cfg, cache_dir)
+
+        # Tokenized in tokenization.num_proc processes once per input/tokenizer/prompt
+        # fingerprint; later runs memory-map the cached splits
+        test_ds, train_ds, val_ds = load_tokenized_dataset(
+            input_csv, tokenizer, max_length, tokenized_cache_dir,
+            num_proc=cfg["tokenization"].get("num_proc"),
+            layout=layout,
+            previous_cache_dir=previous_tokenized_cache_dir,
+        )
+        trainer = make_trainer(model, tokenizer, train_ds, val_ds, cfg, output_dir)
+
+    elif variant == "heads":
+        model, tokenizer = load_heads_model_tokenizer(cfg, cache_dir)
+
+        # One label per head instead of a target JSON, so the causal-LM cache does not apply
+        num_proc = cfg["tokenization"].get("num_proc") or os.cpu_count()
+        test_ds, train_ds, val_ds = (
+            tokenize_classification_dataset(ds, tokenizer, max_length, num_proc)
+            for ds in load_dataset(input_csv, layout)
+        )
+        trainer = make_heads_trainer(model, tokenizer, train_ds, val_ds, cfg, output_dir)
+
+    else:
+        raise ValueError(f"Unknown model.variant {variant!r}, expected 'causal_lm' or 'heads'")
+
+    print(f"Train: {len(train_ds)}, Val: {len(val_ds)}, Test: {len(test_ds)}")
+
+    checkpoint_dir = trainer.args.output_dir
+    resume_from = None
+    if cfg["train"].get("resume_from_checkpoint") and os.path.isdir(checkpoint_dir):
+        resume_from = get_last_checkpoint(checkpoint_dir)
+    if resume_from:
+        print(f"Resuming from {resume_from}")
+    trainer.train(resume_from_checkpoint=resume_from)
+
+    trainer.save_model(output_dir)
+    tokenizer.save_pretrained(output_dir)
+    # Inference reads the variant and prompt layout the adapter was trained with
+    with open(os.path.join(output_dir, "training_config.yaml"), "w") as f:
+        yaml.safe_dump(cfg, f, sort_keys=False)
+    run_test_evaluation(trainer, test_ds, output_dir)
+    print(f"✅ Training finished, adapter saved to {output_dir}")
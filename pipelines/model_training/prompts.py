@@ -4,8 +4,28 @@ import json
 from typing import Dict, Any
 import pandas as pd
 
+# Bump whenever build_prompt or build_target_json output changes
+PROMPT_VERSION = "1"
 
-def build_prompt(row: pd.Series) -> str:
+# Static answer-format block shared by every prompt
+PROMPT_INSTRUCTIONS = (
+    "Respond ONLY with a compact JSON using keys: "
+    "\"direction_6h\",\"magnitude_6h\",\"direction_12h\",\"magnitude_12h\","
+    "\"direction_24h\",\"magnitude_24h\",\"direction_48h\",\"magnitude_48h\".\n"
+    "Directions: \"Up\"|\"Down\"|\"Neutral\". "
+    "Magnitudes: \"low impact\"|\"medium-low impact\"|\"medium-high impact\"|\"high impact\"."
+)
+# "instructions_last" is the original layout. "instructions_first" puts the static
+# block first so inference can reuse its KV cache across headlines.
+PROMPT_LAYOUTS = ("instructions_last", "instructions_first")
+
+
+def _check_layout(layout: str) -> None:
+    if layout not in PROMPT_LAYOUTS:
+        raise ValueError(f"Unknown prompt layout {layout!r}, expected one of {PROMPT_LAYOUTS}")
+
+
+def build_prompt(row: pd.Series, layout: str = "instructions_last") -> str:
     """Build training prompt from news and market data.
     
     Constructs a structured prompt containing news headline, sentiment
@@ -13,6 +33,8 @@ def build_prompt(row: pd.Series) -> str:
     
     Args:
         row: DataFrame row with news, sentiment, and market data
+        layout: Where the static answer-format block goes, one of
+            ``PROMPT_LAYOUTS``
         
     Returns:
         Formatted prompt string for model training/inference
@@ -31,7 +53,8 @@ def build_prompt(row: pd.Series) -> str:
         ... })
         >>> prompt = build_prompt(row)
     """
-    return (
+    _check_layout(layout)
+    body = (
         f"News: {row['generated_headline']}\n"
         f"Sentiment: {row['label']} ({row['sentiment_strength']})\n"
         f"Explanation: {row['explanation']}\n"
@@ -43,13 +66,11 @@ def build_prompt(row: pd.Series) -> str:
         f"    • 6h later: {row['market_closed_verifier_6h']}\n"
         f"    • 12h later: {row['market_closed_verifier_12h']}\n"
         f"    • 24h later: {row['market_closed_verifier_24h']}\n"
-        f"    • 48h later: {row['market_closed_verifier_48h']}\n"
-        "Respond ONLY with a compact JSON using keys: "
-        "\"direction_6h\",\"magnitude_6h\",\"direction_12h\",\"magnitude_12h\","
-        "\"direction_24h\",\"magnitude_24h\",\"direction_48h\",\"magnitude_48h\".\n"
-        "Directions: \"Up\"|\"Down\"|\"Neutral\". "
-        "Magnitudes: \"low impact\"|\"medium-low impact\"|\"medium-high impact\"|\"high impact\"."
+        f"    • 48h later: {row['market_closed_verifier_48h']}"
     )
+    if layout == "instructions_first":
+        return PROMPT_INSTRUCTIONS + "\n" + body
+    return body + "\n" + PROMPT_INSTRUCTIONS
 
 
 def build_target_json(row: pd.Series) -> str:
@@ -87,3 +108,99 @@ def build_target_json(row: pd.Series) -> str:
         "magnitude_48h": row["magnitude_48h"],
     }
     return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+
+TARGET_FIELDS = [
+    "direction_6h", "magnitude_6h",
+    "direction_12h", "magnitude_12h",
+    "direction_24h", "magnitude_24h",
+    "direction_48h", "magnitude_48h",
+]
+
+
+def _text(df: pd.DataFrame, column: str) -> pd.Series:
+    """Column rendered the way an f-string renders each value.
+
+    ``astype(str)`` keeps missing values missing on string dtypes (the
+    default for text columns from pandas 3), while the f-string in
+    ``build_prompt`` renders them as ``nan``/``<NA>``, so each value goes
+    through ``str`` instead.
+    """
+    return df[column].astype(object).map(str)
+
+
+def build_prompts(df: pd.DataFrame, layout: str = "instructions_last") -> pd.Series:
+    """Column-wise version of :func:`build_prompt` for a whole DataFrame.
+
+    Builds every prompt with vectorized string concatenation instead of
+    one Python call per row; the output is identical to
+    ``df.apply(build_prompt, axis=1, layout=layout)``.
+
+    Args:
+        df: DataFrame with news, sentiment, and market data columns
+        layout: Where the static answer-format block goes, one of
+            ``PROMPT_LAYOUTS``
+
+    Returns:
+        Series of prompts aligned with ``df.index``
+
+    Example:
+        >>> df["prompt"] = build_prompts(df)
+    """
+    _check_layout(layout)
+    body = (
+        "News: " + _text(df, "generated_headline") + "\n"
+        + "Sentiment: " + _text(df, "label") + " (" + _text(df, "sentiment_strength") + ")\n"
+        + "Explanation: " + _text(df, "explanation") + "\n"
+        + "Asset Context:\n"
+        + "- Symbol: " + _text(df, "symbol") + " (" + _text(df, "symbol_name") + ")\n"
+        + "Market status:\n"
+        + "- Was the market open at time of news? " + _text(df, "market_closed_verifier") + "\n"
+        + "- Will the market be open during future impact windows?\n"
+        + "    • 6h later: " + _text(df, "market_closed_verifier_6h") + "\n"
+        + "    • 12h later: " + _text(df, "market_closed_verifier_12h") + "\n"
+        + "    • 24h later: " + _text(df, "market_closed_verifier_24h") + "\n"
+        + "    • 48h later: " + _text(df, "market_closed_verifier_48h")
+    )
+    if layout == "instructions_first":
+        return PROMPT_INSTRUCTIONS + "\n" + body
+    return body + "\n" + PROMPT_INSTRUCTIONS
+
+
+def _json_values(column: pd.Series) -> pd.Series:
+    """JSON-encode a column, encoding each distinct value only once."""
+    codes, uniques = pd.factorize(column)
+    encoded = [json.dumps(value, ensure_ascii=False) for value in uniques.tolist()]
+    result = pd.Series(encoded + [""], dtype=object).take(codes).reset_index(drop=True)
+    # factorize maps missing values to -1; encode those rows individually (NaN vs None)
+    missing = codes == -1
+    if missing.any():
+        result[missing] = [
+            json.dumps(value, ensure_ascii=False) for value in column[missing].tolist()
+        ]
+    result.index = column.index
+    return result
+
+
+def build_target_jsons(df: pd.DataFrame) -> pd.Series:
+    """Column-wise version of :func:`build_target_json` for a whole DataFrame.
+
+    The label columns hold a handful of distinct values, so each value is
+    JSON-encoded once and the objects are assembled by string
+    concatenation; the output is identical to
+    ``df.apply(build_target_json, axis=1)``.
+
+    Args:
+        df: DataFrame with direction and magnitude columns
+
+    Returns:
+        Series of compact JSON strings aligned with ``df.index``
+
+    Example:
+        >>> df["target_json"] = build_target_jsons(df)
+    """
+    result = None
+    for i, field in enumerate(TARGET_FIELDS):
+        part = ("{" if i == 0 else ",") + json.dumps(field) + ":" + _json_values(df[field])
+        result = part if result is None else result + part
+    return result + "}"
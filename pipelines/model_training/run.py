@@ -13,7 +13,8 @@ from src.utils.sagemaker_utils import (
     create_sagemaker_session,
     generate_job_name,
     create_processor,
-    run_processing_job
+    run_processing_job,
+    stage_source_dir
 )
 
 
@@ -71,8 +72,14 @@ def main():
     print(f"📊 Instance: {config.model.instance_type_training}")
     run_processing_job(
         processor=processor,
-        code_file="run.py",
-        source_dir="./files/code",
+        code_file="process.py",
+        # The training modules import each other as src.<module>, so they go
+        # under src/ with the entry point and its config at the root
+        source_dir=stage_source_dir({
+            "process.py": "pipelines/model_training/process.py",
+            "config.yaml": "pipelines/model_training/config.yaml",
+            "src": "pipelines/model_training",
+        }),
         inputs=inputs,
         outputs=outputs,
         job_name=job_name
@@ -0,0 +1,148 @@
+"""Tokenization of prompt/target pairs for causal LM fine-tuning."""
+
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
+from datasets import Dataset
+from transformers import AutoTokenizer
+from src.prompts import PROMPT_VERSION
+
+IGNORE_INDEX = -100
+# Bump when tokenize_example or the dataset split changes, to invalidate cached datasets
+TOKENIZATION_VERSION = "1"
+
+
+def prompt_token_ids(prompt: str, tokenizer: AutoTokenizer) -> List[int]:
+    """Token ids of a prompt wrapped in the chat template, as at inference time."""
+    text = tokenizer.apply_chat_template(
+        [{"role": "user", "content": prompt}],
+        tokenize=False,
+        add_generation_prompt=True
+    )
+    return tokenizer(text)["input_ids"]
+
+
+def tokenize_example(
+    prompt: str,
+    target_json: str,
+    tokenizer: AutoTokenizer,
+    max_length: int
+) -> Dict[str, List[int]]:
+    """Tokenize one training example with the loss restricted to the answer.
+
+    The prompt is wrapped in the chat template and tokenized exactly as
+    the inference pipeline does, followed by the target JSON and EOS.
+    Prompt tokens get ``IGNORE_INDEX`` labels, so only the JSON answer is
+    learned. Over-long prompts are cut from the end to keep the target.
+
+    Args:
+        prompt: Prompt built by ``build_prompt``
+        target_json: Target built by ``build_target_json``
+        tokenizer: Model tokenizer with a chat template
+        max_length: Maximum number of tokens per example
+
+    Returns:
+        Dictionary with ``input_ids``, ``labels`` and ``length``
+
+    Example:
+        >>> ex = tokenize_example(prompt, '{"direction_6h":"Up",...}', tok, 1024)
+        >>> ex["labels"][:3]
+        [-100, -100, -100]
+    """
+    prompt_ids = prompt_token_ids(prompt, tokenizer)
+    target_ids = tokenizer(target_json, add_special_tokens=False)["input_ids"]
+    target_ids = (target_ids + [tokenizer.eos_token_id])[:max_length]
+    prompt_ids = prompt_ids[:max_length - len(target_ids)]
+
+    input_ids = prompt_ids + target_ids
+    return {
+        "input_ids": input_ids,
+        "labels": [IGNORE_INDEX] * len(prompt_ids) + target_ids,
+        "length": len(input_ids),
+    }
+
+
+def tokenize_dataset(
+    dataset: Dataset,
+    tokenizer: AutoTokenizer,
+    max_length: int,
+    num_proc: Optional[int] = None
+) -> Dataset:
+    """Tokenize a dataset with ``prompt`` and ``target_json`` columns.
+
+    Args:
+        dataset: Dataset from ``load_dataset``
+        tokenizer: Model tokenizer with a chat template
+        max_length: Maximum number of tokens per example
+        num_proc: Worker processes (None tokenizes in this process)
+
+    Returns:
+        Dataset with ``input_ids``, ``labels`` and ``length`` columns only
+    """
+    def tokenize_batch(batch: Dict[str, List[Any]]) -> Dict[str, List[Any]]:
+        examples = [
+            tokenize_example(prompt, target, tokenizer, max_length)
+            for prompt, target in zip(batch["prompt"], batch["target_json"])
+        ]
+        return {key: [ex[key] for ex in examples] for key in ("input_ids", "labels", "length")}
+
+    return dataset.map(
+        tokenize_batch,
+        batched=True,
+        remove_columns=dataset.column_names,
+        num_proc=num_proc if num_proc and num_proc > 1 and len(dataset) > num_proc else None,
+        desc="Tokenizing",
+    )
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    """Hex SHA-256 digest of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def tokenizer_fingerprint(tokenizer: AutoTokenizer) -> str:
+    """Hex digest identifying a tokenizer's vocabulary, special tokens and chat template."""
+    template = tokenizer.chat_template or getattr(tokenizer, "default_chat_template", None)
+    payload = json.dumps({
+        "class": type(tokenizer).__name__,
+        "name": tokenizer.name_or_path,
+        "vocab": sorted(tokenizer.get_vocab().items()),
+        "special": tokenizer.special_tokens_map,
+        "chat_template": template,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def dataset_fingerprint(
+    csv_path: str,
+    tokenizer: AutoTokenizer,
+    max_length: int,
+    layout: str = "instructions_last"
+) -> str:
+    """Cache key of a tokenized dataset.
+
+    Changes whenever the input CSV, the tokenizer, the prompt version or
+    layout, the tokenization code version or the length limit changes.
+
+    Args:
+        csv_path: Training CSV
+        tokenizer: Model tokenizer
+        max_length: Maximum number of tokens per example
+        layout: Prompt layout
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    payload = json.dumps([
+        file_sha256(csv_path),
+        tokenizer_fingerprint(tokenizer),
+        PROMPT_VERSION,
+        TOKENIZATION_VERSION,
+        max_length,
+        layout,
+    ])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
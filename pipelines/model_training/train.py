@@ -3,11 +3,17 @@ import os
 os.environ["TRANSFORMERS_NO_TF"] = "1"
 
 import json, numpy as np
+import torch
 from sklearn.metrics import accuracy_score, f1_score
 from transformers import TrainingArguments, Trainer, EarlyStoppingCallback
+from src.tokenization import IGNORE_INDEX, tokenize_dataset
+from src.packing import CausalLMCollator, pack_dataset, padding_report
+from src.heads import HEAD_FIELDS, ClassificationCollator, tokenize_classification_dataset
 
 DIR_FIELDS = ["direction_6h","direction_12h","direction_24h","direction_48h"]
 MAG_FIELDS = ["magnitude_6h","magnitude_12h","magnitude_24h","magnitude_48h"]
+# Column boundaries of each head in the concatenated logits
+HEAD_SPLITS = np.cumsum([len(names) for _, names in HEAD_FIELDS])[:-1]
 
 def _preprocess_logits_for_metrics(logits, labels):
     # alguns modelos retornam tuple
@@ -17,8 +23,42 @@ def _preprocess_logits_for_metrics(logits, labels):
     return logits.argmax(dim=-1)
 
 
+def _field_metrics(dir_y_true, dir_y_pred, mag_y_true, mag_y_pred):
+    metrics = {}
+    if dir_y_true:
+        metrics["eval_direction_acc_macro"] = accuracy_score(dir_y_true, dir_y_pred)
+        metrics["eval_direction_f1_macro"]  = f1_score(dir_y_true, dir_y_pred, average="macro", zero_division=0)
+    if mag_y_true:
+        metrics["eval_magnitude_acc_macro"] = accuracy_score(mag_y_true, mag_y_pred)
+        metrics["eval_magnitude_f1_macro"]  = f1_score(mag_y_true, mag_y_pred, average="macro", zero_division=0)
+
+    # Aggregate headline metric for checkpointing
+    metrics["eval_avg_macro_f1"] = metrics.get("eval_direction_f1_macro", 0.0)
+    if "eval_direction_f1_macro" in metrics and "eval_magnitude_f1_macro" in metrics:
+        metrics["eval_avg_direction_f1"] = metrics["eval_direction_f1_macro"]
+        metrics["eval_avg_macro_f1"] = 0.5*metrics["eval_direction_f1_macro"] + 0.5*metrics["eval_magnitude_f1_macro"]
+    elif "eval_direction_f1_macro" in metrics:
+        metrics["eval_avg_direction_f1"] = metrics["eval_direction_f1_macro"]
+    return metrics
+
+
+def answer_token_ids(pred_ids, labels):
+    """Predicted and target answer tokens of each row, aligned.
+
+    The prediction at position t is the model's guess for token t+1, so
+    predictions are shifted against the labels, and only positions with a
+    label (the JSON answer, not the prompt or padding) are kept.
+    """
+    pred_ids, labels = np.asarray(pred_ids), np.asarray(labels)
+    preds, targets = pred_ids[:, :-1], labels[:, 1:]
+    keep = targets != IGNORE_INDEX
+    return (
+        [row[mask].tolist() for row, mask in zip(preds, keep)],
+        [row[mask].tolist() for row, mask in zip(targets, keep)],
+    )
+
+
 def make_compute_metrics(tokenizer):
-    pad_id = tokenizer.pad_token_id or 0
 
     def safe_json(s):
         try:
@@ -27,12 +67,12 @@ def make_compute_metrics(tokenizer):
             return {}
 
     def compute_metrics(eval_pred):
-        preds, labels = eval_pred              # preds are logits
-        pred_ids = preds if preds.ndim == 2 else np.argmax(preds, axis=-1)  
-        labels = np.where(labels == -100, pad_id, labels)
+        preds, labels = eval_pred              # token ids from _preprocess_logits_for_metrics (or logits)
+        pred_ids = preds if preds.ndim == 2 else np.argmax(preds, axis=-1)
+        pred_answers, label_answers = answer_token_ids(pred_ids, labels)
 
-        pred_txt  = tokenizer.batch_decode(pred_ids, skip_special_tokens=True)
-        label_txt = tokenizer.batch_decode(labels,   skip_special_tokens=True)
+        pred_txt  = tokenizer.batch_decode(pred_answers,  skip_special_tokens=True)
+        label_txt = tokenizer.batch_decode(label_answers, skip_special_tokens=True)
 
         P = [safe_json(t.strip()) for t in pred_txt]
         G = [safe_json(t.strip()) for t in label_txt]
@@ -52,22 +92,7 @@ def make_compute_metrics(tokenizer):
                 if f in g and g[f] is not None and f in p and p[f] is not None:
                     mag_y_true.append(str(g[f]).strip()); mag_y_pred.append(str(p[f]).strip())
 
-        metrics = {}
-        if dir_y_true:
-            metrics["eval_direction_acc_macro"] = accuracy_score(dir_y_true, dir_y_pred)
-            metrics["eval_direction_f1_macro"]  = f1_score(dir_y_true, dir_y_pred, average="macro", zero_division=0)
-        if mag_y_true:
-            metrics["eval_magnitude_acc_macro"] = accuracy_score(mag_y_true, mag_y_pred)
-            metrics["eval_magnitude_f1_macro"]  = f1_score(mag_y_true, mag_y_pred, average="macro", zero_division=0)
-
-        # Aggregate headline metric for checkpointing
-        metrics["eval_avg_macro_f1"] = metrics.get("eval_direction_f1_macro", 0.0)
-        if "eval_direction_f1_macro" in metrics and "eval_magnitude_f1_macro" in metrics:
-            metrics["eval_avg_direction_f1"] = metrics["eval_direction_f1_macro"]
-            metrics["eval_avg_macro_f1"] = 0.5*metrics["eval_direction_f1_macro"] + 0.5*metrics["eval_magnitude_f1_macro"]
-        elif "eval_direction_f1_macro" in metrics:
-            metrics["eval_avg_direction_f1"] = metrics["eval_direction_f1_macro"]
-
+        metrics = _field_metrics(dir_y_true, dir_y_pred, mag_y_true, mag_y_pred)
         metrics["eval_json_parse_rate"]   = json_parse_rate
         metrics["eval_exact_json_match"]  = exact_match_rate
         return metrics
@@ -77,8 +102,58 @@ def make_compute_metrics(tokenizer):
 
 def make_trainer(model, tokenizer, train_ds, val_ds, cfg, out_dir):
     checkpoint_dir = os.environ.get("CHECKPOINT_DIR", out_dir)
+    max_length = cfg["tokenization"]["max_input_length"]
+    packing = cfg["train"].get("packing", False)
+    # Fallback when packing is off: batch examples of similar length together
+    group_by_length = cfg["train"].get("group_by_length", False) and not packing
+
+    # Datasets from load_dataset still hold prompt/target_json text;
+    # load_tokenized_dataset returns them tokenized (and cached) already
+    if "input_ids" not in train_ds.column_names:
+        num_proc = _num_proc(cfg)
+        train_ds = tokenize_dataset(train_ds, tokenizer, max_length, num_proc)
+        val_ds = tokenize_dataset(val_ds, tokenizer, max_length, num_proc)
+
+    report = padding_report(
+        train_ds["length"], cfg["train"]["per_device_train_batch_size"], max_length,
+        packing=packing, group_by_length=group_by_length, seed=cfg["train"]["seed"]
+    )
+    strategy = "packed" if packing else "length-grouped" if group_by_length else "random"
+    print(
+        f"📦 Padding ratio: {report['padding_ratio_before']:.1%} with random batches → "
+        f"{report['padding_ratio_after']:.1%} with {strategy} batches "
+        f"({int(report['train_rows_before'])} examples in {int(report['train_rows_after'])} rows)"
+    )
+    if packing:
+        train_ds = pack_dataset(train_ds, max_length, seed=cfg["train"]["seed"])
+    collator = CausalLMCollator(
+        tokenizer.pad_token_id,
+        block_diagonal=packing,
+        mask_dtype=torch.bfloat16 if cfg["train"]["bf16"] else torch.float32,
+    )
+
+    args = _training_args(cfg, checkpoint_dir, group_by_length)
+
+    return Trainer(
+        model=model,
+        args=args,
+        callbacks=[EarlyStoppingCallback(early_stopping_patience=2)],
+        train_dataset=train_ds,
+        eval_dataset=val_ds,
+        data_collator=collator,
+        tokenizer=tokenizer,
+        compute_metrics=make_compute_metrics(tokenizer),
+        preprocess_logits_for_metrics = _preprocess_logits_for_metrics
+    )
+
 
-    args = TrainingArguments(
+def _num_proc(cfg):
+    # tokenization.num_proc: null means all cores
+    return cfg["tokenization"].get("num_proc") or os.cpu_count()
+
+
+def _training_args(cfg, checkpoint_dir, group_by_length):
+    return TrainingArguments(
     output_dir=checkpoint_dir,
     per_device_train_batch_size=cfg["train"]["per_device_train_batch_size"],
     gradient_accumulation_steps=cfg["train"]["gradient_accumulation_steps"],
@@ -105,6 +180,8 @@ def make_trainer(model, tokenizer, train_ds, val_ds, cfg, out_dir):
     gradient_checkpointing=cfg["train"]["gradient_checkpointing"],
     seed=cfg["train"]["seed"],
     remove_unused_columns=cfg["train"]["remove_unused_columns"],
+    group_by_length=group_by_length,
+    length_column_name="length",
 
     dataloader_num_workers= cfg["train"]["dataloader_num_workers"] ,        
     dataloader_pin_memory= cfg["train"]["dataloader_pin_memory"],     
@@ -114,14 +191,79 @@ def make_trainer(model, tokenizer, train_ds, val_ds, cfg, out_dir):
     greater_is_better=cfg["train"].get("greater_is_better", True),
     )
 
-    return Trainer(
+
+def make_heads_compute_metrics():
+    """Same field metrics as ``make_compute_metrics``, read from the heads' logits."""
+    def compute_metrics(eval_pred):
+        logits, labels = eval_pred             # [N, sum(labels)], [N, len(HEAD_FIELDS)]
+        preds = np.stack(
+            [head.argmax(axis=-1) for head in np.split(logits, HEAD_SPLITS, axis=-1)], axis=-1
+        )
+        dir_y_true, dir_y_pred = [], []
+        mag_y_true, mag_y_pred = [], []
+        for i, (field, names) in enumerate(HEAD_FIELDS):
+            known = labels[:, i] != IGNORE_INDEX
+            y_true = [names[j] for j in labels[known, i]]
+            y_pred = [names[j] for j in preds[known, i]]
+            if field.startswith("direction"):
+                dir_y_true += y_true; dir_y_pred += y_pred
+            else:
+                mag_y_true += y_true; mag_y_pred += y_pred
+
+        metrics = _field_metrics(dir_y_true, dir_y_pred, mag_y_true, mag_y_pred)
+        # Share of examples with every labelled head right
+        correct = (preds == labels) | (labels == IGNORE_INDEX)
+        metrics["eval_exact_match"] = float(correct.all(axis=-1).mean())
+        return metrics
+
+    return compute_metrics
+
+
+class HeadsTrainer(Trainer):
+    """Trainer that checkpoints only the LoRA adapter and head weights."""
+
+    def _save(self, output_dir=None, state_dict=None):
+        output_dir = output_dir or self.args.output_dir
+        self.model.save_pretrained(output_dir)
+        if self.tokenizer is not None:
+            self.tokenizer.save_pretrained(output_dir)
+        torch.save(self.args, os.path.join(output_dir, "training_args.bin"))
+
+    def _load_best_model(self):
+        path = self.state.best_model_checkpoint
+        print(f"🏆 Loading best model from {path}")
+        self.model.backbone.load_adapter(path, adapter_name="default", is_trainable=True)
+        self.model.load_heads(path)
+
+    def _load_from_checkpoint(self, resume_from_checkpoint, model=None):
+        # Checkpoints hold the adapter and heads only, not a full state dict
+        model = model or self.model
+        model.backbone.load_adapter(resume_from_checkpoint, adapter_name="default", is_trainable=True)
+        model.load_heads(resume_from_checkpoint)
+
+
+def make_heads_trainer(model, tokenizer, train_ds, val_ds, cfg, out_dir):
+    """Trainer for the classification-heads variant (``model.variant: heads``).
+
+    Examples are single prompts with one label per head, so packing does
+    not apply; ``train.group_by_length`` still batches similar lengths.
+    """
+    checkpoint_dir = os.environ.get("CHECKPOINT_DIR", out_dir)
+    max_length = cfg["tokenization"]["max_input_length"]
+    group_by_length = cfg["train"].get("group_by_length", False)
+
+    if "input_ids" not in train_ds.column_names:
+        num_proc = _num_proc(cfg)
+        train_ds = tokenize_classification_dataset(train_ds, tokenizer, max_length, num_proc)
+        val_ds = tokenize_classification_dataset(val_ds, tokenizer, max_length, num_proc)
+
+    return HeadsTrainer(
         model=model,
-        args=args,
+        args=_training_args(cfg, checkpoint_dir, group_by_length),
         callbacks=[EarlyStoppingCallback(early_stopping_patience=2)],
         train_dataset=train_ds,
         eval_dataset=val_ds,
-        data_collator=None,
+        data_collator=ClassificationCollator(tokenizer.pad_token_id),
         tokenizer=tokenizer,
-        compute_metrics=make_compute_metrics(tokenizer),
-        preprocess_logits_for_metrics = _preprocess_logits_for_metrics
+        compute_metrics=make_heads_compute_metrics(),
     )
@@ -0,0 +1,296 @@
+"""Cascaded sentiment scoring: a lexicon first pass with FinBERT fallback.
+
+Headlines with several same-direction financial cue words ("surge",
+"rally", "plunge", ...) are labelled by the lexicon; everything else goes
+to FinBERT. Measure how much FinBERT work the cascade saves and how often
+it agrees with FinBERT alone on a held-out sample with:
+
+    python cascade.py input/generated_headline-to_finbert.csv --thresholds 0.6 0.7 0.8
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
+
+import argparse
+import itertools
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+import torch
+from finbert_utils import FinbertClassifier, load_classifier, SENTIMENT_BACKENDS
+from src.data import iter_records
+
+POSITIVE_TERMS = frozenset({
+    "surge", "surges", "surged", "soar", "soars", "soared", "rally", "rallies",
+    "rallied", "gain", "gains", "gained", "rise", "rises", "rising", "rose",
+    "climb", "climbs", "climbed", "jump", "jumps", "jumped", "boost", "boosts",
+    "boosted", "rebound", "rebounds", "rebounded", "advance", "advances",
+    "advanced", "bullish", "upbeat", "strong", "stronger", "strength", "beat",
+    "beats", "upgrade", "upgraded", "outperform", "outperforms", "profit",
+    "profits", "growth", "optimism", "optimistic", "higher", "highs",
+    "record high", "all-time high", "safe haven", "demand", "inflows",
+})
+NEGATIVE_TERMS = frozenset({
+    "fall", "falls", "fell", "falling", "drop", "drops", "dropped", "plunge",
+    "plunges", "plunged", "slump", "slumps", "slumped", "slide", "slides",
+    "slid", "decline", "declines", "declined", "tumble", "tumbles", "tumbled",
+    "sink", "sinks", "sank", "slip", "slips", "slipped", "retreat", "retreats",
+    "retreated", "crash", "crashes", "selloff", "sell-off", "bearish", "weak",
+    "weaker", "weakness", "miss", "misses", "missed", "downgrade", "downgraded",
+    "loss", "losses", "lower", "lows", "pressure", "outflows", "recession",
+})
+# Fear and concern lift safe-haven demand for gold, and "high"/"low" are mostly
+# levels ("low rates", "high inflation"), so those words carry no polarity here.
+# "despite" does not negate what follows ("rises despite strong dollar").
+NEGATORS = frozenset({"not", "no", "never", "without", "fails", "failed"})
+# Tokens after a negator whose polarity is flipped
+_NEGATION_WINDOW = 3
+_TOKEN = re.compile(r"[a-z]+(?:-[a-z]+)*")
+# Values of the sentiment_source output column
+LEXICON_SOURCE = "lexicon"
+FINBERT_SOURCE = "finbert"
+
+
+class LexiconScorer:
+    """Rule-based financial sentiment scorer, thousands of times cheaper than FinBERT.
+
+    Counts positive and negative cue terms (unigrams and bigrams), flipping
+    those shortly after a negator. The probability of the winning polarity
+    grows with the net number of cues, so a single cue or a mixed headline
+    stays below typical cascade thresholds. The lexicon never claims
+    ``Neutral`` confidently; those rows are left to FinBERT.
+
+    Attributes:
+        labels: Label names indexed by class id, matching the fallback model
+    """
+
+    def __init__(self, labels: Sequence[str]):
+        """
+        Args:
+            labels: FinBERT label names; must include Positive, Negative and Neutral
+        """
+        self.labels = list(labels)
+        index = {label.lower(): i for i, label in enumerate(self.labels)}
+        self._positive = index["positive"]
+        self._negative = index["negative"]
+        self._neutral = index["neutral"]
+
+    def polarity_counts(self, text: str) -> Tuple[int, int]:
+        """Count (positive, negative) cues in a text."""
+        tokens = _TOKEN.findall(text.lower())
+        positive = negative = 0
+        negated_until = -1
+        i = 0
+        while i < len(tokens):
+            token, step = tokens[i], 1
+            if token in NEGATORS:
+                negated_until = i + _NEGATION_WINDOW
+                i += 1
+                continue
+            bigram = f"{token} {tokens[i + 1]}" if i + 1 < len(tokens) else ""
+            if bigram in POSITIVE_TERMS or bigram in NEGATIVE_TERMS:
+                token, step = bigram, 2
+            polarity = (token in POSITIVE_TERMS) - (token in NEGATIVE_TERMS)
+            if i <= negated_until:
+                polarity = -polarity
+            if polarity > 0:
+                positive += 1
+            elif polarity < 0:
+                negative += 1
+            i += step
+        return positive, negative
+
+    def predict_proba(self, texts: Sequence[str]) -> torch.Tensor:
+        """Class probabilities for each text.
+
+        Args:
+            texts: Texts to score
+
+        Returns:
+            Float32 tensor of shape (len(texts), num_labels), in input order
+        """
+        probs = torch.zeros(len(texts), len(self.labels))
+        for row, text in enumerate(texts):
+            positive, negative = self.polarity_counts(text)
+            net = abs(positive - negative)
+            if net == 0:
+                probs[row, self._neutral] = 0.4
+                probs[row, self._positive] = probs[row, self._negative] = 0.3
+                continue
+            # 1 net cue -> 0.5, 2 -> 0.67, 3 -> 0.75; mixed cues lower it further
+            confidence = net / (net + 1 + min(positive, negative))
+            winner, loser = (
+                (self._positive, self._negative) if positive > negative
+                else (self._negative, self._positive)
+            )
+            probs[row, winner] = confidence
+            probs[row, self._neutral] = (1 - confidence) * 2 / 3
+            probs[row, loser] = (1 - confidence) / 3
+        return probs
+
+
+@dataclass
+class CascadeStats:
+    """Rows handled by each stage of a cascade.
+
+    Attributes:
+        first_stage: Rows labelled by the first-stage scorer
+        fallback: Rows sent to the fallback model
+    """
+    first_stage: int = 0
+    fallback: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.first_stage + self.fallback
+
+    @property
+    def first_stage_fraction(self) -> float:
+        """Fraction of rows the fallback model never saw."""
+        return self.first_stage / self.total if self.total else 0.0
+
+    @property
+    def fallback_fraction(self) -> float:
+        return self.fallback / self.total if self.total else 0.0
+
+
+class CascadeClassifier:
+    """Score with a cheap model first and fall back to FinBERT when unsure.
+
+    Rows whose first-stage top probability reaches ``threshold`` keep the
+    first-stage prediction; the rest are scored by the fallback model in
+    one batched call. Exposes the same ``labels`` / ``predict_proba`` /
+    ``predict`` interface as :class:`FinbertClassifier`.
+
+    Example:
+        >>> finbert = FinbertClassifier("yiyanghkust/finbert-tone", device)
+        >>> cascade = CascadeClassifier(LexiconScorer(finbert.labels), finbert, 0.7)
+        >>> cascade.predict(headlines)
+        >>> cascade.stats.first_stage_fraction
+    """
+
+    def __init__(self, first_stage: LexiconScorer, fallback: FinbertClassifier, threshold: float):
+        """
+        Args:
+            first_stage: Cheap scorer with the fallback's label order
+            fallback: Accurate model for uncertain rows
+            threshold: Minimum first-stage top probability to skip the fallback
+        """
+        if list(first_stage.labels) != list(fallback.labels):
+            raise ValueError("First stage and fallback must share the label order")
+        self.first_stage = first_stage
+        self.fallback = fallback
+        self.threshold = threshold
+        self.labels = fallback.labels
+        self.stats = CascadeStats()
+
+    def route(self, texts: Sequence[str]) -> Tuple[torch.Tensor, torch.Tensor]:
+        """First-stage probabilities and a mask of the rows that keep them."""
+        probs = self.first_stage.predict_proba(texts)
+        confident = probs.max(dim=-1).values >= self.threshold
+        return probs, confident
+
+    def predict_proba_with_sources(self, texts: Sequence[str]) -> Tuple[torch.Tensor, List[str]]:
+        """Class probabilities for each text and the stage that produced them.
+
+        Lexicon probabilities are rule-based confidences, not calibrated
+        FinBERT probabilities, so callers should keep the source with them.
+
+        Args:
+            texts: Texts to classify
+
+        Returns:
+            Tuple of (float32 CPU tensor of shape (len(texts), num_labels),
+            ``LEXICON_SOURCE`` or ``FINBERT_SOURCE`` per text), in input order
+        """
+        probs, confident = self.route(texts)
+        uncertain = (~confident).nonzero().flatten().tolist()
+        if uncertain:
+            probs[uncertain] = self.fallback.predict_proba([texts[i] for i in uncertain])
+        self.stats.first_stage += len(texts) - len(uncertain)
+        self.stats.fallback += len(uncertain)
+        sources = [LEXICON_SOURCE if keep else FINBERT_SOURCE for keep in confident.tolist()]
+        return probs, sources
+
+    def predict_proba(self, texts: Sequence[str]) -> torch.Tensor:
+        """Class probabilities for each text, from whichever stage handled it.
+
+        Args:
+            texts: Texts to classify
+
+        Returns:
+            Float32 CPU tensor of shape (len(texts), num_labels), in input order
+        """
+        return self.predict_proba_with_sources(texts)[0]
+
+    def predict(self, texts: Sequence[str]) -> List[Tuple[str, float]]:
+        """Top label and its probability for each text, in input order."""
+        scores, ids = self.predict_proba(texts).max(dim=-1)
+        return [(self.labels[i], score) for i, score in zip(ids.tolist(), scores.tolist())]
+
+
+def evaluate_cascade(
+    first_stage: LexiconScorer,
+    reference: FinbertClassifier,
+    texts: Sequence[str],
+    thresholds: Sequence[float]
+) -> List[Dict[str, float]]:
+    """Compare the cascade against the reference model alone on held-out texts.
+
+    Both stages score every text once; each threshold is then evaluated
+    without rerunning either model.
+
+    Args:
+        first_stage: Cheap first-stage scorer
+        reference: Fallback model, used as ground truth
+        texts: Held-out texts
+        thresholds: Cascade thresholds to evaluate
+
+    Returns:
+        One dictionary per threshold with the fraction of rows per path,
+        overall label agreement with the reference and the agreement on
+        the rows the first stage handled
+    """
+    first_probs = first_stage.predict_proba(texts)
+    reference_labels = reference.predict_proba(texts).argmax(dim=-1)
+    first_labels = first_probs.argmax(dim=-1)
+    first_confidence = first_probs.max(dim=-1).values
+    agrees = first_labels == reference_labels
+
+    report = []
+    for threshold in thresholds:
+        confident = first_confidence >= threshold
+        handled = int(confident.sum())
+        report.append({
+            "threshold": threshold,
+            "first_stage_fraction": handled / len(texts),
+            "fallback_fraction": 1 - handled / len(texts),
+            # Fallback rows match the reference by construction
+            "agreement": (agrees | ~confident).float().mean().item(),
+            "first_stage_agreement": agrees[confident].float().mean().item() if handled else 1.0,
+        })
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cascade vs FinBERT agreement on held-out rows")
+    parser.add_argument("input_path", help="CSV or Parquet file with headlines")
+    parser.add_argument("--column", default="generated_headline")
+    parser.add_argument("--num-rows", type=int, default=5000)
+    parser.add_argument("--holdout-every", type=int, default=10,
+                        help="Use every n-th input row as the held-out set")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.6, 0.7, 0.8])
+    parser.add_argument("--backend", default="torch", choices=SENTIMENT_BACKENDS)
+    parser.add_argument("--model-name", default="yiyanghkust/finbert-tone")
+    parser.add_argument("--cache-dir", default="./cache")
+    args = parser.parse_args()
+
+    holdout = (r for r in iter_records(args.input_path) if r.row_id % args.holdout_every == 0)
+    records = itertools.islice(holdout, args.num_rows)
+    texts = [r[args.column] for r in records if isinstance(r.get(args.column), str)]
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    reference = load_classifier(args.backend, args.model_name, device, args.cache_dir)
+    for row in evaluate_cascade(LexiconScorer(reference.labels), reference, texts, args.thresholds):
+        print(", ".join(f"{name}: {value:.3f}" for name, value in row.items()))
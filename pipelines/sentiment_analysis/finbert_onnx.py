@@ -0,0 +1,222 @@
+"""ONNX Runtime backend for FinBERT sentiment on CPU instances.
+
+FinBERT is exported to ONNX once (optionally with int8 dynamic
+quantization) and served with ONNX Runtime. Check it against the PyTorch
+path on real headlines with:
+
+    python finbert_onnx.py input/generated_headline-to_finbert.csv --backend onnx-int8
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
+
+import argparse
+import inspect
+import itertools
+import time
+from typing import Dict, Optional, Sequence
+import torch
+from transformers import AutoTokenizer, BertForSequenceClassification
+from finbert_utils import FinbertClassifier, load_classifier, SENTIMENT_BACKENDS
+from src.data import iter_records
+
+# Graph inputs in the order of BertForSequenceClassification.forward
+_INPUT_NAMES = ("input_ids", "attention_mask", "token_type_ids")
+
+
+def export_onnx(
+    model_name: str,
+    path: str,
+    cache_dir: Optional[str] = None,
+    opset: int = 14
+) -> str:
+    """Export FinBERT to an ONNX graph with dynamic batch and sequence axes.
+
+    Args:
+        model_name: Hugging Face model id or local path
+        path: Destination ``.onnx`` file
+        cache_dir: Model download cache
+        opset: ONNX opset version
+
+    Returns:
+        Path of the exported model
+    """
+    tokenizer = AutoTokenizer.from_pretrained(model_name, cache_dir=cache_dir)
+    model = BertForSequenceClassification.from_pretrained(
+        model_name, cache_dir=cache_dir, torch_dtype=torch.float32
+    ).eval()
+    dummy = tokenizer(["Gold prices surge as the dollar weakens"], return_tensors="pt")
+    names = [name for name in _INPUT_NAMES if name in dummy]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in names}
+    dynamic_axes["logits"] = {0: "batch"}
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # Export next to the target and rename, so concurrent jobs never load a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    # torch >= 2.9 defaults to the dynamo exporter (needs onnxscript); keep the
+    # TorchScript exporter the pinned torch uses
+    options = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        options["dynamo"] = False
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            ({name: dummy[name] for name in names},),
+            tmp_path,
+            input_names=names,
+            output_names=["logits"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            **options,
+        )
+    os.replace(tmp_path, path)
+    return path
+
+
+def quantize_onnx(path: str, quantized_path: str) -> str:
+    """Apply int8 dynamic quantization to the weights of an ONNX model.
+
+    Args:
+        path: Float32 ONNX model
+        quantized_path: Destination of the quantized model
+
+    Returns:
+        Path of the quantized model
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    tmp_path = f"{quantized_path}.{os.getpid()}.tmp"
+    quantize_dynamic(path, tmp_path, weight_type=QuantType.QInt8)
+    os.replace(tmp_path, quantized_path)
+    return quantized_path
+
+
+class OnnxFinbertClassifier(FinbertClassifier):
+    """FinBERT classifier running on ONNX Runtime's CPU provider.
+
+    Shares tokenization, length-sorted batching and output format with
+    :class:`FinbertClassifier`; only the forward pass differs. Exported
+    models are cached under ``export_dir`` and reused across runs.
+
+    Example:
+        >>> classifier = OnnxFinbertClassifier("yiyanghkust/finbert-tone", quantize=True)
+        >>> classifier.predict(["Gold prices surge"])
+        [('Positive', 0.99...)]
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        cache_dir: Optional[str] = None,
+        batch_size: int = 64,
+        max_length: int = 512,
+        quantize: bool = False,
+        export_dir: Optional[str] = None,
+        num_threads: Optional[int] = None
+    ):
+        """Export (if needed) and load the ONNX model.
+
+        Args:
+            model_name: Hugging Face model id or local path
+            cache_dir: Model download cache
+            batch_size: Texts per forward pass
+            max_length: Token limit per text; longer texts are truncated
+            quantize: Use the int8 dynamically quantized model
+            export_dir: Where exported models are kept; defaults to
+                ``<cache_dir>/onnx/<model name>``
+            num_threads: ONNX Runtime intra-op threads (default: all cores)
+        """
+        import onnxruntime as ort
+
+        # The torch model is only loaded by export_onnx, and only once
+        self._init_shared(model_name, torch.device("cpu"), cache_dir, batch_size, max_length)
+        export_dir = export_dir or os.path.join(
+            cache_dir or ".", "onnx", model_name.replace("/", "--")
+        )
+        self.model_path = os.path.join(export_dir, "model.onnx")
+        if not os.path.exists(self.model_path):
+            export_onnx(model_name, self.model_path, cache_dir)
+        if quantize:
+            quantized_path = os.path.join(export_dir, "model.int8.onnx")
+            if not os.path.exists(quantized_path):
+                quantize_onnx(self.model_path, quantized_path)
+            self.model_path = quantized_path
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            self.model_path, options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {node.name for node in self.session.get_inputs()}
+
+    def _logits(self, batch: Dict[str, torch.Tensor]) -> torch.Tensor:
+        feeds = {
+            name: value.numpy()
+            for name, value in batch.items() if name in self._input_names
+        }
+        # Batches are padded without token_type_ids; like the torch model,
+        # treat every token as segment 0
+        for name in self._input_names - feeds.keys():
+            feeds[name] = torch.zeros_like(batch["input_ids"]).numpy()
+        return torch.from_numpy(self.session.run(["logits"], feeds)[0])
+
+
+def parity_report(
+    reference: FinbertClassifier,
+    candidate: FinbertClassifier,
+    texts: Sequence[str]
+) -> Dict[str, float]:
+    """Compare a classifier backend against a reference on the same texts.
+
+    Args:
+        reference: Baseline classifier, normally the float32 PyTorch path
+        candidate: Classifier under test
+        texts: Texts scored by both
+
+    Returns:
+        Dictionary with label agreement, max/mean absolute probability
+        delta and the throughput of both backends
+    """
+    start = time.perf_counter()
+    expected = reference.predict_proba(texts)
+    reference_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = candidate.predict_proba(texts)
+    candidate_seconds = time.perf_counter() - start
+
+    delta = (expected - actual).abs()
+    return {
+        "texts": float(len(texts)),
+        "label_agreement": (expected.argmax(-1) == actual.argmax(-1)).float().mean().item(),
+        "max_score_delta": delta.max().item(),
+        "mean_score_delta": delta.mean().item(),
+        "reference_texts_per_second": len(texts) / reference_seconds,
+        "candidate_texts_per_second": len(texts) / candidate_seconds,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="FinBERT backend parity check")
+    parser.add_argument("input_path", help="CSV or Parquet file with headlines")
+    parser.add_argument("--column", default="generated_headline")
+    parser.add_argument("--num-rows", type=int, default=2000)
+    parser.add_argument("--backend", default="onnx-int8", choices=SENTIMENT_BACKENDS)
+    parser.add_argument("--model-name", default="yiyanghkust/finbert-tone")
+    parser.add_argument("--cache-dir", default="./cache")
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    records = itertools.islice(iter_records(args.input_path), args.num_rows)
+    texts = [r[args.column] for r in records if isinstance(r.get(args.column), str)]
+
+    cpu = torch.device("cpu")
+    reference = FinbertClassifier(args.model_name, cpu, args.cache_dir, args.batch_size)
+    candidate = load_classifier(
+        args.backend, args.model_name, cpu, args.cache_dir, args.batch_size
+    )
+    for name, value in parity_report(reference, candidate, texts).items():
+        print(f"{name}: {value:.4f}")
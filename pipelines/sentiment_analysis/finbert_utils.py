@@ -1,47 +1,177 @@
 """FinBERT sentiment analysis utilities for financial news."""
 
-from typing import Any
-import pandas as pd
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 import torch
-from transformers import BertTokenizer, BertForSequenceClassification, pipeline
+from transformers import AutoConfig, AutoTokenizer, BertForSequenceClassification
 
 
-def sentiment_analysis(
-    row: pd.Series,
-    model: BertForSequenceClassification,
-    tokenizer: BertTokenizer,
-    device: torch.device,
-    nlp: pipeline
-) -> pd.Series:
-    """Analyze sentiment of financial headline using FinBERT.
-    
+def probability_column(label: str) -> str:
+    """Output column holding the probability of a class, e.g. ``prob_positive``."""
+    return f"prob_{label.lower()}"
+
+
+def sentiment_record(probs: Sequence[float], labels: Sequence[str]) -> Dict[str, Any]:
+    """Typed sentiment columns for one text.
+
     Args:
-        row: DataFrame row containing headline and metadata
-        model: Pre-trained FinBERT model for sequence classification
-        tokenizer: BERT tokenizer instance
-        device: PyTorch device (CPU or CUDA)
-        nlp: Hugging Face pipeline for text classification
-        
+        probs: Class probabilities, indexed like ``labels``
+        labels: Label names indexed by class id
+
     Returns:
-        Series containing original data plus sentiment analysis results
-        
+        Dictionary with ``label``, ``score`` (probability of the label)
+        and one ``prob_<label>`` column per class
+    """
+    best = max(range(len(labels)), key=lambda i: probs[i])
+    record = {"label": labels[best], "score": float(probs[best])}
+    record.update({probability_column(label): float(p) for label, p in zip(labels, probs)})
+    return record
+
+
+class FinbertClassifier:
+    """Batched FinBERT sentiment classifier.
+
+    Loads the model once (fp16 on GPU), tokenizes all texts of a call
+    together and runs them in batches sorted by token length, so padding
+    stays minimal. Results are returned in input order. On CPU the linear
+    layers can be dynamically quantized to int8.
+
+    Attributes:
+        model: FinBERT sequence classification model in eval mode
+        tokenizer: Matching fast tokenizer
+        labels: Label names indexed by class id
+        batch_size: Texts per forward pass
+
     Example:
-        >>> row = pd.Series({"id": 1, "symbol": "GOLD", "name": "Gold", 
-        ...                  "generated_headline": "Gold prices surge"})
-        >>> result = sentiment_analysis(row, model, tokenizer, device, nlp)
+        >>> classifier = FinbertClassifier("yiyanghkust/finbert-tone", device)
+        >>> classifier.predict(["Gold prices surge", "Miners slump"])
+        [('Positive', 0.99...), ('Negative', 0.98...)]
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        device: torch.device,
+        cache_dir: Optional[str] = None,
+        batch_size: int = 64,
+        max_length: int = 512,
+        quantize: bool = False
+    ):
+        """Load the tokenizer and model.
+
+        Args:
+            model_name: Hugging Face model id or local path
+            device: PyTorch device (CPU or CUDA)
+            cache_dir: Model download cache
+            batch_size: Texts per forward pass
+            max_length: Token limit per text; longer texts are truncated
+            quantize: Apply int8 dynamic quantization to the linear layers
+                (CPU only)
+        """
+        if quantize and device.type != "cpu":
+            raise ValueError("int8 dynamic quantization is only supported on CPU")
+        self._init_shared(model_name, device, cache_dir, batch_size, max_length)
+        dtype = torch.float16 if device.type == "cuda" else torch.float32
+        self.model = BertForSequenceClassification.from_pretrained(
+            model_name, cache_dir=cache_dir, torch_dtype=dtype
+        ).to(device).eval()
+        if quantize:
+            self.model = torch.quantization.quantize_dynamic(
+                self.model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+
+    def _init_shared(
+        self,
+        model_name: str,
+        device: torch.device,
+        cache_dir: Optional[str],
+        batch_size: int,
+        max_length: int
+    ) -> None:
+        """Set up everything but the model; shared by all backends."""
+        self.device = device
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name, cache_dir=cache_dir)
+        config = AutoConfig.from_pretrained(model_name, cache_dir=cache_dir)
+        self.labels = [config.id2label[i] for i in range(config.num_labels)]
+
+    def _logits(self, batch: Dict[str, torch.Tensor]) -> torch.Tensor:
+        """Run one padded batch and return its logits."""
+        batch = {key: value.to(self.device) for key, value in batch.items()}
+        return self.model(**batch).logits
+
+    @torch.no_grad()
+    def predict_proba(self, texts: Sequence[str]) -> torch.Tensor:
+        """Class probabilities for each text.
+
+        Args:
+            texts: Texts to classify
+
+        Returns:
+            Float32 CPU tensor of shape (len(texts), num_labels), in input order
+        """
+        probs = torch.empty(len(texts), len(self.labels))
+        if not texts:
+            return probs
+        encoded = self.tokenizer(
+            list(texts), truncation=True, max_length=self.max_length
+        )["input_ids"]
+        order = sorted(range(len(texts)), key=lambda i: len(encoded[i]))
+        for start in range(0, len(order), self.batch_size):
+            indices = order[start:start + self.batch_size]
+            batch = self.tokenizer.pad(
+                {"input_ids": [encoded[i] for i in indices]}, return_tensors="pt"
+            )
+            logits = self._logits(dict(batch))
+            probs[indices] = logits.float().softmax(dim=-1).cpu()
+        return probs
+
+    def predict(self, texts: Sequence[str]) -> List[Tuple[str, float]]:
+        """Top label and its probability for each text.
+
+        Args:
+            texts: Texts to classify
+
+        Returns:
+            (label, score) per text, in input order
+        """
+        scores, ids = self.predict_proba(texts).max(dim=-1)
+        return [(self.labels[i], score) for i, score in zip(ids.tolist(), scores.tolist())]
+
+
+SENTIMENT_BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+
+
+def load_classifier(
+    backend: str,
+    model_name: str,
+    device: torch.device,
+    cache_dir: Optional[str] = None,
+    batch_size: int = 64
+) -> FinbertClassifier:
+    """Load FinBERT on the selected inference backend.
+
+    Args:
+        backend: One of ``SENTIMENT_BACKENDS``; ``torch`` runs on ``device``,
+            the others run on CPU (``-int8`` adds dynamic quantization)
+        model_name: Hugging Face model id or local path
+        device: PyTorch device used by the ``torch`` backend
+        cache_dir: Model download and ONNX export cache
+        batch_size: Texts per forward pass
+
+    Returns:
+        Classifier exposing ``predict`` and ``predict_proba``
     """
-    id_val = row["id"]
-    symbol = row["symbol"]
-    symbol_name = row["name"]
-    generated_headline = row["generated_headline"]
-    prompt = [generated_headline]
-
-    generated = nlp(prompt, model, tokenizer, device)
-
-    return pd.Series({
-        "id": id_val,
-        "symbol": symbol,
-        "symbol_name": symbol_name,
-        "generated_headline": generated_headline,
-        "sentiment": generated,
-    })
+    if backend == "torch":
+        return FinbertClassifier(model_name, device, cache_dir, batch_size)
+    if backend == "torch-int8":
+        return FinbertClassifier(
+            model_name, torch.device("cpu"), cache_dir, batch_size, quantize=True
+        )
+    if backend in ("onnx", "onnx-int8"):
+        # onnxruntime is only needed by these backends
+        from finbert_onnx import OnnxFinbertClassifier
+        return OnnxFinbertClassifier(
+            model_name, cache_dir, batch_size, quantize=backend == "onnx-int8"
+        )
+    raise ValueError(f"Unknown sentiment backend '{backend}', expected one of {SENTIMENT_BACKENDS}")
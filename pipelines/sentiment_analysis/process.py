@@ -1,13 +1,17 @@
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
+
 import warnings
 import torch
-from transformers import BertTokenizer, BertForSequenceClassification, pipeline
-from finbert_utils import sentiment_analysis
+from finbert_utils import load_classifier, probability_column, sentiment_record
+from cascade import CascadeClassifier, LexiconScorer, FINBERT_SOURCE
 from tqdm import tqdm
-import pandas as pd
-import os
-import gc
-
-tqdm.pandas()
+from src.data import (
+    ResumeManifest, BufferedParquetWriter, ShardSpec, ROW_ID_COLUMN, iter_pending_chunks
+)
+from src.utils.memory import MemoryReleaser
+from src.utils.pipelining import PipelinedExecutor, Stage
 
 warnings.filterwarnings("ignore")
 
@@ -20,68 +24,140 @@ if is_sage_maker:
         for file in files:
             print(f"-> {file}")
     input_path = '/opt/ml/processing/input/generated_headline-to_finbert.csv'
-    output_path = '/opt/ml/processing/output/output_finbert.csv'
+    output_dir = '/opt/ml/processing/output/finbert'
     cache_dir = "/opt/ml/processing/cache"
     print("Running in SageMaker")
 
 else:
     input_path = 'input/generated_headline-to_finbert.csv'
-    output_path = 'output/output_finbert.csv'
+    output_dir = 'output/finbert'
     cache_dir = './cache'
     print("Running Local")
 
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 model_name = 'yiyanghkust/finbert-tone'
+# torch (GPU if available), torch-int8, onnx or onnx-int8 (CPU)
+sentiment_backend = os.environ.get("SENTIMENT_BACKEND", "torch")
+# Lexicon first pass: rows at or above this confidence skip FinBERT (empty = disabled)
+cascade_threshold = float(os.environ.get("SENTIMENT_CASCADE_THRESHOLD", "") or 0) or None
+# Parquet output columns; one prob_<label> column per FinBERT class is added after loading
+output_columns = {
+    ROW_ID_COLUMN: "int64",
+    "id": "int64",
+    "symbol": "string",
+    "symbol_name": "string",
+    "generated_headline": "string",
+    "label": "string",
+    "score": "double",
+    # finbert, or lexicon for rows the cascade labelled without FinBERT
+    "sentiment_source": "string",
+}
+# Output is committed as one Parquet part every FLUSH_ROWS rows or FLUSH_SECONDS seconds
+flush_rows = int(os.environ.get("FLUSH_ROWS", "4096"))
+flush_seconds = float(os.environ.get("FLUSH_SECONDS", "60"))
+# Rows are split across instances by SHARD_INDEX / NUM_SHARDS (or the SageMaker hosts)
+shard = ShardSpec.from_env()
+release_memory_every = int(os.environ.get("RELEASE_MEMORY_EVERY", "1000"))
+# Headlines per forward pass, rows per pipeline chunk and chunks in flight between stages
+batch_size = int(os.environ.get("BATCH_SIZE", "64"))
+chunk_size = int(os.environ.get("CHUNK_SIZE", "1024"))
+pipeline_queue_size = int(os.environ.get("PIPELINE_QUEUE_SIZE", "4"))
 
-if __name__ == "__main__":
-    tokenizer = BertTokenizer.from_pretrained(model_name, use_fast=False, cache_dir = cache_dir)
-    print("Tokenizer loaded")
-    model = BertForSequenceClassification.from_pretrained(model_name, cache_dir=cache_dir, torch_dtype=torch.float16).to(device)
-    print("Model loaded")
-    nlp = pipeline("text-classification", model=model_name, tokenizer = tokenizer)
 
-    # Main input dataframe
-    df = pd.read_csv(input_path)
+def classify_chunk(rows, classifier):
+    """Run FinBERT on a chunk of rows in batches; failing rows get null sentiment columns."""
+    sentiments = [{}] * len(rows)
+    valid = []
+    for i, row in enumerate(rows):
+        if isinstance(row.get("generated_headline"), str):
+            valid.append(i)
+        else:
+            print(f"Error at row {row.row_id}: missing generated_headline")
+    try:
+        texts = [rows[i]["generated_headline"] for i in valid]
+        if isinstance(classifier, CascadeClassifier):
+            probs, sources = classifier.predict_proba_with_sources(texts)
+        else:
+            probs, sources = classifier.predict_proba(texts), [FINBERT_SOURCE] * len(texts)
+        for i, row_probs, source in zip(valid, probs.tolist(), sources):
+            sentiments[i] = {**sentiment_record(row_probs, classifier.labels), "sentiment_source": source}
+    except Exception as e:
+        print(f"Error at rows {rows[0].row_id}-{rows[-1].row_id}: {e}")
+    results = [{
+        "id": row.get_int("id"),
+        "symbol": row.get("symbol"),
+        "symbol_name": row.get("name"),
+        "generated_headline": row.get("generated_headline"),
+        **sentiment,
+    } for row, sentiment in zip(rows, sentiments)]
+    return [row.row_id for row in rows], results
+
+
+def to_records(item):
+    """Serialize classified rows into (row ids, output records)."""
+    row_ids, results = item
+    records = [
+        {ROW_ID_COLUMN: row_id, **result}
+        for row_id, result in zip(row_ids, results)
+    ]
+    return row_ids, records
+
+if __name__ == "__main__":
+    classifier = load_classifier(
+        sentiment_backend, model_name, device, cache_dir=cache_dir, batch_size=batch_size
+    )
+    print(f"Model loaded ({sentiment_backend} backend)")
+    if cascade_threshold is not None:
+        classifier = CascadeClassifier(LexiconScorer(classifier.labels), classifier, cascade_threshold)
+        print(f"Cascade enabled, lexicon threshold {cascade_threshold}")
+    output_columns.update({probability_column(label): "double" for label in classifier.labels})
 
     head_rows = os.environ.get("NUM_ROWS", None)
     
-    # Look for processed rows in outup file
-    if os.path.exists(output_path):
-        processed_rows = sum(1 for _ in open(output_path)) -1
-    else:
-        processed_rows = 0
-    
+    # Shards write their own parts into one dataset directory, so no merge step is needed.
+    # Manifests start with "_" so query engines skip them.
+    part_prefix = f"part-{shard.index:05d}-of-{shard.count:05d}" if shard.is_sharded else "part"
+    manifest = ResumeManifest.load(os.path.join(output_dir, f"_{part_prefix}.manifest.json"))
 
     # Define which rows still need to be processed
-    header_written = os.path.exists(output_path)
-
     if head_rows =='ALL':
-        rows_to_process = df.iloc[processed_rows:]
+        row_limit = None
     elif head_rows is not None:
-        rows_to_process = df.iloc[processed_rows:int(head_rows)]
+        row_limit = int(head_rows)
     else:
          raise ValueError('NUM_ROWS must be defined as ALL or a number')
-           
+    # The input is streamed from the manifest's checkpoint, never loaded whole
+    chunks = iter_pending_chunks(input_path, manifest, chunk_size, shard, row_limit)
+
     # main loop
-    result_list = []
-    not is_sage_maker and os.makedirs('output', exist_ok=True) 
-    for _, row in tqdm(rows_to_process.iterrows(), total = len(rows_to_process), desc = "\n Finbert bar progress"):
-        try:
-            result = sentiment_analysis(row, model, tokenizer, device, nlp)
-        except Exception as e:
-            print(f"Error at row {row.name}: {e}")
-            result = pd.Series({
-            "id": row.get("id", ""),
-            "symbol": row.get("symbol", ""),
-            "symbol_name": row.get("name", ""),
-            "generated_headline": row.get("generated_headline", ""),
-            "sentiment" : "[ERROR]"
-            })
-        
-        result.to_frame().T.to_csv(output_path, index=False, mode='a', header=not header_written) 
-        header_written = True
-
-        torch.cuda.empty_cache()
-        gc.collect()
-    
+    writer = BufferedParquetWriter(
+        output_dir, output_columns, manifest,
+        flush_rows=flush_rows, flush_seconds=flush_seconds, prefix=part_prefix
+    )
+    releaser = MemoryReleaser(every_n_steps=release_memory_every)
+    progress = tqdm(desc="\n Finbert bar progress")
+
+    def write_chunk(item):
+        row_ids, records = item
+        writer.write_many(row_ids, records)
+        progress.update(len(row_ids))
+        releaser.step()
+
+    # classify (GPU or ONNX Runtime) → serialize (CPU) → write, overlapped across chunks
+    executor = PipelinedExecutor([
+        Stage("classify", lambda rows: classify_chunk(rows, classifier)),
+        Stage("serialize", to_records),
+    ], queue_size=pipeline_queue_size)
+    try:
+        executor.run(chunks, sink=write_chunk)
+    finally:
+        # Commit every chunk that made it through, even if a stage failed
+        writer.close()
+        progress.close()
+    if cascade_threshold is not None:
+        stats = classifier.stats
+        tqdm.write(
+            f"Cascade: {stats.first_stage_fraction:.1%} of {stats.total} rows scored by the lexicon, "
+            f"{stats.fallback_fraction:.1%} by FinBERT"
+        )
     tqdm.write("Output saved")
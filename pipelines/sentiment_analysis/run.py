@@ -13,7 +13,8 @@ from src.utils.sagemaker_utils import (
     create_sagemaker_session,
     generate_job_name,
     create_processor,
-    run_processing_job
+    run_processing_job,
+    stage_source_dir
 )
 
 
@@ -30,12 +31,16 @@ def main():
     processor = create_processor(
         image_uri=config.aws.ecr_image,
         role=config.aws.sagemaker_role,
-        instance_type=config.model.instance_type_inference,
-        instance_count=1,
+        instance_type=config.model.instance_type_sentiment,
+        instance_count=config.model.instance_count,
         volume_size_gb=50,
         job_name=job_name,
         sagemaker_session=session,
-        env_vars={'NUM_ROWS': config.model.num_rows}
+        env_vars={
+            'NUM_ROWS': config.model.num_rows,
+            'SENTIMENT_BACKEND': config.model.sentiment_backend,
+            'SENTIMENT_CASCADE_THRESHOLD': config.model.sentiment_cascade_threshold
+        }
     )
     
     # Define I/O
@@ -58,7 +63,8 @@ def main():
     run_processing_job(
         processor=processor,
         code_file="process.py",
-        source_dir="./files/code",
+        # The job imports the shared src package, so it ships with the pipeline
+        source_dir=stage_source_dir({".": "pipelines/sentiment_analysis", "src": "src"}),
         inputs=inputs,
         outputs=outputs,
         job_name=job_name
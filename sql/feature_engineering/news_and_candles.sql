@@ -8,8 +8,8 @@ dwh_int_news.id
 , dwh_int_news.name symbol_name
 , db_headline.headline 
 , db_headline.generated_headline
-, json_extract_scalar(replace(sentiment, '''', '"'), '$[0].label') label
-, json_extract_scalar(replace(sentiment, '''', '"'), '$[0].score') score
+, db_sentiment.label
+, db_sentiment.score
 , explanation
 , open
 , high
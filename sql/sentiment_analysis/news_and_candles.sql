@@ -38,8 +38,8 @@ news_processed.id
 , news_processed.name symbol_name
 , db_headline.headline 
 , db_headline.generated_headline
-, json_extract_scalar(replace(sentiment, '''', '"'), '$[0].label') label
-, json_extract_scalar(replace(sentiment, '''', '"'), '$[0].score') score
+, db_sentiment.label
+, db_sentiment.score
 , open
 , high
 , low
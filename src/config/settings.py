@@ -35,8 +35,12 @@ class ModelConfig:
     hf_token: str
     instance_type_training: str
     instance_type_inference: str
+    instance_type_sentiment: str
+    sentiment_backend: str
+    sentiment_cascade_threshold: str
     batch_size: int
     num_rows: str
+    instance_count: int
     
     @classmethod
     def from_env(cls) -> "ModelConfig":
@@ -44,8 +48,14 @@ class ModelConfig:
             hf_token=os.getenv("HF_API_TOKEN"),
             instance_type_training=os.getenv("INSTANCE_TYPE_TRAINING", "ml.g5.2xlarge"),
             instance_type_inference=os.getenv("INSTANCE_TYPE_INFERENCE", "ml.g4dn.xlarge"),
+            instance_type_sentiment=os.getenv(
+                "INSTANCE_TYPE_SENTIMENT", os.getenv("INSTANCE_TYPE_INFERENCE", "ml.g4dn.xlarge")
+            ),
+            sentiment_backend=os.getenv("SENTIMENT_BACKEND", "torch"),
+            sentiment_cascade_threshold=os.getenv("SENTIMENT_CASCADE_THRESHOLD", ""),
             batch_size=int(os.getenv("BATCH_SIZE", "16")),
-            num_rows=os.getenv("NUM_ROWS", "ALL")
+            num_rows=os.getenv("NUM_ROWS", "ALL"),
+            instance_count=int(os.getenv("INSTANCE_COUNT", "1"))
         )
 
 
@@ -1 +1,19 @@
 """Data processing and loading utilities."""
+
+from .manifest import ResumeManifest
+from .writer import BufferedCsvWriter, BufferedParquetWriter
+from .reader import InputRecord, iter_records, iter_pending_chunks
+from .sharding import ShardSpec, ROW_ID_COLUMN, merge_shard_outputs, shard_of
+
+__all__ = [
+    "ResumeManifest",
+    "BufferedCsvWriter",
+    "BufferedParquetWriter",
+    "InputRecord",
+    "iter_records",
+    "iter_pending_chunks",
+    "ShardSpec",
+    "ROW_ID_COLUMN",
+    "merge_shard_outputs",
+    "shard_of"
+]
@@ -0,0 +1,229 @@
+"""
+Resume manifests for row-by-row processing jobs.
+Tracks which input rows have been committed to an output file so
+interrupted jobs (e.g. spot interruptions) restart instantly and exactly.
+"""
+
+import bisect
+import csv
+import json
+import os
+import tempfile
+import threading
+from typing import Dict, Iterable, List, Optional
+
+
+class ResumeManifest:
+    """
+    Record of processed input rows and the committed size of the output.
+
+    Processed row ids are stored as sorted, disjoint ``[start, end)``
+    ranges, so the manifest stays small even when rows complete out of
+    order. The output offset is the byte size of the output file after
+    the last committed write; anything past it is a partial write.
+
+    The input checkpoint is the first row id not covered by the leading
+    processed range, together with its position in the input file, so a
+    restarted job can seek straight to it instead of re-reading the
+    input from the start. Positions are learned from :meth:`track`.
+
+    Attributes:
+        path: Location of the manifest JSON file
+        output_offset: Committed size of the output file in bytes
+        input_row: Row id every earlier row has been processed up to
+        input_offset: Input file position of ``input_row``
+    """
+
+    VERSION = 2
+
+    def __init__(self, path: str):
+        self.path = path
+        self.output_offset = 0
+        self.input_row = 0
+        self.input_offset = 0
+        self._starts: List[int] = []
+        self._ends: List[int] = []
+        # Input positions of rows read but not yet behind the checkpoint
+        self._offsets: Dict[int, int] = {}
+        # The input reader and the output writer update the manifest from different threads
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def path_for(output_path: str) -> str:
+        """Default manifest location for an output file."""
+        return f"{output_path}.manifest.json"
+
+    @classmethod
+    def load(cls, path: str) -> "ResumeManifest":
+        """
+        Load a manifest, or return an empty one if the file does not exist.
+
+        Args:
+            path: Location of the manifest JSON file
+
+        Returns:
+            Loaded manifest
+        """
+        manifest = cls(path)
+        if os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            manifest.output_offset = state["output_offset"]
+            manifest.input_row, manifest.input_offset = state.get("input", [0, 0])
+            for start, end in state["processed"]:
+                manifest._starts.append(start)
+                manifest._ends.append(end)
+        return manifest
+
+    @classmethod
+    def for_output(cls, output_path: str) -> "ResumeManifest":
+        """
+        Load the manifest of an output file and discard uncommitted output.
+
+        Outputs written before manifests existed are adopted once by
+        counting their CSV records, which were always written in input
+        order starting at row 0.
+
+        Args:
+            output_path: Output CSV the manifest describes
+
+        Returns:
+            Manifest consistent with the (possibly truncated) output file
+        """
+        path = cls.path_for(output_path)
+        if not os.path.exists(path) and os.path.exists(output_path):
+            manifest = cls.bootstrap_from_csv(path, output_path)
+            manifest.save()
+        else:
+            manifest = cls.load(path)
+        manifest.truncate_output(output_path)
+        return manifest
+
+    @classmethod
+    def bootstrap_from_csv(cls, path: str, output_path: str) -> "ResumeManifest":
+        """
+        Build a manifest from a legacy output CSV without one.
+
+        Args:
+            path: Location for the new manifest
+            output_path: Existing output CSV (header plus one record per row)
+
+        Returns:
+            Manifest marking rows ``0..n-1`` as processed
+        """
+        manifest = cls(path)
+        with open(output_path, newline='') as f:
+            num_records = sum(1 for _ in csv.reader(f)) - 1
+        if num_records > 0:
+            manifest.mark_processed(range(num_records), os.path.getsize(output_path))
+        return manifest
+
+    @property
+    def processed_count(self) -> int:
+        """Number of processed rows."""
+        with self._lock:
+            return sum(end - start for start, end in zip(self._starts, self._ends))
+
+    def is_processed(self, row_id: int) -> bool:
+        """Check whether a row id has been committed."""
+        with self._lock:
+            i = bisect.bisect_right(self._starts, row_id) - 1
+            return i >= 0 and row_id < self._ends[i]
+
+    def mark_processed(self, row_ids: Iterable[int], output_offset: Optional[int] = None) -> None:
+        """
+        Mark rows as committed after their output has been written.
+
+        Args:
+            row_ids: Input row ids whose results are in the output, or
+                that need no output (e.g. rows of another shard)
+            output_offset: Size of the output file after writing them;
+                None leaves it unchanged
+        """
+        with self._lock:
+            for row_id in sorted(int(r) for r in row_ids):
+                self._add(row_id)
+            if output_offset is not None:
+                self.output_offset = output_offset
+            self._advance_checkpoint()
+
+    def track(self, record) -> None:
+        """
+        Remember the input position of a row read by the job.
+
+        Args:
+            record: Input record with ``row_id``, ``offset`` and ``end_offset``
+        """
+        with self._lock:
+            self._offsets[record.row_id] = record.offset
+            self._offsets[record.row_id + 1] = record.end_offset
+            self._advance_checkpoint()
+
+    def _advance_checkpoint(self) -> None:
+        """Move the input checkpoint to the end of the leading processed range."""
+        if not self._starts or self._starts[0] != 0:
+            return
+        row = self._ends[0]
+        # The position is unknown until the reader has gone past the range
+        if row <= self.input_row or row not in self._offsets:
+            return
+        self.input_row, self.input_offset = row, self._offsets[row]
+        # Rows are tracked in input order, so the oldest entries come first
+        while self._offsets:
+            oldest = next(iter(self._offsets))
+            if oldest >= row:
+                break
+            del self._offsets[oldest]
+
+    def _add(self, row_id: int) -> None:
+        i = bisect.bisect_right(self._starts, row_id) - 1
+        if i >= 0 and row_id < self._ends[i]:
+            return
+        joins_left = i >= 0 and self._ends[i] == row_id
+        joins_right = i + 1 < len(self._starts) and self._starts[i + 1] == row_id + 1
+        if joins_left and joins_right:
+            self._ends[i] = self._ends[i + 1]
+            del self._starts[i + 1], self._ends[i + 1]
+        elif joins_left:
+            self._ends[i] = row_id + 1
+        elif joins_right:
+            self._starts[i + 1] = row_id
+        else:
+            self._starts.insert(i + 1, row_id)
+            self._ends.insert(i + 1, row_id + 1)
+
+    def truncate_output(self, output_path: str) -> None:
+        """
+        Drop bytes written after the last commit (e.g. a crash mid-write).
+
+        Args:
+            output_path: Output file described by this manifest
+        """
+        if not os.path.exists(output_path):
+            return
+        if os.path.getsize(output_path) > self.output_offset:
+            with open(output_path, "r+b") as f:
+                f.truncate(self.output_offset)
+
+    def save(self) -> None:
+        """Atomically write the manifest (temp file + fsync + rename)."""
+        with self._lock:
+            state = {
+                "version": self.VERSION,
+                "output_offset": self.output_offset,
+                "input": [self.input_row, self.input_offset],
+                "processed": [[s, e] for s, e in zip(self._starts, self._ends)],
+            }
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(state, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
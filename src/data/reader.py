@@ -0,0 +1,232 @@
+"""
+Streaming input readers for processing jobs.
+Reads CSV or Parquet inputs in chunks of lightweight records and can start
+at a resume position without parsing the rows before it.
+"""
+
+import csv
+import io
+import os
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence
+from .manifest import ResumeManifest
+from .sharding import ShardSpec
+
+PARQUET_EXTENSIONS = (".parquet", ".pq")
+
+
+class InputRecord(NamedTuple):
+    """
+    One input row.
+
+    Attributes:
+        row_id: Zero-based position of the row in the input
+        offset: Resume position of the row (byte offset for CSV, row for Parquet)
+        end_offset: Resume position of the row after it
+        data: Column name to value; empty CSV fields are None
+    """
+    row_id: int
+    offset: int
+    end_offset: int
+    data: Dict[str, Any]
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.data[key]
+        return tuple.__getitem__(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.data.get(key, default)
+
+    def get_int(self, key: str) -> Optional[int]:
+        """Column value as an int; None if missing or not a whole number (e.g. "abc", "1.5", nan)."""
+        value = self.data.get(key)
+        if value is None or isinstance(value, bool):
+            return None
+        if isinstance(value, int):
+            return value
+        if isinstance(value, str):
+            try:
+                return int(value)
+            except ValueError:
+                pass
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            return None
+        return int(number) if number.is_integer() else None
+
+
+def _csv_physical_records(f: io.BufferedReader) -> Iterator[bytes]:
+    """Split a binary CSV stream into records, keeping quoted newlines."""
+    pending = b""
+    for line in f:
+        pending += line
+        # A record ends at a newline outside quotes; "" escapes keep parity even
+        if pending.count(b'"') % 2 == 0:
+            yield pending
+            pending = b""
+    if pending:
+        yield pending
+
+
+def _parse_csv_record(raw: bytes) -> List[str]:
+    return next(csv.reader([raw.decode("utf-8")]), [])
+
+
+def iter_csv_records(
+    path: str,
+    start_row: int = 0,
+    start_offset: int = 0
+) -> Iterator[InputRecord]:
+    """
+    Stream records from a CSV file.
+
+    Args:
+        path: CSV file with a header row
+        start_row: Row id of the record at ``start_offset``
+        start_offset: Byte offset of a record boundary to start at;
+            0 starts right after the header
+
+    Yields:
+        Input records in file order
+    """
+    with open(path, "rb") as f:
+        records = _csv_physical_records(f)
+        header_raw = next(records, None)
+        if header_raw is None:
+            return
+        header = _parse_csv_record(header_raw)
+        offset = len(header_raw)
+
+        if start_offset > offset:
+            f.seek(start_offset)
+            records = _csv_physical_records(f)
+            offset = start_offset
+        else:
+            start_row = 0
+
+        row_id = start_row
+        for raw in records:
+            values = _parse_csv_record(raw)
+            if not values:
+                # Blank lines are not rows (as in pandas) and take no row id
+                offset += len(raw)
+                continue
+            data = {
+                name: (value if value != '' else None)
+                for name, value in zip(header, values)
+            }
+            yield InputRecord(row_id, offset, offset + len(raw), data)
+            offset += len(raw)
+            row_id += 1
+
+
+def iter_parquet_records(
+    path: str,
+    start_row: int = 0,
+    columns: Optional[Sequence[str]] = None,
+    batch_size: int = 8192
+) -> Iterator[InputRecord]:
+    """
+    Stream records from a Parquet file.
+
+    Row groups entirely before ``start_row`` are skipped using the file
+    metadata, without reading them.
+
+    Args:
+        path: Parquet file
+        start_row: Row id to start at
+        columns: Columns to read; None reads all
+        batch_size: Rows decoded per Arrow batch
+
+    Yields:
+        Input records in file order
+    """
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(path)
+    metadata = parquet_file.metadata
+    first_row = 0
+    row_groups = []
+    for i in range(metadata.num_row_groups):
+        num_rows = metadata.row_group(i).num_rows
+        if first_row + num_rows > start_row or row_groups:
+            row_groups.append(i)
+        else:
+            first_row += num_rows
+    if not row_groups:
+        return
+
+    row_id = first_row
+    for batch in parquet_file.iter_batches(
+        batch_size=batch_size, row_groups=row_groups, columns=columns
+    ):
+        for data in batch.to_pylist():
+            if row_id >= start_row:
+                yield InputRecord(row_id, row_id, row_id + 1, data)
+            row_id += 1
+
+
+def iter_records(
+    path: str,
+    start_row: int = 0,
+    start_offset: int = 0,
+    columns: Optional[Sequence[str]] = None
+) -> Iterator[InputRecord]:
+    """
+    Stream records from a CSV or Parquet file, chosen by extension.
+
+    Args:
+        path: Input file
+        start_row: Row id to start at
+        start_offset: Resume position of ``start_row`` (CSV byte offset)
+        columns: Columns to read (Parquet only)
+
+    Yields:
+        Input records in file order
+    """
+    if os.path.splitext(path)[1].lower() in PARQUET_EXTENSIONS:
+        return iter_parquet_records(path, start_row, columns)
+    return iter_csv_records(path, start_row, start_offset)
+
+
+def iter_pending_chunks(
+    path: str,
+    manifest: ResumeManifest,
+    chunk_size: int,
+    shard: Optional[ShardSpec] = None,
+    limit: Optional[int] = None
+) -> Iterator[List[InputRecord]]:
+    """
+    Stream the records a job still has to process, in chunks.
+
+    Reading starts at the manifest's input checkpoint. Rows owned by other
+    shards are marked as done in the manifest so the checkpoint can move
+    past them, and rows already committed (e.g. processed out of order
+    before a restart) are skipped.
+
+    Args:
+        path: CSV or Parquet input file
+        manifest: Resume manifest of this job's output
+        chunk_size: Records per yielded chunk
+        shard: Shard of this process; None processes every row
+        limit: Only consider rows with ``row_id < limit``
+
+    Yields:
+        Lists of at most ``chunk_size`` pending records
+    """
+    chunk: List[InputRecord] = []
+    records = iter_records(path, manifest.input_row, manifest.input_offset)
+    for record in records:
+        if limit is not None and record.row_id >= limit:
+            break
+        manifest.track(record)
+        if shard is not None and not shard.owns(record.row_id):
+            manifest.mark_processed([record.row_id])
+        elif not manifest.is_processed(record.row_id):
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,165 @@
+"""
+Deterministic sharding of processing jobs across instances.
+Each instance processes the rows whose id hashes to its shard and writes
+its own output and resume manifest; a merge step rebuilds the output a
+single-instance run would have produced.
+"""
+
+import csv
+import hashlib
+import heapq
+import json
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+
+SAGEMAKER_RESOURCE_CONFIG = "/opt/ml/config/resourceconfig.json"
+ROW_ID_COLUMN = "row_id"
+
+
+def shard_of(row_id: int, num_shards: int) -> int:
+    """
+    Map a row id to its shard with a stable hash.
+
+    Args:
+        row_id: Input row id
+        num_shards: Total number of shards
+
+    Returns:
+        Shard index in ``[0, num_shards)``
+    """
+    digest = hashlib.blake2b(str(int(row_id)).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % num_shards
+
+
+def shard_output_path(output_path: str, index: int, count: int) -> str:
+    """Output file of one shard, e.g. ``out.shard-00001-of-00004.csv``."""
+    root, ext = os.path.splitext(output_path)
+    return f"{root}.shard-{index:05d}-of-{count:05d}{ext}"
+
+
+@dataclass
+class ShardSpec:
+    """Shard assigned to the current process."""
+    index: int
+    count: int
+
+    @classmethod
+    def from_env(cls) -> "ShardSpec":
+        """
+        Resolve the shard from SHARD_INDEX / NUM_SHARDS.
+
+        Falls back to the SageMaker resource config of multi-instance
+        processing jobs (host position among all hosts), then to a single
+        shard.
+        """
+        if "NUM_SHARDS" in os.environ:
+            spec = cls(
+                index=int(os.environ.get("SHARD_INDEX", "0")),
+                count=int(os.environ["NUM_SHARDS"])
+            )
+        elif os.path.exists(SAGEMAKER_RESOURCE_CONFIG):
+            with open(SAGEMAKER_RESOURCE_CONFIG) as f:
+                resource = json.load(f)
+            hosts = sorted(resource["hosts"])
+            spec = cls(index=hosts.index(resource["current_host"]), count=len(hosts))
+        else:
+            spec = cls(index=0, count=1)
+
+        if not 0 <= spec.index < spec.count:
+            raise ValueError(f"SHARD_INDEX must be in [0, {spec.count}), got {spec.index}")
+        return spec
+
+    @property
+    def is_sharded(self) -> bool:
+        return self.count > 1
+
+    def owns(self, row_id: int) -> bool:
+        """Check whether a row belongs to this shard."""
+        return not self.is_sharded or shard_of(row_id, self.count) == self.index
+
+    def output_path(self, output_path: str) -> str:
+        """Output file of this shard (unchanged for single-shard runs)."""
+        if not self.is_sharded:
+            return output_path
+        return shard_output_path(output_path, self.index, self.count)
+
+
+def _read_shard(path: str) -> Iterator[Dict[str, str]]:
+    with open(path, newline='') as f:
+        yield from csv.DictReader(f)
+
+
+def merge_shard_outputs(
+    output_path: str,
+    num_shards: int,
+    shard_dir: Optional[str] = None
+) -> int:
+    """
+    Merge per-shard CSV outputs into the single-instance output file.
+
+    Rows are ordered by their ``row_id`` column, which is then dropped,
+    so the result matches an unsharded run. Shard files are merged
+    streaming when each is sorted by row id (the normal case) and sorted
+    in memory otherwise.
+
+    Args:
+        output_path: Combined output file to write
+        num_shards: Number of shards the job ran with
+        shard_dir: Directory holding the shard outputs; defaults to the
+            directory of ``output_path``
+
+    Returns:
+        Number of rows written
+
+    Raises:
+        FileNotFoundError: If a shard output is missing
+    """
+    shard_base = output_path
+    if shard_dir is not None:
+        shard_base = os.path.join(shard_dir, os.path.basename(output_path))
+    paths = [shard_output_path(shard_base, i, num_shards) for i in range(num_shards)]
+    missing = [p for p in paths if not os.path.exists(p)]
+    if missing:
+        raise FileNotFoundError(f"Missing shard outputs: {', '.join(missing)}")
+
+    with open(paths[0], newline='') as f:
+        header = next(csv.reader(f), None)
+    if header is None:
+        raise ValueError(f"Shard output {paths[0]} is empty")
+    columns = [c for c in header if c != ROW_ID_COLUMN]
+
+    def row_key(row: Dict[str, str]) -> int:
+        return int(row[ROW_ID_COLUMN])
+
+    def is_sorted(path: str) -> bool:
+        last = -1
+        for row in _read_shard(path):
+            if row_key(row) < last:
+                return False
+            last = row_key(row)
+        return True
+
+    if all(is_sorted(p) for p in paths):
+        rows = heapq.merge(*(_read_shard(p) for p in paths), key=row_key)
+    else:
+        merged: List[Dict[str, str]] = [row for p in paths for row in _read_shard(p)]
+        rows = iter(sorted(merged, key=row_key))
+
+    directory = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    count = 0
+    with os.fdopen(fd, "w", newline='') as f:
+        writer = csv.DictWriter(
+            f, fieldnames=columns, extrasaction="ignore", lineterminator="\n"
+        )
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, output_path)
+    return count
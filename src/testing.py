@@ -0,0 +1,134 @@
+"""
+Tiny offline stand-ins for the Mistral tokenizer and models.
+Used by tests and by the CPU benchmarks of the pipeline scripts, which run
+without Hub access or a GPU.
+"""
+
+from typing import Iterable, Tuple
+
+# Mistral-Instruct prompt format, for tokenizers built without one
+MISTRAL_CHAT_TEMPLATE = (
+    "{{ bos_token }}{% for message in messages %}"
+    "{% if message['role'] == 'user' %}{{ '[INST] ' + message['content'] + ' [/INST]' }}"
+    "{% elif message['role'] == 'assistant' %}{{ message['content'] + eos_token }}{% endif %}"
+    "{% endfor %}"
+)
+
+
+def build_tiny_tokenizer(corpus: Iterable[str], vocab_size: int = 512):
+    """
+    Byte-level BPE tokenizer trained on ``corpus``.
+
+    Like the Mistral tokenizer it prepends ``<s>``, uses ``</s>`` as end of
+    sequence and has the Mistral-Instruct chat template. Any text
+    round-trips through it, so it also works on text outside ``corpus``.
+
+    Args:
+        corpus: Texts the merges are learned from
+        vocab_size: Vocabulary size, including the 256 byte tokens
+
+    Returns:
+        ``PreTrainedTokenizerFast`` ready for :func:`build_tiny_model`
+    """
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers, processors, trainers
+    from transformers import PreTrainedTokenizerFast
+
+    tokenizer = Tokenizer(models.BPE())
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    tokenizer.train_from_iterator(corpus, trainers.BpeTrainer(
+        vocab_size=vocab_size,
+        special_tokens=["<unk>", "<s>", "</s>"],
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet(),
+        show_progress=False,
+    ))
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single="<s> $A", special_tokens=[("<s>", tokenizer.token_to_id("<s>"))]
+    )
+    return PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer,
+        bos_token="<s>",
+        eos_token="</s>",
+        unk_token="<unk>",
+        chat_template=MISTRAL_CHAT_TEMPLATE,
+        model_input_names=["input_ids", "attention_mask"],
+    )
+
+
+def _tiny_config(tokenizer, hidden_size: int, num_layers: int, max_position_embeddings: int):
+    from transformers import MistralConfig
+
+    return MistralConfig(
+        vocab_size=len(tokenizer),
+        hidden_size=hidden_size,
+        intermediate_size=hidden_size * 2,
+        num_hidden_layers=num_layers,
+        num_attention_heads=4,
+        num_key_value_heads=2,
+        max_position_embeddings=max_position_embeddings,
+    )
+
+
+def build_tiny_model(
+    tokenizer,
+    hidden_size: int = 128,
+    num_layers: int = 4,
+    seed: int = 0,
+    max_position_embeddings: int = 4096
+):
+    """
+    Random-weight Mistral model on CPU.
+
+    Args:
+        tokenizer: Tokenizer the model's vocabulary must match
+        hidden_size: Hidden size of the model
+        num_layers: Decoder layers
+        seed: Random seed for the weights
+        max_position_embeddings: Longest supported sequence
+
+    Returns:
+        ``MistralForCausalLM`` in eval mode
+    """
+    import torch
+    from transformers import MistralForCausalLM
+
+    torch.manual_seed(seed)
+    config = _tiny_config(tokenizer, hidden_size, num_layers, max_position_embeddings)
+    return MistralForCausalLM(config).eval()
+
+
+def build_tiny_model_pair(
+    tokenizer,
+    num_layers: int = 6,
+    num_draft_layers: int = 1,
+    hidden_size: int = 128,
+    seed: int = 0
+) -> Tuple:
+    """
+    Random-weight Mistral target and a layer-skipping draft model.
+
+    The draft reuses the target's embeddings, first ``num_draft_layers``
+    decoder layers, final norm and LM head, so it agrees with the target
+    often enough to exercise speculative decoding.
+
+    Args:
+        tokenizer: Tokenizer both models share
+        num_layers: Decoder layers of the target model
+        num_draft_layers: Decoder layers of the draft model
+        hidden_size: Hidden size of both models
+        seed: Random seed for the weights
+
+    Returns:
+        Tuple of (target model, draft model) in eval mode on CPU
+    """
+    from transformers import MistralForCausalLM
+
+    target = build_tiny_model(tokenizer, hidden_size, num_layers, seed, max_position_embeddings=2048)
+    draft_config = _tiny_config(tokenizer, hidden_size, num_draft_layers, 2048)
+    draft = MistralForCausalLM(draft_config).eval()
+    draft.model.embed_tokens.load_state_dict(target.model.embed_tokens.state_dict())
+    for i in range(num_draft_layers):
+        draft.model.layers[i].load_state_dict(target.model.layers[i].state_dict())
+    draft.model.norm.load_state_dict(target.model.norm.state_dict())
+    draft.lm_head.load_state_dict(target.lm_head.state_dict())
+    return target, draft
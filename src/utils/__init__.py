@@ -1,15 +1,29 @@
-"""Utility functions for AWS SageMaker operations."""
-
-from .sagemaker_utils import (
-    create_sagemaker_session,
-    generate_job_name,
-    create_processor,
-    run_processing_job
-)
-
-__all__ = [
-    "create_sagemaker_session",
-    "generate_job_name", 
-    "create_processor",
-    "run_processing_job"
-]
+"""Utility functions for AWS SageMaker operations and job runtime.
+
+Exports are resolved lazily: job scripts import ``src.utils.memory`` and
+``src.utils.pipelining`` on the instance, and importing this package must
+not pull in ``sagemaker``/``boto3`` through ``sagemaker_utils``.
+"""
+
+import importlib
+
+_EXPORTS = {
+    "create_sagemaker_session": "sagemaker_utils",
+    "generate_job_name": "sagemaker_utils",
+    "create_processor": "sagemaker_utils",
+    "run_processing_job": "sagemaker_utils",
+    "s3_prefix_exists": "sagemaker_utils",
+    "stage_source_dir": "sagemaker_utils",
+    "MemoryReleaser": "memory",
+    "PipelinedExecutor": "pipelining",
+    "PipelineError": "pipelining",
+    "Stage": "pipelining",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
@@ -0,0 +1,174 @@
+"""
+Threaded producer/consumer pipelines for processing jobs.
+Runs CPU stages (parsing, tokenization, decoding, serialization) in worker
+threads connected by bounded queues, so the GPU stage never waits on them.
+"""
+
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, List, Optional, Sequence
+
+# Marks the end of a stream inside a queue
+_DONE = object()
+# How often blocked threads check whether the pipeline is shutting down
+_POLL_SECONDS = 0.1
+
+
+@dataclass
+class Stage:
+    """
+    One step of a pipeline.
+
+    Attributes:
+        name: Stage name used in thread names and error messages
+        fn: Function applied to every item coming from the previous stage
+        workers: Number of threads running ``fn``; keep 1 for GPU stages
+            and for stages that must preserve item order
+    """
+    name: str
+    fn: Callable[[Any], Any]
+    workers: int = 1
+
+
+class PipelineError(RuntimeError):
+    """Raised when a pipeline stage fails; the original error is chained."""
+
+
+class PipelinedExecutor:
+    """
+    Run items from a source through stages into a sink, concurrently.
+
+    The source is read in its own thread, every stage runs in its own
+    worker threads and the sink runs in the calling thread. Queues
+    between them are bounded, so a slow stage applies backpressure
+    upstream instead of buffering the whole input. If any stage fails,
+    all threads stop and the error is re-raised from :meth:`run`.
+
+    With one worker per stage, items reach the sink in source order.
+
+    Example:
+        >>> executor = PipelinedExecutor([
+        ...     Stage("tokenize", tokenize),
+        ...     Stage("generate", generate),
+        ...     Stage("decode", decode, workers=2),
+        ... ], queue_size=4)
+        >>> executor.run(chunks, sink=writer.write_chunk)
+    """
+
+    def __init__(self, stages: Sequence[Stage], queue_size: int = 4):
+        """
+        Args:
+            stages: Pipeline steps, in order
+            queue_size: Capacity of each queue between steps
+        """
+        self.stages = list(stages)
+        self.queue_size = queue_size
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._error_lock = threading.Lock()
+
+    def _fail(self, stage_name: str, error: BaseException) -> None:
+        with self._error_lock:
+            if self._error is None:
+                self._error = PipelineError(f"Stage '{stage_name}' failed: {error}")
+                self._error.__cause__ = error
+        self._stop.set()
+
+    def _put(self, q: "queue.Queue", item: Any) -> bool:
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: "queue.Queue") -> Any:
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _read_source(self, source: Iterable, out_q: "queue.Queue") -> None:
+        try:
+            for item in source:
+                if not self._put(out_q, item):
+                    return
+        except BaseException as e:
+            self._fail("source", e)
+            return
+        self._put(out_q, _DONE)
+
+    def _run_stage(
+        self,
+        stage: Stage,
+        in_q: "queue.Queue",
+        out_q: "queue.Queue",
+        remaining: List[int],
+        lock: threading.Lock
+    ) -> None:
+        try:
+            while True:
+                item = self._get(in_q)
+                if item is _DONE:
+                    # Let sibling workers see the end of the stream too
+                    self._put(in_q, _DONE)
+                    break
+                if not self._put(out_q, stage.fn(item)):
+                    return
+        except BaseException as e:
+            self._fail(stage.name, e)
+            return
+        with lock:
+            remaining[0] -= 1
+            last_worker = remaining[0] == 0
+        if last_worker:
+            self._put(out_q, _DONE)
+
+    def run(self, source: Iterable, sink: Callable[[Any], None]) -> None:
+        """
+        Process every item of ``source`` and hand the results to ``sink``.
+
+        Args:
+            source: Iterable of input items, consumed in a background thread
+            sink: Function called in the calling thread for every output item
+
+        Raises:
+            PipelineError: If the source, a stage or the sink raised
+        """
+        self._stop.clear()
+        self._error = None
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        threads = [threading.Thread(
+            target=self._read_source, args=(source, queues[0]),
+            name="pipeline-source", daemon=True
+        )]
+        for i, stage in enumerate(self.stages):
+            remaining, lock = [stage.workers], threading.Lock()
+            for w in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=self._run_stage,
+                    args=(stage, queues[i], queues[i + 1], remaining, lock),
+                    name=f"pipeline-{stage.name}-{w}", daemon=True
+                ))
+
+        for thread in threads:
+            thread.start()
+        try:
+            while True:
+                item = self._get(queues[-1])
+                if item is _DONE:
+                    break
+                sink(item)
+        except Exception as e:
+            self._fail("sink", e)
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+
+        if self._error is not None:
+            raise self._error
@@ -3,6 +3,9 @@ Utilities for AWS SageMaker job management.
 Provides reusable functions for creating and running SageMaker jobs.
 """
 
+import os
+import shutil
+import tempfile
 import uuid
 import boto3
 from typing import Dict, List, Optional
@@ -11,6 +14,8 @@ from sagemaker.pytorch import PyTorchProcessor
 from sagemaker.processing import ProcessingInput, ProcessingOutput
 from sagemaker.network import NetworkConfig
 
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+
 
 def create_sagemaker_session(region: str) -> Session:
     """Create a SageMaker session."""
@@ -23,6 +28,50 @@ def generate_job_name(prefix: str) -> str:
     return f"{prefix}-{uuid.uuid4().hex[:8]}"
 
 
+def s3_prefix_exists(bucket: str, prefix: str, region: Optional[str] = None) -> bool:
+    """
+    Check whether any object exists under an S3 prefix.
+
+    Processing inputs must point at existing data, so optional inputs
+    (caches left by earlier runs) are only mapped when this is true.
+    """
+    s3 = boto3.client("s3", region_name=region)
+    return s3.list_objects_v2(Bucket=bucket, Prefix=prefix, MaxKeys=1).get("KeyCount", 0) > 0
+
+
+def stage_source_dir(entries: Dict[str, str], staging_dir: Optional[str] = None) -> str:
+    """
+    Assemble a job's code directory from repository files.
+
+    SageMaker only ships ``source_dir`` to the instance, so every module a
+    job script imports (its pipeline's modules and the shared ``src``
+    package) has to be copied into that one directory.
+
+    Args:
+        entries: Destination inside the code directory (``"."`` for its
+            root) to a file or directory, relative to the repository root
+        staging_dir: Directory to fill (a new temporary directory by default)
+
+    Returns:
+        Path of the code directory
+
+    Example:
+        >>> stage_source_dir({".": "pipelines/sentiment_analysis", "src": "src"})
+        '/tmp/job-code-x1y2z3'
+    """
+    staging_dir = staging_dir or tempfile.mkdtemp(prefix="job-code-")
+    ignore = shutil.ignore_patterns("__pycache__", "*.pyc")
+    for destination, source in entries.items():
+        source = os.path.join(REPO_ROOT, source)
+        target = os.path.normpath(os.path.join(staging_dir, destination))
+        if os.path.isdir(source):
+            shutil.copytree(source, target, ignore=ignore, dirs_exist_ok=True)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copy2(source, target)
+    return staging_dir
+
+
 def create_processor(
     image_uri: str,
     role: str,
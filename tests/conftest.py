@@ -0,0 +1,64 @@
+"""Shared helpers for the pipeline tests.
+
+Each pipeline directory is shipped as a job's ``source_dir`` and imports its
+siblings by bare module name, so tests put the directory under test on
+``sys.path`` the same way. Runs offline on CPU:
+
+    python -m pytest tests
+"""
+
+import os
+import sys
+import pytest
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+PIPELINES_DIR = os.path.join(REPO_ROOT, "pipelines")
+
+if REPO_ROOT not in sys.path:
+    sys.path.append(REPO_ROOT)
+
+
+def use_pipeline(name: str) -> None:
+    """Make ``pipelines/<name>`` the first place bare imports resolve.
+
+    Modules of the same name already imported from another pipeline
+    (e.g. ``heads``) are dropped so the next import picks this one up.
+
+    Args:
+        name: Pipeline directory name, e.g. ``"inference"``
+    """
+    path = os.path.join(PIPELINES_DIR, name)
+    local = {entry[:-3] for entry in os.listdir(path) if entry.endswith(".py")}
+    for module_name in local:
+        module = sys.modules.get(module_name)
+        if module is not None and os.path.dirname(getattr(module, "__file__", "") or "") != path:
+            del sys.modules[module_name]
+    if path in sys.path:
+        sys.path.remove(path)
+    sys.path.insert(0, path)
+
+
+def use_training_code() -> None:
+    """Let the training job's ``src.<module>`` imports resolve.
+
+    The training job ships ``pipelines/model_training`` as its ``src``
+    package, so its modules import each other as ``src.tokenization`` and
+    so on. The directory is appended to the repository ``src`` package's
+    search path; modules of the repository ``src`` take precedence.
+    """
+    import src
+
+    path = os.path.join(PIPELINES_DIR, "model_training")
+    if path not in src.__path__:
+        src.__path__.append(path)
+
+
+@pytest.fixture(scope="session")
+def tiny_predictor():
+    """Offline tokenizer and random-weight Mistral of the inference pipeline."""
+    use_pipeline("inference")
+    from schema import tokenizer_corpus
+    from src.testing import build_tiny_model, build_tiny_tokenizer
+
+    tokenizer = build_tiny_tokenizer(tokenizer_corpus())
+    return tokenizer, build_tiny_model(tokenizer, hidden_size=64)
@@ -0,0 +1,112 @@
+"""LRU adapter registry on a tiny random Mistral with LoRA adapters saved to disk."""
+
+import pytest
+import torch
+from peft import LoraConfig, get_peft_model
+from conftest import use_pipeline
+
+use_pipeline("inference")
+from adapters import AdapterRegistry, group_by_adapter  # noqa: E402
+from src.testing import build_tiny_model  # noqa: E402
+
+SYMBOLS = ["GLD", "IAU", "GDX"]
+PROMPT = "News: Gold prices surge as the dollar weakens"
+
+
+@pytest.fixture(scope="module")
+def adapter_dirs(tiny_predictor, tmp_path_factory):
+    """One randomly initialised LoRA adapter per symbol."""
+    tokenizer, _ = tiny_predictor
+    root = tmp_path_factory.mktemp("adapters")
+    dirs = {}
+    for seed, symbol in enumerate(SYMBOLS):
+        lora = LoraConfig(
+            r=4, lora_alpha=8, target_modules=["q_proj", "v_proj"],
+            task_type="CAUSAL_LM", init_lora_weights=False,
+        )
+        # The seed of the throwaway base model also drives the random LoRA init
+        model = get_peft_model(build_tiny_model(tokenizer, hidden_size=64, seed=seed), lora)
+        model.save_pretrained(str(root / symbol))
+        dirs[symbol] = str(root / symbol)
+    return dirs
+
+
+def make_registry(tiny_predictor, adapter_dirs, max_loaded):
+    # PeftModel wraps its base model in place, so each registry gets its own copy
+    tokenizer, _ = tiny_predictor
+    return AdapterRegistry(build_tiny_model(tokenizer, hidden_size=64), tokenizer, adapter_dirs, max_loaded)
+
+
+def last_logits(registry, name):
+    ids = registry.tokenizer(PROMPT, return_tensors="pt")["input_ids"]
+    with torch.no_grad():
+        return registry.activate(name)(input_ids=ids).logits[0, -1]
+
+
+def test_least_recently_used_adapter_is_evicted(tiny_predictor, adapter_dirs):
+    registry = make_registry(tiny_predictor, adapter_dirs, max_loaded=2)
+    registry.activate("GLD")
+    registry.activate("IAU")
+    registry.activate("GLD")
+    assert registry.loaded == ["IAU", "GLD"]
+
+    registry.activate("GDX")
+    assert registry.loaded == ["GLD", "GDX"]
+    assert registry.active == "GDX"
+    assert (registry.stats.loads, registry.stats.evictions, registry.stats.switches) == (3, 1, 4)
+
+    with pytest.raises(KeyError):
+        registry.activate("SLV")
+
+
+def test_reregistering_a_new_directory_reloads_the_adapter(tiny_predictor, adapter_dirs):
+    registry = make_registry(tiny_predictor, adapter_dirs, max_loaded=2)
+    iau = last_logits(registry, "IAU")
+    gld = last_logits(registry, "GLD")
+    assert not torch.allclose(gld, iau)
+
+    # The same directory again keeps the loaded weights
+    registry.register("GLD", adapter_dirs["GLD"])
+    assert registry.loaded == ["IAU", "GLD"]
+
+    registry.register("GLD", adapter_dirs["IAU"])
+    assert registry.loaded == ["IAU"]
+    assert registry.active is None
+    assert torch.allclose(last_logits(registry, "GLD"), iau, atol=1e-6)
+    assert registry.stats.loads == 3
+
+
+def test_group_by_adapter_puts_the_active_adapter_first():
+    names = ["GLD", "IAU", "GLD", "GDX", "IAU"]
+    assert group_by_adapter(names) == [("GLD", [0, 2]), ("IAU", [1, 4]), ("GDX", [3])]
+    assert group_by_adapter(names, active="GDX") == [("GDX", [3]), ("GLD", [0, 2]), ("IAU", [1, 4])]
+    # An active adapter that is not requested changes nothing
+    assert group_by_adapter(names, active="SLV") == group_by_adapter(names)
+
+
+def test_run_grouped_returns_results_in_request_order(tiny_predictor, adapter_dirs):
+    registry = make_registry(tiny_predictor, adapter_dirs, max_loaded=3)
+    registry.activate("IAU")
+    requests = [("GLD", 0), ("IAU", 1), ("GDX", 2), ("GLD", 3), ("IAU", 4)]
+    calls = []
+
+    def fn(model, payloads):
+        calls.append((registry.active, payloads))
+        return [(registry.active, payload) for payload in payloads]
+
+    assert registry.run_grouped(requests, fn) == requests
+    assert calls == [("IAU", [1, 4]), ("GLD", [0, 3]), ("GDX", [2])]
+    # One switch per adapter that was not already active
+    assert registry.stats.switches == 3
+    assert registry.stats.requests == len(requests)
+
+
+def test_evicted_adapter_reloads_to_identical_logits(tiny_predictor, adapter_dirs):
+    registry = make_registry(tiny_predictor, adapter_dirs, max_loaded=1)
+    first = {name: last_logits(registry, name) for name in SYMBOLS}
+    again = {name: last_logits(registry, name) for name in SYMBOLS}
+    assert registry.stats.evictions == 2 * len(SYMBOLS) - 1
+    assert registry.stats.loads == 2 * len(SYMBOLS)
+    for name in SYMBOLS:
+        assert torch.equal(first[name], again[name])
+    assert not torch.allclose(first["GLD"], first["IAU"])
@@ -0,0 +1,111 @@
+"""The batch prediction job (inference/process.py) end to end on CPU with the tiny predictor."""
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+import torch
+from conftest import use_pipeline
+
+use_pipeline("model_training")
+from benchmark_prompts import make_frame  # noqa: E402
+
+use_pipeline("inference")
+import process  # noqa: E402
+from schema import PREDICTION_FIELDS  # noqa: E402
+from src.data import ROW_ID_COLUMN, ShardSpec  # noqa: E402
+from src.utils.pipelining import PipelineError  # noqa: E402
+
+NUM_ROWS = 10
+CHUNK_SIZE = 3
+
+
+@pytest.fixture
+def job(tiny_predictor, tmp_path, monkeypatch):
+    """Point the job's settings at a small CSV; returns a function running it into a directory."""
+    df = make_frame(NUM_ROWS, seed=4)
+    df.insert(0, "id", range(100, 100 + NUM_ROWS))
+    df.to_csv(tmp_path / "input.csv", index=False)
+
+    settings = {
+        "input_path": str(tmp_path / "input.csv"),
+        "decoding_mode": "score",
+        "prompt_layout": "instructions_last",
+        "score_temperature": 1.0,
+        "device": torch.device("cpu"),
+        "shard": ShardSpec(index=0, count=1),
+        "batch_size": CHUNK_SIZE,
+        "chunk_size": CHUNK_SIZE,
+        # Every chunk is committed as soon as it is written
+        "flush_rows": 1,
+        "pipeline_queue_size": 1,
+    }
+    for name, value in settings.items():
+        monkeypatch.setattr(process, name, value)
+
+    def run(output_dir):
+        monkeypatch.setattr(process, "output_dir", str(output_dir))
+        tokenizer, model = tiny_predictor
+        return process.run_predictions(model, tokenizer, "ALL")
+
+    return run
+
+
+def read_output(output_dir):
+    return pq.read_table(str(output_dir)).to_pandas().sort_values(ROW_ID_COLUMN).reset_index(drop=True)
+
+
+def test_interrupted_run_resumes_to_the_same_output(job, tmp_path, monkeypatch):
+    rows_done, _, _ = job(tmp_path / "reference")
+    assert rows_done == NUM_ROWS
+    reference = read_output(tmp_path / "reference")
+
+    to_records, calls = process.to_records, []
+
+    def crash_on_third_chunk(item):
+        calls.append(len(item[0]))
+        if len(calls) == 3:
+            raise RuntimeError("instance preempted")
+        return to_records(item)
+
+    monkeypatch.setattr(process, "to_records", crash_on_third_chunk)
+    with pytest.raises(PipelineError):
+        job(tmp_path / "resumed")
+    committed = len(read_output(tmp_path / "resumed"))
+    assert committed <= 2 * CHUNK_SIZE
+
+    monkeypatch.setattr(process, "to_records", to_records)
+    rows_done, _, _ = job(tmp_path / "resumed")
+    assert rows_done == NUM_ROWS - committed
+
+    resumed = read_output(tmp_path / "resumed")
+    assert resumed[ROW_ID_COLUMN].tolist() == list(range(NUM_ROWS))
+    pd.testing.assert_frame_equal(resumed, reference)
+
+
+def test_predictions_are_typed_per_horizon_columns(job, tmp_path):
+    job(tmp_path / "out")
+    schema = pq.read_schema(next((tmp_path / "out").glob("part-*.parquet")))
+    assert schema.field(ROW_ID_COLUMN).type == pa.int64()
+    assert schema.field("id").type == pa.int64()
+    assert schema.field("valid").type == pa.bool_()
+    for key, _ in PREDICTION_FIELDS:
+        assert schema.field(key).type == pa.string()
+        assert schema.field(f"{key}_prob").type == pa.float64()
+
+    output = read_output(tmp_path / "out")
+    assert output["id"].tolist() == list(range(100, 100 + NUM_ROWS))
+    # Scoring only ever picks schema labels, each with its probability
+    assert output["valid"].all() and output["raw_prediction"].isna().all()
+    for key, labels in PREDICTION_FIELDS:
+        assert output[key].isin(labels).all()
+        assert output[f"{key}_prob"].between(0, 1).all()
+
+
+def test_throughput_report(job, tmp_path):
+    rows_done, elapsed, stats = job(tmp_path / "out")
+    assert stats.predictions == NUM_ROWS and stats.scored > 0
+    report = process.throughput_report(rows_done, elapsed, stats)
+    assert report.startswith(f"Throughput: {NUM_ROWS} rows in ")
+    assert "prompt tokens/s" in report and "scored tokens/s" in report
+    assert f"{stats.calls_per_prediction:.1f} forward passes per prediction" in report
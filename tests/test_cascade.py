@@ -0,0 +1,88 @@
+"""Lexicon cascade routing and the sentiment_source output column."""
+
+import pytest
+import torch
+from conftest import use_pipeline
+
+use_pipeline("sentiment_analysis")
+from cascade import (  # noqa: E402
+    CascadeClassifier, LexiconScorer, FINBERT_SOURCE, LEXICON_SOURCE
+)
+import process  # noqa: E402
+from src.data import InputRecord  # noqa: E402
+
+LABELS = ["Neutral", "Positive", "Negative"]
+
+
+class FakeFinbert:
+    """Stands in for FinbertClassifier: every text is confidently Neutral."""
+
+    labels = LABELS
+
+    def __init__(self):
+        self.seen = []
+
+    def predict_proba(self, texts):
+        self.seen.extend(texts)
+        return torch.tensor([[0.9, 0.05, 0.05]] * len(texts))
+
+
+@pytest.fixture
+def lexicon():
+    return LexiconScorer(LABELS)
+
+
+def test_polarity_counts(lexicon):
+    assert lexicon.polarity_counts("Gold prices surge, rally to record high") == (3, 0)
+    assert lexicon.polarity_counts("Miners slump as bullion tumbles") == (0, 2)
+    assert lexicon.polarity_counts("Gold did not rise") == (0, 1)
+
+
+@pytest.mark.parametrize("text", [
+    "War fears send investors to gold",
+    "Concern over inflation grows",
+    "Rates stay low, inflation high",
+])
+def test_ambiguous_terms_carry_no_polarity(lexicon, text):
+    assert lexicon.polarity_counts(text) == (0, 0)
+
+
+def test_despite_does_not_negate(lexicon):
+    assert lexicon.polarity_counts("Gold rises despite strong dollar") == (2, 0)
+
+
+def test_cascade_reports_source_per_row(lexicon):
+    fallback = FakeFinbert()
+    cascade = CascadeClassifier(lexicon, fallback, threshold=0.6)
+    texts = ["Gold prices surge, rally and soar", "Gold steady ahead of CPI data"]
+    probs, sources = cascade.predict_proba_with_sources(texts)
+    assert sources == [LEXICON_SOURCE, FINBERT_SOURCE]
+    assert fallback.seen == texts[1:]
+    assert LABELS[int(probs[0].argmax())] == "Positive"
+    assert cascade.stats.first_stage == cascade.stats.fallback == 1
+
+
+def test_classify_chunk_writes_sentiment_source(lexicon):
+    rows = [
+        InputRecord(0, 0, 1, {"id": "7", "symbol": "GLD", "generated_headline": "Gold surges, rallies and soars"}),
+        InputRecord(1, 1, 2, {"id": "8", "symbol": "GLD", "generated_headline": "Gold steady"}),
+        InputRecord(2, 2, 3, {"id": "9", "symbol": "GLD", "generated_headline": None}),
+    ]
+    cascade = CascadeClassifier(lexicon, FakeFinbert(), threshold=0.6)
+    _, results = process.classify_chunk(rows, cascade)
+    assert [r.get("sentiment_source") for r in results] == [LEXICON_SOURCE, FINBERT_SOURCE, None]
+
+    _, results = process.classify_chunk(rows[:2], FakeFinbert())
+    assert [r["sentiment_source"] for r in results] == [FINBERT_SOURCE] * 2
+    assert set(results[0]) <= set(process.output_columns) | {"prob_neutral", "prob_positive", "prob_negative"}
+
+
+def test_classify_chunk_keeps_rows_with_malformed_ids():
+    rows = [
+        InputRecord(0, 0, 1, {"id": "12.0", "symbol": "GLD", "generated_headline": "Gold steady"}),
+        InputRecord(1, 1, 2, {"id": "n/a", "symbol": "GLD", "generated_headline": "Gold steady"}),
+        InputRecord(2, 2, 3, {"symbol": "GLD", "generated_headline": "Gold steady"}),
+    ]
+    _, results = process.classify_chunk(rows, FakeFinbert())
+    assert [r["id"] for r in results] == [12, None, None]
+    assert [r["label"] for r in results] == ["Neutral"] * 3
@@ -0,0 +1,77 @@
+"""Schema-constrained decoding: valid answers, same choices as uncached decoding."""
+
+import json
+import pytest
+import torch
+from conftest import use_pipeline
+
+use_pipeline("inference")
+from constrained import DecodingStats, constrained_generate, prediction_trie  # noqa: E402
+from schema import PREDICTION_FIELDS, is_valid_prediction, prediction_index  # noqa: E402
+from utils import generate_json_response  # noqa: E402
+
+PROMPTS = [
+    "News: Gold prices surge as the dollar weakens\nSentiment: Positive (0.95)",
+    "News: Miners slip after hawkish Fed remarks\nSentiment: Negative (0.81)",
+    "News: Gold steady ahead of CPI data\nSentiment: Neutral (0.64)",
+]
+
+
+def prompt_ids(tokenizer, prompt):
+    text = tokenizer.apply_chat_template(
+        [{"role": "user", "content": prompt}], tokenize=False, add_generation_prompt=True
+    )
+    return tokenizer(text)["input_ids"]
+
+
+@torch.no_grad()
+def uncached_walk(input_ids, model, trie):
+    """Reference decode: full forward pass over the whole sequence at every branch."""
+    sequence, node = list(input_ids), trie.root
+    while True:
+        sequence.extend(node.tokens)
+        if node.answer is not None:
+            return node.answer
+        logits = model(input_ids=torch.tensor([sequence])).logits[0, -1]
+        allowed = list(node.children)
+        token = allowed[int(logits[allowed].argmax())]
+        sequence.append(token)
+        node = node.children[token]
+
+
+def test_trie_covers_every_answer(tiny_predictor):
+    tokenizer, _ = tiny_predictor
+    trie = prediction_trie(tokenizer)
+    assert len(trie.answers) == len(trie.sequences) == 12 ** 4
+    assert all(sequence[-1] == tokenizer.eos_token_id for sequence in trie.sequences)
+    text = tokenizer.decode(trie.sequences[0], skip_special_tokens=True)
+    assert json.loads(text) == trie.answers[0]
+
+
+@pytest.mark.parametrize("prompt", PROMPTS)
+def test_constrained_matches_uncached_decode(tiny_predictor, prompt):
+    tokenizer, model = tiny_predictor
+    trie = prediction_trie(tokenizer)
+    ids = prompt_ids(tokenizer, prompt)
+    stats = DecodingStats()
+    generated, prediction = constrained_generate(ids, model, trie, stats)
+
+    answer = uncached_walk(ids, model, trie)
+    assert prediction == trie.answers[answer]
+    values = [prediction[key] for key, _ in PREDICTION_FIELDS]
+    assert generated == trie.sequences[prediction_index(values)]
+    # One forward pass per branch point, every other token forced
+    assert stats.model_calls == stats.chosen
+    assert stats.tokens == len(generated)
+    assert stats.model_calls < len(generated)
+
+
+def test_generate_json_response_constrained_always_parses(tiny_predictor):
+    tokenizer, model = tiny_predictor
+    stats = DecodingStats()
+    for prompt in PROMPTS:
+        prediction = generate_json_response(
+            prompt, model, tokenizer, torch.device("cpu"), constrained=True, stats=stats
+        )
+        assert is_valid_prediction(prediction)
+    assert stats.predictions == len(PROMPTS)
@@ -0,0 +1,91 @@
+"""Snapshot publishing and input checks of the merged-model export."""
+
+import os
+import pytest
+import yaml
+from conftest import use_pipeline
+
+use_pipeline("inference")
+import export  # noqa: E402
+from export import export_merged_model, publish_snapshot  # noqa: E402
+from inference import TRAINING_CONFIG_FILE  # noqa: E402
+
+
+def write_snapshot(path, content):
+    os.makedirs(path)
+    with open(os.path.join(path, "model.safetensors"), "w") as f:
+        f.write(content)
+
+
+def read_snapshot(path):
+    with open(os.path.join(path, "model.safetensors")) as f:
+        return f.read()
+
+
+def test_publish_into_a_new_path(tmp_path):
+    write_snapshot(tmp_path / "merged.tmp", "new")
+    version = publish_snapshot(str(tmp_path / "merged.tmp"), str(tmp_path / "merged"))
+    assert os.path.islink(tmp_path / "merged")
+    assert os.readlink(tmp_path / "merged") == os.path.basename(version)
+    assert read_snapshot(tmp_path / "merged") == "new"
+    assert sorted(os.listdir(tmp_path)) == ["merged", os.path.basename(version)]
+
+
+def test_publish_keeps_only_the_previous_version(tmp_path):
+    link = str(tmp_path / "merged")
+    versions = []
+    for content in ("v1", "v2", "v3"):
+        write_snapshot(tmp_path / "merged.tmp", content)
+        versions.append(os.path.basename(publish_snapshot(str(tmp_path / "merged.tmp"), link)))
+        assert read_snapshot(link) == content
+    assert sorted(os.listdir(tmp_path)) == sorted(["merged"] + versions[1:])
+
+
+def test_publish_never_leaves_the_path_missing(tmp_path, monkeypatch):
+    link = str(tmp_path / "merged")
+    write_snapshot(tmp_path / "merged.tmp", "old")
+    publish_snapshot(str(tmp_path / "merged.tmp"), link)
+
+    # Every filesystem change of the swap is checked: readers must always find a snapshot
+    seen = []
+    for name in ("replace", "symlink", "remove"):
+        original = getattr(os, name)
+
+        def checked(*args, original=original):
+            original(*args)
+            seen.append(read_snapshot(link))
+
+        monkeypatch.setattr(export.os, name, checked)
+    write_snapshot(tmp_path / "merged.tmp", "new")
+    publish_snapshot(str(tmp_path / "merged.tmp"), link)
+    assert seen[0] == "old" and seen[-1] == "new"
+
+
+def test_publish_over_a_legacy_directory(tmp_path):
+    write_snapshot(tmp_path / "merged", "old")
+    write_snapshot(tmp_path / "merged.tmp", "new")
+    publish_snapshot(str(tmp_path / "merged.tmp"), str(tmp_path / "merged"))
+    assert read_snapshot(tmp_path / "merged") == "new"
+    legacy = [name for name in os.listdir(tmp_path) if name.startswith("merged.legacy-")]
+    assert len(legacy) == 1 and read_snapshot(tmp_path / legacy[0]) == "old"
+
+
+def test_failed_publish_restores_the_legacy_directory(tmp_path, monkeypatch):
+    write_snapshot(tmp_path / "merged", "old")
+    write_snapshot(tmp_path / "merged.tmp", "new")
+
+    def fail(*args):
+        raise OSError("no symlinks here")
+
+    monkeypatch.setattr(export.os, "symlink", fail)
+    with pytest.raises(OSError):
+        publish_snapshot(str(tmp_path / "merged.tmp"), str(tmp_path / "merged"))
+    assert not os.path.islink(tmp_path / "merged")
+    assert read_snapshot(tmp_path / "merged") == "old"
+
+
+def test_heads_adapters_are_not_exported(tmp_path):
+    (tmp_path / TRAINING_CONFIG_FILE).write_text(yaml.safe_dump({"model": {"variant": "heads"}}))
+    with pytest.raises(ValueError, match="heads"):
+        export_merged_model("unused/base-model", str(tmp_path), str(tmp_path / "merged"))
+    assert os.listdir(tmp_path) == [TRAINING_CONFIG_FILE]
@@ -0,0 +1,86 @@
+"""ONNX Runtime FinBERT backends against the PyTorch classifier, on a tiny BERT."""
+
+import os
+import pytest
+import torch
+from conftest import use_pipeline
+
+pytest.importorskip("onnxruntime")
+use_pipeline("sentiment_analysis")
+from finbert_onnx import OnnxFinbertClassifier, parity_report  # noqa: E402
+from finbert_utils import FinbertClassifier, load_classifier  # noqa: E402
+
+LABELS = ["Neutral", "Positive", "Negative"]
+WORDS = "gold prices surge as the dollar weakens miners slump after fed remarks steady".split()
+TEXTS = [
+    "Gold prices surge",
+    "Miners slump after Fed remarks as the dollar weakens",
+    "Gold steady",
+    "Prices surge as miners slump",
+    "The dollar weakens after gold prices surge as Fed remarks steady miners",
+]
+
+
+@pytest.fixture(scope="module")
+def tiny_finbert(tmp_path_factory):
+    """Random-weight BERT classifier with a word-level vocabulary, saved like a Hub model."""
+    from transformers import BertConfig, BertForSequenceClassification, BertTokenizerFast
+
+    directory = tmp_path_factory.mktemp("finbert")
+    vocab_file = directory / "vocab.txt"
+    vocab_file.write_text("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + WORDS) + "\n")
+    BertTokenizerFast(str(vocab_file)).save_pretrained(str(directory))
+
+    torch.manual_seed(0)
+    config = BertConfig(
+        vocab_size=5 + len(WORDS),
+        hidden_size=32,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        intermediate_size=64,
+        max_position_embeddings=64,
+        num_labels=len(LABELS),
+        id2label=dict(enumerate(LABELS)),
+        label2id={label: i for i, label in enumerate(LABELS)},
+    )
+    BertForSequenceClassification(config).eval().save_pretrained(str(directory))
+    return str(directory)
+
+
+@pytest.fixture(scope="module")
+def reference(tiny_finbert):
+    return FinbertClassifier(tiny_finbert, torch.device("cpu"), batch_size=2)
+
+
+def test_onnx_matches_torch(tiny_finbert, reference, tmp_path):
+    candidate = OnnxFinbertClassifier(tiny_finbert, batch_size=2, export_dir=str(tmp_path))
+    # Exported with token_type_ids, which the padded batches do not carry
+    assert "token_type_ids" in candidate._input_names
+    assert candidate.labels == reference.labels == LABELS
+
+    expected = reference.predict_proba(TEXTS)
+    assert torch.allclose(candidate.predict_proba(TEXTS), expected, atol=1e-5)
+    assert candidate.predict(TEXTS) == pytest.approx(reference.predict(TEXTS), abs=1e-5)
+
+
+def test_int8_stays_close_and_reports_parity(tiny_finbert, reference, tmp_path):
+    candidate = load_classifier("onnx-int8", tiny_finbert, torch.device("cpu"), str(tmp_path), 2)
+    assert candidate.model_path.endswith("model.int8.onnx")
+
+    report = parity_report(reference, candidate, TEXTS)
+    assert report["texts"] == len(TEXTS)
+    assert report["max_score_delta"] < 0.05
+    assert report["mean_score_delta"] <= report["max_score_delta"]
+    assert 0.0 <= report["label_agreement"] <= 1.0
+    assert report["reference_texts_per_second"] > 0 and report["candidate_texts_per_second"] > 0
+
+    # The float export is kept next to the quantized model for later runs
+    export_dir = os.path.dirname(candidate.model_path)
+    assert sorted(os.listdir(export_dir)) == ["model.int8.onnx", "model.onnx"]
+
+
+def test_parity_report_of_identical_backends(tiny_finbert, reference, tmp_path):
+    candidate = OnnxFinbertClassifier(tiny_finbert, batch_size=3, export_dir=str(tmp_path))
+    report = parity_report(reference, candidate, TEXTS)
+    assert report["label_agreement"] == 1.0
+    assert report["max_score_delta"] < 1e-5
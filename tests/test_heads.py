@@ -0,0 +1,71 @@
+"""Classification-heads inference and the batch job's training-config checks."""
+
+import pytest
+import torch
+import yaml
+from conftest import use_pipeline
+
+use_pipeline("inference")
+from heads import ClassificationHeads, predict_with_heads  # noqa: E402
+from inference import TRAINING_CONFIG_FILE  # noqa: E402
+from schema import PREDICTION_FIELDS, is_valid_prediction, tokenizer_corpus  # noqa: E402
+import process  # noqa: E402
+from src.testing import build_tiny_tokenizer  # noqa: E402
+
+PROMPTS = [
+    "News: Gold prices surge as the dollar weakens\nSentiment: Positive (0.95)",
+    "News: Miners slip\nSentiment: Negative (0.81)",
+    "News: Gold steady ahead of CPI data, traders await the Fed\nSentiment: Neutral (0.64)",
+]
+
+
+@pytest.fixture(scope="module")
+def heads_model(tiny_predictor):
+    _, model = tiny_predictor
+    tokenizer = build_tiny_tokenizer(tokenizer_corpus())
+    tokenizer.pad_token = tokenizer.eos_token
+    torch.manual_seed(0)
+    heads = ClassificationHeads(PREDICTION_FIELDS, model.config.hidden_size).eval()
+    return model.model, heads, tokenizer
+
+
+def test_batched_heads_match_single_prompts(heads_model):
+    backbone, heads, tokenizer = heads_model
+    batched = predict_with_heads(PROMPTS, backbone, heads, tokenizer, batch_size=2)
+    for prompt, prediction in zip(PROMPTS, batched):
+        single = predict_with_heads([prompt], backbone, heads, tokenizer)[0]
+        assert is_valid_prediction(prediction)
+        assert {k: v for k, v in prediction.items() if k != "probabilities"} == \
+            {k: v for k, v in single.items() if k != "probabilities"}
+        for key, _ in PREDICTION_FIELDS:
+            for label, p in single["probabilities"][key].items():
+                assert prediction["probabilities"][key][label] == pytest.approx(p, abs=1e-5)
+            assert sum(prediction["probabilities"][key].values()) == pytest.approx(1.0)
+
+
+def save_training_config(path, variant, layout):
+    with open(path / TRAINING_CONFIG_FILE, "w") as f:
+        yaml.safe_dump({"model": {"variant": variant}, "tokenization": {"prompt_layout": layout}}, f)
+
+
+def test_layout_comes_from_the_training_config(tmp_path, monkeypatch):
+    monkeypatch.setattr(process, "prompt_layout", None)
+    assert process.check_training_config(str(tmp_path)) == "instructions_last"
+    save_training_config(tmp_path, "causal_lm", "instructions_first")
+    assert process.check_training_config(str(tmp_path)) == "instructions_first"
+
+
+def test_mismatches_are_rejected(tmp_path, monkeypatch):
+    save_training_config(tmp_path, "heads", "instructions_first")
+    monkeypatch.setattr(process, "decoding_mode", "free")
+    with pytest.raises(ValueError, match="DECODING_MODE=heads"):
+        process.check_training_config(str(tmp_path))
+
+    monkeypatch.setattr(process, "decoding_mode", "heads")
+    monkeypatch.setattr(process, "prompt_layout", "instructions_last")
+    with pytest.raises(ValueError, match="PROMPT_LAYOUT"):
+        process.check_training_config(str(tmp_path))
+
+    save_training_config(tmp_path, "causal_lm", "instructions_last")
+    with pytest.raises(ValueError, match="heads model"):
+        process.check_training_config(str(tmp_path))
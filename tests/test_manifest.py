@@ -0,0 +1,108 @@
+"""Resume manifests: processed ranges, atomic saves and restarts."""
+
+import json
+import os
+import pytest
+from src.data import InputRecord, ResumeManifest, iter_pending_chunks
+
+
+def saved_state(manifest):
+    manifest.save()
+    with open(manifest.path) as f:
+        return json.load(f)
+
+
+def write_csv(path, num_rows):
+    with open(path, "w", newline="") as f:
+        f.write("id,text\n")
+        for i in range(num_rows):
+            f.write(f"{i},row {i}\n")
+
+
+def test_out_of_order_rows_merge_into_ranges(tmp_path):
+    manifest = ResumeManifest(str(tmp_path / "m.json"))
+    manifest.mark_processed([5, 3, 9])
+    assert saved_state(manifest)["processed"] == [[3, 4], [5, 6], [9, 10]]
+
+    manifest.mark_processed([4, 8])  # joins both neighbours, then extends one to the left
+    assert saved_state(manifest)["processed"] == [[3, 6], [8, 10]]
+
+    manifest.mark_processed([3, 8, 0, 1, 2])  # duplicates are no-ops
+    assert saved_state(manifest)["processed"] == [[0, 6], [8, 10]]
+    assert manifest.processed_count == 8
+    assert [r for r in range(11) if manifest.is_processed(r)] == [0, 1, 2, 3, 4, 5, 8, 9]
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "out" / "m.json")
+    manifest = ResumeManifest(path)
+    manifest.mark_processed([0, 1, 4], output_offset=123)
+    manifest.save()
+
+    loaded = ResumeManifest.load(path)
+    assert loaded.output_offset == 123
+    assert loaded.processed_count == 3
+    assert loaded.is_processed(4) and not loaded.is_processed(2)
+    assert ResumeManifest.load(str(tmp_path / "missing.json")).processed_count == 0
+
+
+def test_failed_save_keeps_the_previous_manifest(tmp_path, monkeypatch):
+    path = tmp_path / "m.json"
+    manifest = ResumeManifest(str(path))
+    manifest.mark_processed([0])
+    manifest.save()
+    before = path.read_text()
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    manifest.mark_processed([1])
+    monkeypatch.setattr(json, "dump", fail)
+    with pytest.raises(OSError):
+        manifest.save()
+    assert path.read_text() == before
+    assert os.listdir(tmp_path) == ["m.json"]
+
+
+def test_restart_truncates_uncommitted_output(tmp_path):
+    output = tmp_path / "out.csv"
+    output.write_text("a\n1\n2\n")
+    manifest = ResumeManifest.for_output(str(output))  # adopts the legacy output
+    assert manifest.processed_count == 2
+    committed = manifest.output_offset
+
+    with open(output, "a") as f:
+        f.write("3,partial")  # crash mid-write, never committed
+    restarted = ResumeManifest.for_output(str(output))
+    assert os.path.getsize(output) == committed
+    assert restarted.processed_count == 2
+
+
+def test_resume_skips_committed_rows_and_seeks_past_the_checkpoint(tmp_path):
+    input_path = str(tmp_path / "in.csv")
+    write_csv(input_path, 10)
+    manifest = ResumeManifest(str(tmp_path / "m.json"))
+
+    # First run: rows 0-3 plus 6 (out of order) are committed before a crash
+    chunks = iter_pending_chunks(input_path, manifest, chunk_size=4)
+    first = next(chunks)
+    manifest.mark_processed([r.row_id for r in first])
+    next(chunks)
+    manifest.mark_processed([6])
+    manifest.save()
+    assert saved_state(manifest)["input"][0] == 4
+
+    restarted = ResumeManifest.load(manifest.path)
+    pending = [r for chunk in iter_pending_chunks(input_path, restarted, chunk_size=4) for r in chunk]
+    assert [r.row_id for r in pending] == [4, 5, 7, 8, 9]
+    assert [r["text"] for r in pending] == [f"row {i}" for i in (4, 5, 7, 8, 9)]
+
+
+def test_checkpoint_waits_for_the_reader(tmp_path):
+    manifest = ResumeManifest(str(tmp_path / "m.json"))
+    manifest.mark_processed([0, 1])
+    # The input position of row 2 is unknown until the reader has passed row 1
+    assert (manifest.input_row, manifest.input_offset) == (0, 0)
+    manifest.track(InputRecord(0, 10, 20, {}))
+    manifest.track(InputRecord(1, 20, 30, {}))
+    assert (manifest.input_row, manifest.input_offset) == (2, 30)
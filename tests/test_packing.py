@@ -0,0 +1,104 @@
+"""Packed rows must train exactly like the examples they contain, on a tiny Mistral."""
+
+import pytest
+import torch
+from datasets import Dataset
+from conftest import use_training_code
+
+use_training_code()
+from src.packing import CausalLMCollator, pack_dataset, pack_lengths  # noqa: E402
+from src.testing import build_tiny_model, build_tiny_tokenizer  # noqa: E402
+from src.tokenization import IGNORE_INDEX, tokenize_example  # noqa: E402
+
+EXAMPLES = [
+    ("News: Gold prices surge as the dollar weakens", '{"direction_1d":"Up"}'),
+    ("News: Miners slip", '{"direction_1d":"Down"}'),
+    ("News: Gold steady ahead of CPI data, traders await the Fed", '{"direction_1d":"Neutral"}'),
+    ("News: Central banks extend record gold purchases", '{"direction_1d":"Up"}'),
+    ("News: Silver slips while gold holds near record highs", '{"direction_1d":"Neutral"}'),
+]
+MAX_LENGTH = 96
+# Room for two examples per row
+PACK_LENGTH = 128
+
+
+@pytest.fixture(scope="module")
+def tiny_model():
+    tokenizer = build_tiny_tokenizer([prompt + target for prompt, target in EXAMPLES], vocab_size=300)
+    model = build_tiny_model(tokenizer, hidden_size=64)
+    return tokenizer, model
+
+
+@pytest.fixture(scope="module")
+def tokenized(tiny_model):
+    tokenizer, _ = tiny_model
+    rows = [tokenize_example(prompt, target, tokenizer, MAX_LENGTH) for prompt, target in EXAMPLES]
+    return Dataset.from_list(rows)
+
+
+def token_losses(logits, labels):
+    """Per-token cross entropy of next-token predictions, as the model computes its loss."""
+    return torch.nn.functional.cross_entropy(
+        logits[:-1], labels[1:], ignore_index=IGNORE_INDEX, reduction="none"
+    )[labels[1:] != IGNORE_INDEX]
+
+
+def test_pack_lengths_respects_capacity():
+    lengths = [50, 40, 30, 20, 10, 10, 5]
+    packs = pack_lengths(lengths, 64)
+    assert sorted(i for pack in packs for i in pack) == list(range(len(lengths)))
+    assert all(sum(lengths[i] for i in pack) <= 64 for pack in packs)
+    assert len(packs) == 3
+
+
+def test_packed_forward_matches_unpacked_examples(tiny_model, tokenized):
+    tokenizer, model = tiny_model
+    packed = pack_dataset(tokenized, PACK_LENGTH)
+    assert max(len(row) for row in packed["seq_lengths"]) > 1
+
+    collator = CausalLMCollator(tokenizer.eos_token_id, block_diagonal=True)
+    batch = collator([packed[i] for i in range(len(packed))])
+    with torch.no_grad():
+        packed_out = model(**batch)
+
+    # Recover which example each packed segment came from by its tokens
+    by_tokens = {tuple(row["input_ids"]): row for row in tokenized}
+    packed_losses, seen = [], 0
+    for b, row in enumerate(packed):
+        start = 0
+        for length in row["seq_lengths"]:
+            end = start + length
+            example = by_tokens[tuple(row["input_ids"][start:end])]
+            assert batch["position_ids"][b, start:end].tolist() == list(range(length))
+
+            with torch.no_grad():
+                single = model(input_ids=torch.tensor([example["input_ids"]])).logits[0]
+            segment = packed_out.logits[b, start:end]
+            assert torch.allclose(segment, single, atol=1e-5)
+            # The first token of every example is a prompt token, so no loss crosses a boundary
+            assert row["labels"][start] == IGNORE_INDEX
+            packed_losses.append(token_losses(single, torch.tensor(example["labels"])))
+            start = end
+            seen += 1
+    assert seen == len(tokenized)
+
+    # The batch loss is the mean over every answer token of every example
+    expected = torch.cat(packed_losses).mean()
+    assert torch.allclose(packed_out.loss, expected, atol=1e-5)
+
+
+def test_plain_collator_pads_with_a_2d_mask(tiny_model, tokenized):
+    tokenizer, model = tiny_model
+    collator = CausalLMCollator(tokenizer.eos_token_id)
+    features = [tokenized[i] for i in range(2)]
+    batch = collator(features)
+    assert batch["attention_mask"].dim() == 2
+    assert batch["input_ids"].shape[1] % 8 == 0
+    assert (batch["labels"][0, len(features[0]["input_ids"]):] == IGNORE_INDEX).all()
+
+    with torch.no_grad():
+        logits = model(**{k: v for k, v in batch.items() if k != "labels"}).logits
+        for b, feature in enumerate(features):
+            n = len(feature["input_ids"])
+            single = model(input_ids=torch.tensor([feature["input_ids"]])).logits[0]
+            assert torch.allclose(logits[b, :n], single, atol=1e-5)
@@ -0,0 +1,115 @@
+"""Threaded pipelines: output order, backpressure and failing stages."""
+
+import itertools
+import threading
+import time
+import pytest
+from src.utils.pipelining import PipelinedExecutor, PipelineError, Stage
+
+
+def run_with_timeout(executor, source, sink, timeout=10):
+    """Run the executor in a thread; a deadlock fails the test instead of hanging it."""
+    outcome = {}
+
+    def target():
+        try:
+            executor.run(source, sink)
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "pipeline did not finish"
+    return outcome.get("error")
+
+
+def test_single_worker_stages_keep_source_order():
+    def jitter(x):
+        time.sleep(0.001 * (x % 3))
+        return x
+
+    executor = PipelinedExecutor([
+        Stage("double", lambda x: 2 * x),
+        Stage("jitter", jitter),
+        Stage("inc", lambda x: x + 1),
+    ], queue_size=2)
+    results = []
+    assert run_with_timeout(executor, range(100), results.append) is None
+    assert results == [2 * x + 1 for x in range(100)]
+
+
+def test_multi_worker_stage_delivers_every_item():
+    executor = PipelinedExecutor([Stage("square", lambda x: x * x, workers=4)], queue_size=2)
+    results = []
+    assert run_with_timeout(executor, range(200), results.append) is None
+    assert sorted(results) == [x * x for x in range(200)]
+
+
+def test_bounded_queues_stop_the_source_behind_a_slow_sink():
+    queue_size = 2
+    pulled = []
+    release = threading.Event()
+
+    def source():
+        for i in range(1000):
+            pulled.append(i)
+            yield i
+
+    def sink(item):
+        release.wait()
+
+    executor = PipelinedExecutor([Stage("a", lambda x: x), Stage("b", lambda x: x)], queue_size=queue_size)
+    thread = threading.Thread(target=executor.run, args=(source(), sink), daemon=True)
+    thread.start()
+    time.sleep(0.5)
+    # Each queue holds queue_size items; each thread holds at most one more
+    in_flight = len(pulled)
+    assert in_flight <= 3 * queue_size + 4
+    release.set()
+    thread.join(10)
+    assert not thread.is_alive() and len(pulled) == 1000
+
+
+@pytest.mark.parametrize("failing", ["source", "stage", "sink"])
+def test_failures_propagate_without_deadlock(failing):
+    boom = ValueError("boom")
+
+    def source():
+        for i in itertools.count():  # endless: the pipeline must stop on its own
+            if failing == "source" and i == 5:
+                raise boom
+            yield i
+
+    def stage(x):
+        if failing == "stage" and x == 5:
+            raise boom
+        return x
+
+    def sink(x):
+        if failing == "sink" and x == 5:
+            raise boom
+
+    # A slow stage behind the failing one, with full queues, must not block the shutdown
+    executor = PipelinedExecutor([
+        Stage("work", stage, workers=2),
+        Stage("slow", lambda x: time.sleep(0.01) or x),
+    ], queue_size=1)
+    error = run_with_timeout(executor, source(), sink)
+    assert isinstance(error, PipelineError)
+    assert error.__cause__ is boom
+    expected_name = "work" if failing == "stage" else failing
+    assert f"'{expected_name}'" in str(error)
+
+
+def test_executor_can_run_again_after_a_failure():
+    def fail(x):
+        raise RuntimeError("first run")
+
+    executor = PipelinedExecutor([Stage("fail", fail)])
+    assert isinstance(run_with_timeout(executor, range(3), lambda x: None), PipelineError)
+
+    executor.stages = [Stage("ok", lambda x: x)]
+    results = []
+    assert run_with_timeout(executor, range(3), results.append) is None
+    assert results == [0, 1, 2]
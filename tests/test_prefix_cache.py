@@ -0,0 +1,85 @@
+"""Prefix-cached constrained decoding and scoring against full prefills."""
+
+import pytest
+import torch
+from conftest import use_pipeline
+
+use_pipeline("inference")
+from constrained import DecodingStats, constrained_generate, prediction_trie  # noqa: E402
+from prefix_cache import PrefixCache  # noqa: E402
+from schema import PROMPT_INSTRUCTIONS  # noqa: E402
+from scoring import score_prediction  # noqa: E402
+
+HEADLINES = [
+    "Gold prices surge as the dollar weakens",
+    "Miners slip after hawkish Fed remarks",
+    "Central banks extend record gold purchases",
+]
+
+
+def prompt_ids(tokenizer, prompt):
+    text = tokenizer.apply_chat_template(
+        [{"role": "user", "content": prompt}], tokenize=False, add_generation_prompt=True
+    )
+    return tokenizer(text)["input_ids"]
+
+
+def instructions_first(headline):
+    return f"{PROMPT_INSTRUCTIONS}\nNews: {headline}\nSentiment: Positive (0.9)"
+
+
+def instructions_last(headline):
+    return f"News: {headline}\nSentiment: Positive (0.9)\n\n{PROMPT_INSTRUCTIONS}"
+
+
+@pytest.fixture
+def prefix(tiny_predictor):
+    tokenizer, model = tiny_predictor
+    return PrefixCache.from_instructions(model, tokenizer)
+
+
+@pytest.mark.parametrize("build", [instructions_first, instructions_last])
+def test_cached_decoding_matches_full_prefill(tiny_predictor, prefix, build):
+    tokenizer, model = tiny_predictor
+    trie = prediction_trie(tokenizer)
+    for headline in HEADLINES:
+        ids = prompt_ids(tokenizer, build(headline))
+        assert constrained_generate(ids, model, trie, prefix_cache=prefix) == \
+            constrained_generate(ids, model, trie)
+
+        cached, cached_scores = score_prediction(ids, model, trie, prefix_cache=prefix)
+        full, full_scores = score_prediction(ids, model, trie)
+        assert {k: v for k, v in cached.items() if k != "probabilities"} == \
+            {k: v for k, v in full.items() if k != "probabilities"}
+        for a, b in zip(cached_scores, full_scores):
+            torch.testing.assert_close(a, b, atol=1e-4, rtol=1e-4)
+
+
+def test_stats_count_reused_prompt_tokens(tiny_predictor, prefix):
+    tokenizer, model = tiny_predictor
+    trie = prediction_trie(tokenizer)
+    lengths = []
+    for headline in HEADLINES:
+        ids = prompt_ids(tokenizer, instructions_first(headline))
+        assert ids[:len(prefix.prefix_ids)] == prefix.prefix_ids
+        lengths.append(len(ids))
+        score_prediction(ids, model, trie, stats=DecodingStats(), prefix_cache=prefix)
+
+    assert prefix.stats.requests == len(HEADLINES)
+    assert prefix.stats.prompt_tokens == sum(lengths)
+    assert prefix.stats.saved_per_request == len(prefix.prefix_ids)
+    assert prefix.stats.saved_fraction == pytest.approx(len(prefix.prefix_ids) * len(HEADLINES) / sum(lengths))
+
+    # The original layout only shares the chat template header
+    _, reused = prefix.match(prompt_ids(tokenizer, instructions_last(HEADLINES[0])))
+    assert 0 < reused < len(prefix.prefix_ids) // 2
+
+
+def test_match_leaves_a_token_and_keeps_the_cache(prefix):
+    before = [(k.clone(), v.clone()) for k, v in prefix.past]
+    past, reused = prefix.match(prefix.prefix_ids)
+    assert reused == len(prefix.prefix_ids) - 1
+    assert past[0][0].shape[2] == reused
+    assert prefix.match([prefix.prefix_ids[0] + 1] + prefix.prefix_ids[1:]) == (None, 0)
+    for (k, v), (k0, v0) in zip(prefix.past, before):
+        assert torch.equal(k, k0) and torch.equal(v, v0)
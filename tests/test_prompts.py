@@ -0,0 +1,49 @@
+"""Column-wise prompt and target builders must match the row-wise ones exactly."""
+
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import use_pipeline
+
+use_pipeline("model_training")
+from benchmark_prompts import check_equivalence, make_frame  # noqa: E402
+from prompts import (  # noqa: E402
+    PROMPT_LAYOUTS, build_prompt, build_prompts, build_target_json, build_target_jsons
+)
+
+
+def test_synthetic_rows_match():
+    check_equivalence(make_frame(2_000, seed=1))
+
+
+def test_missing_values_render_like_fstrings():
+    df = make_frame(8, seed=2)
+    df.loc[0, "generated_headline"] = np.nan
+    df.loc[1, "explanation"] = None
+    df.loc[2, "sentiment_strength"] = np.nan
+    df.loc[3, "direction_6h"] = np.nan
+    df.loc[4, "magnitude_48h"] = None
+    check_equivalence(df)
+    assert "News: nan\n" in build_prompts(df)[0]
+
+
+@pytest.mark.parametrize("layout", PROMPT_LAYOUTS)
+def test_string_dtype_columns_match(layout):
+    # pandas 3 reads text columns as this NaN-backed string dtype by default
+    text = pd.StringDtype(na_value=np.nan)
+    df = make_frame(50, seed=3)
+    df.loc[0, "generated_headline"] = np.nan
+    df = df.astype({"generated_headline": text, "symbol": text, "explanation": "string"})
+    expected = df.apply(build_prompt, axis=1, layout=layout)
+    actual = build_prompts(df, layout)
+    assert actual.notna().all()
+    assert actual.tolist() == expected.tolist()
+
+
+def test_targets_match_on_real_csv_shape(tmp_path):
+    # Values round-tripped through CSV, as load_dataset reads them
+    path = tmp_path / "training.csv"
+    make_frame(500, seed=4).to_csv(path, index=False)
+    df = pd.read_csv(path)
+    check_equivalence(df)
+    assert build_target_jsons(df).tolist() == df.apply(build_target_json, axis=1).tolist()
@@ -0,0 +1,58 @@
+"""Streaming CSV records: row ids, resume offsets and typed field access."""
+
+import math
+import pytest
+from src.data import InputRecord, iter_records
+
+CSV_TEXT = 'id,text\n0,first\n\n1,"two\nlines"\n\r\n2,\n3,last\n'
+
+
+@pytest.mark.parametrize("value, expected", [
+    (7, 7),
+    ("7", 7),
+    (" 42 ", 42),
+    ("12.0", 12),
+    (12.0, 12),
+    ("123456789012345678", 123456789012345678),
+    ("1.5", None),
+    (1.5, None),
+    ("abc", None),
+    ("", None),
+    (None, None),
+    (math.nan, None),
+    (True, None),
+])
+def test_get_int(value, expected):
+    assert InputRecord(0, 0, 1, {"id": value}).get_int("id") == expected
+
+
+def test_get_int_of_a_missing_column():
+    assert InputRecord(0, 0, 1, {}).get_int("id") is None
+
+
+def test_blank_lines_take_no_row_id(tmp_path):
+    path = tmp_path / "in.csv"
+    path.write_bytes(CSV_TEXT.encode())
+    records = list(iter_records(str(path)))
+    assert [r.row_id for r in records] == [0, 1, 2, 3]
+    assert [r["id"] for r in records] == ["0", "1", "2", "3"]
+    assert [r["text"] for r in records] == ["first", "two\nlines", None, "last"]
+    # Offsets still cover the skipped bytes, so they chain from record to record
+    assert records[-1].end_offset == len(CSV_TEXT.encode())
+
+
+@pytest.mark.parametrize("resume_at", [1, 2, 3])
+def test_resume_from_a_saved_offset_mid_file(tmp_path, resume_at):
+    path = str(tmp_path / "in.csv")
+    with open(path, "wb") as f:
+        f.write(CSV_TEXT.encode())
+    full = list(iter_records(path))
+    checkpoint = full[resume_at]
+
+    resumed = list(iter_records(path, checkpoint.row_id, checkpoint.offset))
+    assert resumed == full[resume_at:]
+    # The manifest saves the end of the previous record, which may be a blank line
+    previous = full[resume_at - 1]
+    resumed = list(iter_records(path, previous.row_id + 1, previous.end_offset))
+    assert [r.row_id for r in resumed] == [r.row_id for r in full[resume_at:]]
+    assert [r.data for r in resumed] == [r.data for r in full[resume_at:]]
@@ -0,0 +1,127 @@
+"""Label scoring against uncached log-likelihoods, and temperature calibration."""
+
+import pytest
+import torch
+import torch.nn.functional as F
+import yaml
+from conftest import use_pipeline
+
+use_pipeline("inference")
+from calibrate import calibrate, horizon_targets, resolve_prompt_layout  # noqa: E402
+from constrained import DecodingStats, prediction_trie  # noqa: E402
+from inference import TRAINING_CONFIG_FILE  # noqa: E402
+from schema import HORIZONS, PREDICTION_FIELDS, is_valid_prediction, prediction_index  # noqa: E402
+from scoring import (  # noqa: E402
+    HORIZON_CANDIDATES, TEMPERATURE_FILE, candidate_index, fit_temperature, horizon_tails,
+    load_temperature, save_temperature, score_prediction
+)
+
+PROMPTS = [
+    "News: Gold prices surge as the dollar weakens\nSentiment: Positive (0.95)",
+    "News: Miners slip after hawkish Fed remarks\nSentiment: Negative (0.81)",
+]
+
+
+def prompt_ids(tokenizer, prompt):
+    text = tokenizer.apply_chat_template(
+        [{"role": "user", "content": prompt}], tokenize=False, add_generation_prompt=True
+    )
+    return tokenizer(text)["input_ids"]
+
+
+@torch.no_grad()
+def uncached_scores(input_ids, model, trie, chosen):
+    """Log-likelihood of each candidate tail from a full forward pass per candidate."""
+    prefix, tails = horizon_tails(trie, chosen)
+    context = list(input_ids) + prefix
+    scores = []
+    for tail in tails:
+        logits = model(input_ids=torch.tensor([context + tail])).logits[0]
+        logprobs = F.log_softmax(logits[len(context) - 1:-1].float(), dim=-1)
+        scores.append(logprobs.gather(-1, torch.tensor(tail)[:, None]).sum())
+    return torch.stack(scores)
+
+
+@pytest.mark.parametrize("prompt", PROMPTS)
+def test_scores_match_uncached_likelihoods(tiny_predictor, prompt):
+    tokenizer, model = tiny_predictor
+    trie = prediction_trie(tokenizer)
+    ids = prompt_ids(tokenizer, prompt)
+    stats = DecodingStats()
+    prediction, log_likelihoods = score_prediction(ids, model, trie, stats=stats)
+
+    assert is_valid_prediction(prediction)
+    # The prompt pass plus one batched pass per horizon
+    assert stats.model_calls == 1 + len(HORIZONS)
+    values = [prediction[key] for key, _ in PREDICTION_FIELDS]
+    # The picked answer is counted once, every candidate tail as scored
+    assert stats.prompt_tokens == len(ids)
+    assert stats.tokens == len(trie.sequences[prediction_index(values)])
+    assert stats.scored == sum(
+        len(tail) for h in range(len(HORIZONS)) for tail in horizon_tails(trie, values[:2 * h])[1]
+    )
+    for h, scores in enumerate(log_likelihoods):
+        assert scores.shape == (len(HORIZON_CANDIDATES),)
+        expected = uncached_scores(ids, model, trie, values[:2 * h])
+        torch.testing.assert_close(scores, expected, atol=1e-4, rtol=1e-4)
+
+
+def test_probabilities_are_marginals_of_the_scores(tiny_predictor):
+    tokenizer, model = tiny_predictor
+    prediction, log_likelihoods = score_prediction(
+        prompt_ids(tokenizer, PROMPTS[0]), model, prediction_trie(tokenizer), temperature=2.0
+    )
+    joint = torch.softmax(log_likelihoods[0] / 2.0, dim=-1).view(3, 4)
+    probabilities = prediction["probabilities"]
+    assert probabilities["direction_6h"]["Up"] == pytest.approx(float(joint[0].sum()), abs=1e-6)
+    assert probabilities["magnitude_6h"]["high impact"] == pytest.approx(float(joint[:, 3].sum()), abs=1e-6)
+    for key, _ in PREDICTION_FIELDS:
+        assert sum(probabilities[key].values()) == pytest.approx(1.0, abs=1e-5)
+        assert prediction[key] == max(probabilities[key], key=probabilities[key].get)
+
+
+def test_fit_temperature_recovers_known_temperature():
+    generator = torch.Generator().manual_seed(0)
+    logits = torch.randn(4000, len(HORIZON_CANDIDATES), generator=generator) * 3
+    targets = torch.multinomial(torch.softmax(logits / 2.5, dim=-1), 1, generator=generator).squeeze(-1)
+    assert fit_temperature(logits, targets) == pytest.approx(2.5, rel=0.1)
+
+
+def test_horizon_targets_skip_unknown_labels():
+    labels = {
+        "direction_6h": "Up", "magnitude_6h": "high impact",
+        "direction_12h": None, "magnitude_12h": "low impact",
+        "direction_24h": "Down", "magnitude_24h": "huge",
+    }
+    assert horizon_targets(labels) == [candidate_index("Up", "high impact"), None, None, None]
+
+
+def test_calibrate_saves_a_temperature_the_loaders_read(tiny_predictor, tmp_path):
+    tokenizer, model = tiny_predictor
+    labels = [
+        {**{f"direction_{h}": "Up" for h in HORIZONS}, **{f"magnitude_{h}": "low impact" for h in HORIZONS}},
+        {**{f"direction_{h}": "Down" for h in HORIZONS}, **{f"magnitude_{h}": "high impact" for h in HORIZONS}},
+    ]
+    result = calibrate(PROMPTS, labels, model, tokenizer)
+    assert result["examples"] == 2 * len(HORIZONS)
+    assert result["temperature"] > 0
+    assert result["nll_after"] <= result["nll_before"] + 1e-6
+
+    assert load_temperature(str(tmp_path)) == 1.0
+    assert load_temperature(None, default=0.5) == 0.5
+    path = save_temperature(str(tmp_path), **result)
+    assert path == str(tmp_path / TEMPERATURE_FILE)
+    assert load_temperature(str(tmp_path)) == pytest.approx(result["temperature"])
+
+
+def test_calibration_layout_follows_the_training_config(tmp_path):
+    assert resolve_prompt_layout(str(tmp_path)) == "instructions_last"
+    (tmp_path / TRAINING_CONFIG_FILE).write_text(yaml.safe_dump({
+        "model": {"variant": "causal_lm"}, "tokenization": {"prompt_layout": "instructions_first"}
+    }))
+    assert resolve_prompt_layout(str(tmp_path)) == "instructions_first"
+    assert resolve_prompt_layout(str(tmp_path), "instructions_last") == "instructions_last"
+
+    (tmp_path / TRAINING_CONFIG_FILE).write_text(yaml.safe_dump({"model": {"variant": "heads"}}))
+    with pytest.raises(ValueError, match="heads"):
+        resolve_prompt_layout(str(tmp_path))
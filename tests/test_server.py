@@ -0,0 +1,137 @@
+"""Micro-batching and HTTP handling of the prediction server, with a fake model."""
+
+import asyncio
+import json
+import pytest
+from conftest import use_pipeline
+
+use_pipeline("inference")
+from server import MicroBatcher, batch_predictor, serve  # noqa: E402
+
+
+class FakeModel:
+    """Stands in for predict_batch: echoes each prompt and records batch sizes."""
+
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+
+    def __call__(self, prompts):
+        self.batches.append(len(prompts))
+        if self.fail:
+            raise RuntimeError("out of memory")
+        return [{"prompt": prompt} for prompt in prompts]
+
+
+async def with_batcher(fake, coroutine, **kwargs):
+    batcher = MicroBatcher(fake, **kwargs)
+    batcher.start()
+    try:
+        return await coroutine(batcher)
+    finally:
+        await batcher.stop()
+
+
+def test_concurrent_requests_share_bounded_batches():
+    fake = FakeModel()
+    prompts = [f"prompt {i}" for i in range(10)]
+
+    async def submit_all(batcher):
+        return await asyncio.gather(*(batcher.submit(p) for p in prompts)), batcher.metrics
+
+    results, metrics = asyncio.run(with_batcher(fake, submit_all, max_batch_size=4, max_wait_ms=50))
+    assert [r["prompt"] for r in results] == prompts
+    assert fake.batches == [4, 4, 2]
+    assert metrics.requests == 10 and metrics.batches == 3
+    assert metrics.snapshot()["batch_size_histogram"] == {"2": 1, "4": 2}
+
+
+def test_a_lone_request_waits_at_most_max_wait():
+    fake = FakeModel()
+
+    async def submit_one(batcher):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        result = await batcher.submit("only")
+        return result, loop.time() - start
+
+    result, elapsed = asyncio.run(with_batcher(fake, submit_one, max_batch_size=8, max_wait_ms=20))
+    assert result == {"prompt": "only"}
+    assert fake.batches == [1]
+    assert elapsed < 1.0
+
+
+def test_a_failed_batch_fails_each_request():
+    fake = FakeModel(fail=True)
+
+    async def submit_two(batcher):
+        results = await asyncio.gather(
+            batcher.submit("a"), batcher.submit("b"), return_exceptions=True
+        )
+        return results, batcher.metrics
+
+    results, metrics = asyncio.run(with_batcher(fake, submit_two, max_batch_size=4, max_wait_ms=10))
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert metrics.errors == 2
+
+
+def test_a_micro_batch_is_one_model_call(tiny_predictor, monkeypatch):
+    tokenizer, model = tiny_predictor
+    calls = []
+    generate = model.generate
+
+    def counting_generate(*args, **kwargs):
+        calls.append(kwargs["input_ids"].shape[0])
+        return generate(*args, **kwargs)
+
+    monkeypatch.setattr(model, "generate", counting_generate)
+    prompts = [f"News: Gold headline {i} as the dollar moves" for i in range(5)]
+    predict_batch = batch_predictor(model, tokenizer, max_new_tokens=4)
+
+    async def submit_all(batcher):
+        return await asyncio.gather(*(batcher.submit(p) for p in prompts))
+
+    results = asyncio.run(with_batcher(predict_batch, submit_all, max_batch_size=8, max_wait_ms=200))
+    assert calls == [len(prompts)]
+    assert len(results) == len(prompts)
+
+
+async def request(port, head, body=b""):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(head.encode() + b"\r\n\r\n" + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    status, _, payload = response.partition(b"\r\n\r\n")
+    return int(status.split()[1]), json.loads(payload)
+
+
+def post(length, body=b""):
+    return f"POST /predict HTTP/1.1\r\nHost: test\r\nContent-Length: {length}", body
+
+
+@pytest.mark.parametrize("head, body, status", [
+    (*post(len(b'{"prompt": "gold"}'), b'{"prompt": "gold"}'), 200),
+    (*post("abc"), 400),
+    (*post(-5), 400),
+    (*post(2, b"{}"), 400),
+    (*post(len(b'{"prompt": 1}'), b'{"prompt": 1}'), 400),
+    (*post(1 << 21), 413),
+    ("GET /predict HTTP/1.1", b"", 404),
+    ("GET /health HTTP/1.1", b"", 200),
+])
+def test_http_status(head, body, status):
+    async def run():
+        server, batcher = await serve(FakeModel(), port=0, max_wait_ms=1)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return await request(port, head, body)
+        finally:
+            server.close()
+            await server.wait_closed()
+            await batcher.stop()
+
+    got, payload = asyncio.run(run())
+    assert got == status
+    if status == 200 and head.startswith("POST"):
+        assert payload == {"prompt": "gold"}
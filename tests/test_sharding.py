@@ -0,0 +1,111 @@
+"""Row sharding: stable assignment, coverage and merging shard outputs."""
+
+import csv
+import os
+import pytest
+from src.data import (
+    BufferedCsvWriter, ResumeManifest, ROW_ID_COLUMN, ShardSpec, iter_pending_chunks,
+    merge_shard_outputs, shard_of
+)
+
+NUM_ROWS = 50
+
+
+def write_csv(path, num_rows):
+    with open(path, "w", newline="") as f:
+        f.write("id,text\n")
+        for i in range(num_rows):
+            f.write(f"{i},row {i}\n")
+
+
+def read_csv(path):
+    with open(path, newline="") as f:
+        return list(csv.reader(f))
+
+
+def run_job(input_path, output_path, shard, with_row_ids=True):
+    """Stand-in for a process.py run: uppercase the text of every owned row."""
+    manifest = ResumeManifest.for_output(output_path)
+    columns = ([ROW_ID_COLUMN] if with_row_ids else []) + ["id", "text"]
+    with BufferedCsvWriter(output_path, columns, manifest, flush_rows=7) as writer:
+        for chunk in iter_pending_chunks(input_path, manifest, chunk_size=4, shard=shard):
+            writer.write_many(
+                [r.row_id for r in chunk],
+                [{ROW_ID_COLUMN: r.row_id, "id": r["id"], "text": r["text"].upper()} for r in chunk]
+            )
+    return manifest
+
+
+def test_assignment_is_a_stable_hash():
+    # blake2b of the row id: the same on every instance, interpreter and run
+    assert [shard_of(i, 4) for i in range(12)] == [1, 2, 0, 1, 2, 0, 0, 2, 2, 1, 0, 2]
+    assert all(shard_of(i, 1) == 0 for i in range(100))
+    # Every shard gets a fair share
+    counts = [sum(shard_of(i, 4) == s for i in range(4000)) for s in range(4)]
+    assert min(counts) > 900
+
+
+def test_from_env_validates_the_index(monkeypatch):
+    monkeypatch.setenv("NUM_SHARDS", "4")
+    monkeypatch.setenv("SHARD_INDEX", "3")
+    spec = ShardSpec.from_env()
+    assert (spec.index, spec.count, spec.is_sharded) == (3, 4, True)
+    assert spec.output_path("out/x.csv") == "out/x.shard-00003-of-00004.csv"
+
+    monkeypatch.setenv("SHARD_INDEX", "4")
+    with pytest.raises(ValueError):
+        ShardSpec.from_env()
+
+
+def test_shards_are_disjoint_and_cover_every_row(tmp_path):
+    input_path = str(tmp_path / "in.csv")
+    write_csv(input_path, NUM_ROWS)
+
+    owned = []
+    for index in range(3):
+        shard = ShardSpec(index, 3)
+        manifest = ResumeManifest(str(tmp_path / f"m{index}.json"))
+        rows = [r.row_id for chunk in iter_pending_chunks(input_path, manifest, 4, shard) for r in chunk]
+        assert all(shard_of(r, 3) == index for r in rows)
+        owned.append(set(rows))
+        # Rows of other shards are marked done, so committing the owned ones completes the input
+        manifest.mark_processed(rows)
+        assert manifest.input_row == NUM_ROWS
+
+    assert sum(len(rows) for rows in owned) == NUM_ROWS
+    assert set().union(*owned) == set(range(NUM_ROWS))
+
+
+def test_merge_reproduces_the_single_instance_output(tmp_path):
+    input_path = str(tmp_path / "in.csv")
+    write_csv(input_path, NUM_ROWS)
+    single_path = str(tmp_path / "single.csv")
+    run_job(input_path, single_path, ShardSpec(0, 1), with_row_ids=False)
+
+    output_path = str(tmp_path / "out" / "merged.csv")
+    for index in range(3):
+        shard = ShardSpec(index, 3)
+        run_job(input_path, shard.output_path(output_path), shard)
+
+    assert merge_shard_outputs(output_path, 3) == NUM_ROWS
+    assert read_csv(output_path) == read_csv(single_path)
+
+
+def test_merge_sorts_out_of_order_shards_and_reads_a_shard_dir(tmp_path):
+    shard_dir = tmp_path / "shards"
+    shard_dir.mkdir()
+    # Rows committed out of order after a restart
+    (shard_dir / "out.shard-00000-of-00002.csv").write_text("row_id,v\n4,e\n0,a\n")
+    (shard_dir / "out.shard-00001-of-00002.csv").write_text("row_id,v\n1,b\n2,c\n3,d\n")
+
+    output_path = str(tmp_path / "out.csv")
+    assert merge_shard_outputs(output_path, 2, str(shard_dir)) == 5
+    assert read_csv(output_path) == [["v"], ["a"], ["b"], ["c"], ["d"], ["e"]]
+
+
+def test_merge_fails_on_a_missing_shard(tmp_path):
+    output_path = str(tmp_path / "out.csv")
+    (tmp_path / "out.shard-00000-of-00002.csv").write_text("row_id,v\n0,a\n")
+    with pytest.raises(FileNotFoundError, match="shard-00001-of-00002"):
+        merge_shard_outputs(output_path, 2)
+    assert not os.path.exists(output_path)
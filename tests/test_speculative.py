@@ -0,0 +1,104 @@
+"""Assisted decoding must return exactly the target model's greedy decode."""
+
+import pytest
+import torch
+from conftest import use_pipeline
+
+use_pipeline("headline_rewriter")
+from speculative import SpeculativeStats, assisted_greedy_generate  # noqa: E402
+from src.testing import build_tiny_model_pair, build_tiny_tokenizer  # noqa: E402
+
+PROMPTS = [
+    "[INST] Rewrite the headline to focus only on the symbol GLD. [/INST]",
+    "[INST] Gold prices surge as the dollar weakens [/INST]",
+    "[INST] Miners rally after central bank purchases [/INST]",
+]
+
+
+@pytest.fixture(scope="module")
+def tokenizer():
+    return build_tiny_tokenizer(PROMPTS)
+
+
+@pytest.fixture(scope="module")
+def models(tokenizer):
+    return build_tiny_model_pair(tokenizer, num_layers=4, hidden_size=64)
+
+
+def greedy_generate(model, ids, max_new_tokens, eos_token_id):
+    with torch.no_grad():
+        output = model.generate(
+            torch.tensor([ids]),
+            max_new_tokens=max_new_tokens,
+            do_sample=False,
+            eos_token_id=eos_token_id,
+            pad_token_id=eos_token_id,
+        )
+    return output[0, len(ids):].tolist()
+
+
+def test_tokenizer_round_trips_unseen_text(tokenizer):
+    text = "Ouro sobe após decisão do Fed: {\"1d\": \"up\"}"
+    ids = tokenizer.encode(text)
+    assert ids[0] == tokenizer.bos_token_id
+    assert tokenizer.decode(ids, skip_special_tokens=True) == text
+
+
+@pytest.mark.parametrize("num_draft_tokens", [1, 3, 8])
+@pytest.mark.parametrize("prompt", PROMPTS)
+def test_assisted_matches_greedy(models, tokenizer, prompt, num_draft_tokens):
+    target, draft = models
+    ids = tokenizer.encode(prompt)
+    stats = SpeculativeStats()
+    assisted = assisted_greedy_generate(
+        ids, target, draft, max_new_tokens=24, num_draft_tokens=num_draft_tokens,
+        eos_token_ids=[tokenizer.eos_token_id], stats=stats
+    )
+    assert assisted == greedy_generate(target, ids, 24, tokenizer.eos_token_id)
+    assert stats.generated == len(assisted)
+    assert stats.target_calls <= len(assisted)
+
+
+def test_assisted_matches_greedy_with_target_as_draft(models, tokenizer):
+    # A draft identical to the target is always accepted, which exercises the
+    # multi-token acceptance and cache cropping on every step
+    target, _ = models
+    ids = tokenizer.encode(PROMPTS[0])
+    stats = SpeculativeStats()
+    assisted = assisted_greedy_generate(
+        ids, target, target, max_new_tokens=20, num_draft_tokens=4,
+        eos_token_ids=[tokenizer.eos_token_id], stats=stats
+    )
+    assert assisted == greedy_generate(target, ids, 20, tokenizer.eos_token_id)
+    assert stats.acceptance_rate == 1.0
+    assert stats.tokens_per_target_call > 1
+
+
+def test_assisted_stops_at_eos(models, tokenizer):
+    target, draft = models
+    ids = tokenizer.encode(PROMPTS[1])
+    # Treat the target's third greedy token as end of sequence
+    eos = greedy_generate(target, ids, 12, tokenizer.eos_token_id)[2]
+    assisted = assisted_greedy_generate(ids, target, draft, max_new_tokens=12, eos_token_ids=[eos])
+    assert assisted == greedy_generate(target, ids, 12, eos)
+    assert assisted[-1] == eos
+
+
+@pytest.mark.parametrize("prompt", PROMPTS)
+def test_assisted_matches_library_assisted_generation(models, tokenizer, prompt):
+    target, draft = models
+    ids = tokenizer.encode(prompt)
+    with torch.no_grad():
+        output = target.generate(
+            torch.tensor([ids]),
+            assistant_model=draft,
+            max_new_tokens=24,
+            do_sample=False,
+            eos_token_id=tokenizer.eos_token_id,
+            pad_token_id=tokenizer.eos_token_id,
+        )
+    library = output[0, len(ids):].tolist()
+    assisted = assisted_greedy_generate(
+        ids, target, draft, max_new_tokens=24, eos_token_ids=[tokenizer.eos_token_id]
+    )
+    assert assisted == library
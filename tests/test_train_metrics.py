@@ -0,0 +1,41 @@
+"""Generation metrics of the causal LM trainer compare the shifted answer tokens only."""
+
+import json
+import numpy as np
+import pytest
+from conftest import use_training_code
+
+pytest.importorskip("sklearn")
+use_training_code()
+from src.testing import build_tiny_tokenizer  # noqa: E402
+from src.tokenization import IGNORE_INDEX  # noqa: E402
+from src.train import answer_token_ids, make_compute_metrics  # noqa: E402
+
+ANSWER = {"direction_6h": "Up", "magnitude_6h": "Small"}
+
+
+@pytest.fixture(scope="module")
+def tokenizer():
+    return build_tiny_tokenizer(["News: Gold prices surge", json.dumps(ANSWER)])
+
+
+def test_predictions_are_shifted_against_the_labels():
+    labels = np.array([[IGNORE_INDEX, IGNORE_INDEX, 7, 8, IGNORE_INDEX]])
+    # pred at t guesses token t+1; the last position has nothing to predict
+    preds = np.array([[0, 7, 8, 9, 5]])
+    assert answer_token_ids(preds, labels) == ([[7, 8]], [[7, 8]])
+
+
+def test_perfect_next_token_predictions_score_as_exact_matches(tokenizer):
+    prompt = tokenizer("News: Gold prices surge")["input_ids"]
+    answer = tokenizer(json.dumps(ANSWER), add_special_tokens=False)["input_ids"]
+    answer += [tokenizer.eos_token_id]
+    labels = np.array([[IGNORE_INDEX] * len(prompt) + answer + [IGNORE_INDEX] * 3])
+    # A model that always predicts the next token; prompt positions predict junk
+    preds = np.full_like(labels, 5)
+    preds[0, len(prompt) - 1:len(prompt) - 1 + len(answer)] = answer
+
+    metrics = make_compute_metrics(tokenizer)((preds, labels))
+    assert metrics["eval_json_parse_rate"] == 1.0
+    assert metrics["eval_exact_json_match"] == 1.0
+    assert metrics["eval_direction_acc_macro"] == 1.0
@@ -0,0 +1,94 @@
+"""Buffered CSV and Parquet writers: flush policy, manifest commits and crash leftovers."""
+
+import csv
+import math
+import os
+import pyarrow.parquet as pq
+import pytest
+from src.data import BufferedCsvWriter, BufferedParquetWriter, ResumeManifest
+from src.data.writer import _BufferedWriter
+
+PARQUET_COLUMNS = {"id": "int64", "label": "string", "score": "double"}
+
+
+def read_csv(path):
+    with open(path, newline="") as f:
+        return list(csv.reader(f))
+
+
+def test_base_writer_is_abstract():
+    with pytest.raises(TypeError):
+        _BufferedWriter()
+
+
+def test_csv_flushes_at_the_row_threshold(tmp_path):
+    path = str(tmp_path / "out.csv")
+    manifest = ResumeManifest.for_output(path)
+    writer = BufferedCsvWriter(path, ["id", "label"], manifest, flush_rows=3, flush_seconds=3600)
+
+    writer.write(0, {"id": 10, "label": "Up"})
+    writer.write(1, {"id": 11, "label": None})
+    assert not os.path.exists(path) and writer.rows_written == 0
+
+    writer.write_many([2, 3], [{"id": 12, "label": math.nan}, {"id": 13, "label": "Down", "extra": 1}])
+    assert read_csv(path) == [["id", "label"], ["10", "Up"], ["11", ""], ["12", ""], ["13", "Down"]]
+    assert writer.rows_written == 4
+    assert manifest.processed_count == 4
+    assert manifest.output_offset == os.path.getsize(path)
+
+
+def test_csv_close_flushes_the_rest_and_appends_without_a_second_header(tmp_path):
+    path = str(tmp_path / "out.csv")
+    with BufferedCsvWriter(path, ["id"], flush_rows=100) as writer:
+        writer.write(0, {"id": 1})
+    with BufferedCsvWriter(path, ["id"], flush_rows=100) as writer:
+        writer.write(1, {"id": 2})
+    assert read_csv(path) == [["id"], ["1"], ["2"]]
+    assert writer.rows_written == 1
+
+
+def test_csv_flushes_after_flush_seconds(tmp_path):
+    path = str(tmp_path / "out.csv")
+    writer = BufferedCsvWriter(path, ["id"], flush_rows=100, flush_seconds=0)
+    writer.write(0, {"id": 1})
+    assert read_csv(path) == [["id"], ["1"]]
+
+
+def test_parquet_writes_one_typed_part_per_flush(tmp_path):
+    directory = str(tmp_path / "dataset")
+    manifest = ResumeManifest(str(tmp_path / "m.json"))
+    with BufferedParquetWriter(directory, PARQUET_COLUMNS, manifest, flush_rows=2) as writer:
+        # A flush writes the whole buffer, even past flush_rows
+        writer.write_many(range(3), [
+            {"id": 1, "label": "Up", "score": 0.5},
+            {"id": 2, "label": None, "score": None},
+            {"id": 3, "label": "Down", "score": 1.0},
+        ])
+        assert sorted(os.listdir(directory)) == ["part-00000.parquet"]
+        writer.write(3, {"id": 4, "label": "Up", "score": 0.25})
+        assert writer.rows_written == 3
+    assert sorted(os.listdir(directory)) == ["part-00000.parquet", "part-00001.parquet"]
+    assert writer.rows_written == 4
+    assert manifest.output_offset == 2 and manifest.processed_count == 4
+
+    table = pq.read_table(directory)
+    assert [str(field.type) for field in table.schema] == ["int64", "string", "double"]
+    assert table.to_pydict() == {
+        "id": [1, 2, 3, 4], "label": ["Up", None, "Down", "Up"], "score": [0.5, None, 1.0, 0.25]
+    }
+
+
+def test_parquet_discards_parts_past_the_manifest(tmp_path):
+    directory = str(tmp_path / "dataset")
+    manifest = ResumeManifest(str(tmp_path / "m.json"))
+    with BufferedParquetWriter(directory, PARQUET_COLUMNS, manifest, flush_rows=1) as writer:
+        writer.write(0, {"id": 1, "label": "Up", "score": 0.5})
+    # A crash after writing a part but before committing it, plus a half-written temp file
+    os.replace(os.path.join(directory, "part-00000.parquet"), os.path.join(directory, "keep"))
+    with BufferedParquetWriter(directory, PARQUET_COLUMNS, flush_rows=1) as orphan:
+        orphan.write_many([1, 2], [{"id": 2, "label": "Up", "score": 0.1}] * 2)
+    open(os.path.join(directory, "_part-00009.parquet.tmp"), "w").close()
+    os.replace(os.path.join(directory, "keep"), os.path.join(directory, "part-00000.parquet"))
+
+    BufferedParquetWriter(directory, PARQUET_COLUMNS, ResumeManifest.load(manifest.path))
+    assert sorted(os.listdir(directory)) == ["part-00000.parquet"]